@@ -0,0 +1,197 @@
+"""
+Matching throughput benchmark against a synthetic Plex library.
+
+Run from the repository root, e.g.:
+
+    python -m benchmarks.bench_matching --library-size 10000 100000 --playlist-size 2000
+    python -m benchmarks.bench_matching --compare benchmarks/results/matching_old.json
+
+Results are written as JSON so runs of different versions can be compared.
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+from benchmarks.synthetic import make_library, make_playlist
+from utils.library_index import LibraryIndex, DEFAULT_DURATION_WINDOW_MS
+from utils.matching import rank_candidates, find_fuzzy_match, find_fuzzy_match_key
+from utils.normalization import normalize_name
+from utils.parallel import score_in_pool
+
+RESULTS_DIR = Path(__file__).parent / 'results'
+
+DEFAULT_NOISE = {
+    'featuring': 0.15,
+    'parentheses': 0.1,
+    'remaster': 0.1,
+    'duration_jitter_ms': 3000,
+}
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[rank]
+
+def peak_rss_mb():
+    """Peak resident set size of this process, or None where the platform can't tell."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except Exception:
+        return None
+
+def precision_recall(predictions, playlist):
+    true_positives = false_positives = false_negatives = 0
+    for predicted, (_, expected) in zip(predictions, playlist):
+        if predicted is not None and predicted == expected:
+            true_positives += 1
+            continue
+        if predicted is not None:
+            false_positives += 1
+        if expected is not None:
+            false_negatives += 1
+    precision = true_positives / (true_positives + false_positives) if true_positives + false_positives else 0.0
+    recall = true_positives / (true_positives + false_negatives) if true_positives + false_negatives else 0.0
+    return precision, recall
+
+def match_one(mode, index, spotify_track_info, window_ms, certain_score):
+    candidates = index.candidates_for(spotify_track_info, window_ms)
+    if mode == 'rank':
+        ranked = rank_candidates(candidates, spotify_track_info, limit=1, certain_score=certain_score)
+        return ranked[0][0].rating_key if ranked else None
+    best = find_fuzzy_match(spotify_track_info, candidates)
+    return best.rating_key if best else None
+
+def bench_normalization(playlist):
+    names = [name for track_info, _ in playlist for name in (track_info.name, track_info.album)]
+    start = time.perf_counter()
+    for name in names:
+        normalize_name(name)
+    elapsed = time.perf_counter() - start
+    return {'names': len(names), 'names_per_sec': len(names) / elapsed if elapsed else None}
+
+def run_case(library_size, args):
+    if args.trace_memory:
+        tracemalloc.start()
+
+    start = time.perf_counter()
+    library = make_library(library_size, seed=args.seed)
+    playlist = make_playlist(library, args.playlist_size, seed=args.seed, noise=DEFAULT_NOISE,
+                             missing_rate=args.missing_rate)
+    generate_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index = LibraryIndex(library)
+    index_seconds = time.perf_counter() - start
+    del library
+
+    latencies_ms = []
+    if args.mode == 'pool':
+        start = time.perf_counter()
+        jobs = [(track_info, index.candidates_for(track_info, args.window_ms)) for track_info, _ in playlist]
+        predictions = score_in_pool(find_fuzzy_match_key, jobs, args.processes)
+        match_seconds = time.perf_counter() - start
+    else:
+        predictions = []
+        start = time.perf_counter()
+        for track_info, _ in playlist:
+            track_start = time.perf_counter()
+            predictions.append(match_one(args.mode, index, track_info, args.window_ms, args.certain_score))
+            latencies_ms.append((time.perf_counter() - track_start) * 1000)
+        match_seconds = time.perf_counter() - start
+
+    precision, recall = precision_recall(predictions, playlist)
+    result = {
+        'library_size': library_size,
+        'playlist_size': len(playlist),
+        'generate_seconds': generate_seconds,
+        'index_seconds': index_seconds,
+        'match_seconds': match_seconds,
+        'tracks_per_sec': len(playlist) / match_seconds if match_seconds else None,
+        'p50_ms': percentile(latencies_ms, 50) if latencies_ms else None,
+        'p99_ms': percentile(latencies_ms, 99) if latencies_ms else None,
+        'precision': precision,
+        'recall': recall,
+        'normalization': bench_normalization(playlist),
+        'peak_rss_mb': peak_rss_mb(),
+    }
+    if args.trace_memory:
+        result['traced_peak_mb'] = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        tracemalloc.stop()
+    return result
+
+def compare(current, baseline_path):
+    """Print the relative change of the headline numbers against an earlier results file."""
+    with open(baseline_path, 'r') as f:
+        baseline = json.load(f)
+    old_cases = {case['library_size']: case for case in baseline['cases']}
+    for case in current['cases']:
+        old = old_cases.get(case['library_size'])
+        if not old:
+            continue
+        print(f"library_size={case['library_size']}")
+        for key in ('tracks_per_sec', 'p50_ms', 'p99_ms', 'precision', 'recall', 'peak_rss_mb'):
+            if case.get(key) is None or not old.get(key):
+                continue
+            change = (case[key] - old[key]) / old[key] * 100
+            print(f"  {key}: {old[key]:.4g} -> {case[key]:.4g} ({change:+.1f}%)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark track matching against a synthetic Plex library.")
+    parser.add_argument('--library-size', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--playlist-size', type=int, default=1000)
+    parser.add_argument('--missing-rate', type=float, default=0.1)
+    parser.add_argument('--mode', choices=['fuzzy', 'rank', 'pool'], default='fuzzy')
+    parser.add_argument('--processes', type=int, default=None, help="Worker processes for --mode pool")
+    parser.add_argument('--window-ms', type=int, default=DEFAULT_DURATION_WINDOW_MS)
+    parser.add_argument('--certain-score', type=float, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--trace-memory', action='store_true', help="Also measure Python allocations with tracemalloc")
+    parser.add_argument('--output', type=Path, default=None)
+    parser.add_argument('--compare', type=Path, default=None, help="Earlier results file to compare against")
+    args = parser.parse_args()
+
+    results = {
+        'benchmark': 'matching',
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'mode': args.mode,
+        'noise': DEFAULT_NOISE,
+        'cases': [],
+    }
+    for library_size in sorted(args.library_size):
+        case = run_case(library_size, args)
+        results['cases'].append(case)
+        print(f"{library_size:>9} tracks: {case['tracks_per_sec']:.1f} tracks/s, "
+              f"precision {case['precision']:.3f}, recall {case['recall']:.3f}")
+
+    output = args.output or RESULTS_DIR / f"matching_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=4)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+End-to-end sync benchmark against local fake Plex and Spotify servers.
+
+Runs sync_spotify_playlist_with_plex twice against the stand-ins, first with an empty
+match store and then warm, and records wall time and the requests made per phase.
+Run from the repository root, e.g.:
+
+    python -m benchmarks.bench_sync --library-size 20000 --playlist-size 500 --spotify-throttle 0.05
+"""
+import argparse
+import json
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+from plexapi.server import PlexServer
+
+from benchmarks.bench_matching import DEFAULT_NOISE, RESULTS_DIR, git_revision
+from benchmarks.fake_plex import FakePlexServer
+from benchmarks.fake_spotify import FakeSpotifyServer
+from benchmarks.synthetic import make_library, make_playlist
+from helper_classes.playlist import Playlist
+from helper_classes.sync_options import SyncOptions
+from helper_classes.user_inputs import UserInputs
+from utils.spotify_functions import sync_spotify_playlist_with_plex
+
+PLAYLIST_ID = 'benchplaylist0000000001'
+
+# Request kinds of the fake servers grouped by the sync phase that issues them
+PHASES = {
+    'spotify_fetch': ('token', 'playlist', 'playlist_tracks', 'tracks', 'rate_limited'),
+    'plex_connect': ('identity', 'library', 'sections'),
+    'plex_lookup': ('search', 'section_search', 'fetch_item', 'children'),
+    'playlist_write': ('playlist_lookup', 'playlist_get', 'playlist_create', 'playlist_upload', 'playlist_items',
+                       'playlist_add', 'playlist_clear', 'playlist_remove', 'playlist_edit', 'playlist_delete',
+                       'upload_poster', 'image'),
+}
+
+def requests_per_phase(*counters):
+    phases = {phase: 0 for phase in PHASES}
+    for counter in counters:
+        for kind, count in counter.items():
+            phase = next((name for name, kinds in PHASES.items() if kind in kinds), 'other')
+            phases[phase] = phases.get(phase, 0) + count
+    return phases
+
+def run_sync(plex_server, spotify_server, options, output_dir):
+    plex_server.reset_counts()
+    spotify_server.reset_counts()
+    start = time.perf_counter()
+    plex = PlexServer(plex_server.url, 'fake-token')
+    playlist = Playlist(name='Benchmark Playlist', description='Synthetic benchmark playlist',
+                        poster=f'{spotify_server.url}/image/cover.jpg')
+    user_inputs = UserInputs(
+        spotify_client_id='bench', spotify_client_secret='bench', spotify_redirect_uri='http://localhost/callback',
+        plex_url=plex_server.url, plex_token='fake-token', spotify_playlist_ids=PLAYLIST_ID,
+        spotify_api_url=spotify_server.api_url, spotify_auth_url=spotify_server.auth_url)
+    metrics = sync_spotify_playlist_with_plex(plex, playlist, user_inputs, PLAYLIST_ID, output_dir, options)
+    seconds = time.perf_counter() - start
+    return {
+        'seconds': seconds,
+        'requests_per_phase': requests_per_phase(plex_server.counts, spotify_server.counts),
+        'plex_requests': dict(plex_server.counts),
+        'spotify_requests': dict(spotify_server.counts),
+        'plex_bytes_out': plex_server.bytes_out,
+        'spotify_bytes_out': spotify_server.bytes_out,
+        'metrics': metrics.summary(),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark a full playlist sync against fake Plex and Spotify servers.")
+    parser.add_argument('--library-size', type=int, default=10000)
+    parser.add_argument('--playlist-size', type=int, default=300)
+    parser.add_argument('--missing-rate', type=float, default=0.1)
+    parser.add_argument('--plex-latency', type=float, default=0.0, help="Seconds added to every Plex request")
+    parser.add_argument('--spotify-latency', type=float, default=0.0, help="Seconds added to every Spotify request")
+    parser.add_argument('--spotify-page-size', type=int, default=100)
+    parser.add_argument('--spotify-throttle', type=float, default=0.0, help="Share of Spotify requests answered with 429")
+    parser.add_argument('--processes', type=int, default=0)
+    parser.add_argument('--resolve-artists', action='store_true', help="Match against per-artist catalogues")
+    parser.add_argument('--resolve-albums', action='store_true', help="Align tracks of albums the playlist holds several of")
+    parser.add_argument('--scoped-search', action='store_true', help="Search only the music section, filtered by artist")
+    parser.add_argument('--playlist-write', choices=('items', 'keys', 'm3u'), default='items',
+                        help="Write playlists from plexapi objects, by rating key, or as an imported M3U8 file")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', type=Path, default=None)
+    args = parser.parse_args()
+
+    library = make_library(args.library_size, seed=args.seed)
+    playlist = make_playlist(library, args.playlist_size, seed=args.seed, noise=DEFAULT_NOISE,
+                             missing_rate=args.missing_rate)
+
+    results = {
+        'benchmark': 'sync',
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'revision': git_revision(),
+        'library_size': args.library_size,
+        'playlist_size': args.playlist_size,
+        'runs': {},
+    }
+    with tempfile.TemporaryDirectory() as work_dir, \
+            FakePlexServer(library, latency=args.plex_latency) as plex_server, \
+            FakeSpotifyServer(latency=args.spotify_latency, page_size=args.spotify_page_size,
+                              throttle_rate=args.spotify_throttle, seed=args.seed) as spotify_server:
+        spotify_server.add_playlist(PLAYLIST_ID, 'Benchmark Playlist', [track_info for track_info, _ in playlist])
+        options = SyncOptions(processes=args.processes, interactive=False, resolve_artists=args.resolve_artists,
+                              resolve_albums=args.resolve_albums, scoped_search=args.scoped_search,
+                              playlist_write=args.playlist_write, m3u_dir=str(Path(work_dir) / 'm3u'),
+                              checkpoint_dir=str(Path(work_dir) / 'checkpoints'),
+                              sync_state_file=str(Path(work_dir) / 'sync_state.json'),
+                              match_storage_file=str(Path(work_dir) / 'matched_tracks.json'))
+        for run in ('cold', 'warm'):
+            results['runs'][run] = run_sync(plex_server, spotify_server, options, Path(work_dir) / run)
+            print(f"{run}: {results['runs'][run]['seconds']:.2f}s, requests per phase "
+                  f"{results['runs'][run]['requests_per_phase']}")
+
+    output = args.output or RESULTS_DIR / f"sync_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=4)
+    print(f"Results written to {output}")
+
+if __name__ == "__main__":
+    main()
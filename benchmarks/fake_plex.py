@@ -0,0 +1,364 @@
+"""
+Local stand-in for the parts of the Plex Media Server API that the sync uses.
+
+It serves a synthetic music library (see benchmarks.synthetic) to plexapi: server
+identity, library sections, track search, fetchItem, playlists and poster uploads.
+Every request is counted by kind so benchmarks can report round trips per phase.
+"""
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+from xml.etree import ElementTree
+
+MACHINE_IDENTIFIER = 'fake-plex-0001'
+SECTION_ID = 1
+
+class FakePlexLibrary:
+    """Tracks, artists, albums and playlists of the fake server."""
+
+    def __init__(self, candidates):
+        self.tracks = {}
+        self.artists = {}
+        self.albums = {}
+        self.playlists = {}
+        self.directories = {}
+        self.album_sizes = Counter()
+        self._next_key = max((candidate.rating_key for candidate in candidates), default=0) + 1
+        self._lock = threading.Lock()
+        for candidate in candidates:
+            self.add_track(candidate)
+
+    def _new_key(self):
+        key = self._next_key
+        self._next_key += 1
+        return key
+
+    def add_track(self, candidate):
+        if candidate.artist not in self.artists:
+            self.artists[candidate.artist] = self._new_key()
+            self.directories[self.artists[candidate.artist]] = ('artist', candidate.artist, None)
+        album = (candidate.artist, candidate.album)
+        if album not in self.albums:
+            self.albums[album] = self._new_key()
+            self.directories[self.albums[album]] = ('album', candidate.artist, candidate.album)
+        self.album_sizes[album] += 1
+        self.tracks[candidate.rating_key] = {
+            'candidate': candidate,
+            'artist_key': self.artists[candidate.artist],
+            'album_key': self.albums[album],
+            'index': self.album_sizes[album],
+        }
+
+    def remove_track(self, rating_key):
+        self.tracks.pop(rating_key, None)
+
+    def create_playlist(self, title, rating_keys, guid=None):
+        with self._lock:
+            playlist_id = self._new_key()
+            self.playlists[playlist_id] = {'title': title, 'summary': '', 'items': [], 'posters': 0,
+                                           'guid': guid or f'com.plexapp.agents.none://{playlist_id}'}
+            self.add_playlist_items(playlist_id, rating_keys)
+        return playlist_id
+
+    def import_m3u(self, path):
+        """Create a playlist from the tracks of an M3U file, found by file path like Plex does."""
+        by_file = {track['candidate'].file: rating_key for rating_key, track in self.tracks.items()}
+        with open(path, 'r', encoding='utf-8') as f:
+            files = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+        title = path.rsplit('/', 1)[-1].rsplit('.', 1)[0]
+        return self.create_playlist(title, [by_file[file] for file in files if file in by_file], f'file://{path}')
+
+    def add_playlist_items(self, playlist_id, rating_keys):
+        items = self.playlists[playlist_id]['items']
+        for rating_key in rating_keys:
+            if rating_key in self.tracks:
+                items.append((self._new_key(), rating_key))
+
+class FakePlexHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    # Route patterns, checked in order; the name is the request kind that gets counted
+    ROUTES = [
+        ('GET', r'/$', 'identity'),
+        ('GET', r'/library/?$', 'library'),
+        ('GET', r'/library/sections/?$', 'sections'),
+        ('GET', r'/library/all$', 'search'),
+        ('GET', r'/library/sections/\d+/all$', 'section_search'),
+        ('GET', r'/library/metadata/(?P<key>\d+)/(children|allLeaves)$', 'children'),
+        ('GET', r'/library/metadata/(?P<key>[\d,]+)$', 'fetch_item'),
+        ('POST', r'/library/metadata/(?P<key>\d+)/posters$', 'upload_poster'),
+        ('GET', r'/playlists/?$', 'playlist_lookup'),
+        ('POST', r'/playlists/?$', 'playlist_create'),
+        ('POST', r'/playlists/upload$', 'playlist_upload'),
+        ('GET', r'/playlists/(?P<key>\d+)$', 'playlist_get'),
+        ('PUT', r'/playlists/(?P<key>\d+)$', 'playlist_edit'),
+        ('DELETE', r'/playlists/(?P<key>\d+)$', 'playlist_delete'),
+        ('GET', r'/playlists/(?P<key>\d+)/items$', 'playlist_items'),
+        ('PUT', r'/playlists/(?P<key>\d+)/items$', 'playlist_add'),
+        ('DELETE', r'/playlists/(?P<key>\d+)/items$', 'playlist_clear'),
+        ('DELETE', r'/playlists/(?P<key>\d+)/items/(?P<item>\d+)$', 'playlist_remove'),
+    ]
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def do_PUT(self):
+        self._dispatch('PUT')
+
+    def do_DELETE(self):
+        self._dispatch('DELETE')
+
+    def _dispatch(self, method):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        parts = urlsplit(self.path)
+        query = {key: values[0] for key, values in parse_qs(parts.query).items()}
+        for route_method, pattern, kind in self.ROUTES:
+            match = re.match(pattern, parts.path)
+            if route_method == method and match:
+                self.server.record(kind, len(body))
+                if self.server.latency:
+                    time.sleep(self.server.latency)
+                container = getattr(self, f'_{kind}')(query, **match.groupdict())
+                self._send(200, container)
+                return
+        self.server.record('unknown', len(body))
+        self._send(404, None)
+
+    def _send(self, status, container):
+        payload = ElementTree.tostring(container, encoding='utf-8') if container is not None else b''
+        self.server.record_bytes(len(payload))
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/xml;charset=utf-8')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    # XML builders
+
+    @property
+    def library(self):
+        return self.server.library
+
+    def _container(self, items=(), **attrs):
+        container = ElementTree.Element('MediaContainer', {key: str(value) for key, value in attrs.items()})
+        for item in items:
+            container.append(item)
+        container.set('size', str(len(container)))
+        return container
+
+    def _page(self, elements):
+        """Apply Plex container paging from headers or query arguments."""
+        query = parse_qs(urlsplit(self.path).query)
+        start = int(self.headers.get('X-Plex-Container-Start') or query.get('X-Plex-Container-Start', [0])[0])
+        size = self.headers.get('X-Plex-Container-Size') or query.get('X-Plex-Container-Size', [None])[0]
+        end = start + int(size) if size is not None else None
+        return self._container(elements[start:end], totalSize=len(elements), offset=start)
+
+    def _track_element(self, rating_key, playlist_item_id=None):
+        track = self.library.tracks[rating_key]
+        candidate = track['candidate']
+        attrs = {
+            'ratingKey': rating_key,
+            'key': f'/library/metadata/{rating_key}',
+            'type': 'track',
+            'guid': candidate.guid or f'plex://track/{rating_key:024x}',
+            'title': candidate.title,
+            'grandparentTitle': candidate.artist,
+            'grandparentRatingKey': track['artist_key'],
+            'grandparentKey': f"/library/metadata/{track['artist_key']}",
+            'parentTitle': candidate.album,
+            'parentRatingKey': track['album_key'],
+            'parentKey': f"/library/metadata/{track['album_key']}",
+            'librarySectionID': SECTION_ID,
+            'duration': candidate.duration or 0,
+            'index': track['index'],
+            'parentIndex': 1,
+        }
+        if playlist_item_id is not None:
+            attrs['playlistItemID'] = playlist_item_id
+        element = ElementTree.Element('Track', {key: str(value) for key, value in attrs.items()})
+        media = ElementTree.SubElement(element, 'Media', {'id': str(rating_key), 'duration': str(candidate.duration or 0),
+                                                          'audioChannels': '2', 'audioCodec': 'flac'})
+        ElementTree.SubElement(media, 'Part', {'id': str(rating_key), 'key': f'/library/parts/{rating_key}/file.flac',
+                                               'file': candidate.file or '', 'duration': str(candidate.duration or 0)})
+        return element
+
+    def _directory_element(self, rating_key):
+        if rating_key not in self.library.directories:
+            return None
+        kind, artist, album = self.library.directories[rating_key]
+        attrs = {'ratingKey': rating_key, 'key': f'/library/metadata/{rating_key}/children', 'type': kind,
+                 'title': album if kind == 'album' else artist, 'librarySectionID': SECTION_ID}
+        if kind == 'album':
+            attrs.update(parentTitle=artist, parentRatingKey=self.library.artists[artist],
+                         leafCount=self.library.album_sizes[(artist, album)])
+        return ElementTree.Element('Directory', {key: str(value) for key, value in attrs.items()})
+
+    def _playlist_element(self, playlist_id):
+        playlist = self.library.playlists[playlist_id]
+        return ElementTree.Element('Playlist', {
+            'ratingKey': str(playlist_id), 'key': f'/playlists/{playlist_id}/items', 'type': 'playlist',
+            'title': playlist['title'], 'summary': playlist['summary'], 'smart': '0', 'playlistType': 'audio',
+            'guid': playlist['guid'],
+            'leafCount': str(len(playlist['items']))})
+
+    def _matching_tracks(self, query):
+        title = query.get('title', '').lower()
+        artist = (query.get('artist.title') or query.get('grandparentTitle') or '').lower()
+        return [self._track_element(rating_key) for rating_key, track in self.library.tracks.items()
+                if title in track['candidate'].title.lower() and artist in track['candidate'].artist.lower()]
+
+    @staticmethod
+    def _uri_keys(uri):
+        keys = uri.rsplit('/', 1)[-1]
+        return [int(key) for key in keys.split(',') if key]
+
+    # Request kinds
+
+    def _identity(self, query):
+        return self._container(friendlyName='Fake Plex', machineIdentifier=MACHINE_IDENTIFIER,
+                               version='1.40.0.0', platform='Linux', myPlex='0')
+
+    def _library(self, query):
+        return self._container(title1='Plex Library')
+
+    def _sections(self, query):
+        section = ElementTree.Element('Directory', {'key': str(SECTION_ID), 'type': 'artist', 'title': 'Music',
+                                                    'agent': 'tv.plex.agents.music', 'scanner': 'Plex Music',
+                                                    'language': 'en-US', 'uuid': 'fake-music-section'})
+        return self._container([section])
+
+    def _search(self, query):
+        return self._page(self._matching_tracks(query))
+
+    def _section_search(self, query):
+        # Plex search types: 8 artists, 9 albums, anything else tracks
+        kind = {'8': 'artist', '9': 'album'}.get(query.get('type'))
+        if kind:
+            title = query.get('title', '').lower()
+            return self._page([self._directory_element(rating_key)
+                               for rating_key, (directory_kind, artist, album) in self.library.directories.items()
+                               if directory_kind == kind and title in (album if kind == 'album' else artist).lower()])
+        return self._page(self._matching_tracks(query))
+
+    def _children(self, query, key):
+        key = int(key)
+        tracks = [rating_key for rating_key, track in self.library.tracks.items()
+                  if key in (track['artist_key'], track['album_key'])]
+        return self._page([self._track_element(rating_key) for rating_key in tracks])
+
+    def _fetch_item(self, query, key):
+        elements = []
+        for rating_key in (int(part) for part in key.split(',')):
+            if rating_key in self.library.tracks:
+                elements.append(self._track_element(rating_key))
+            else:
+                directory = self._directory_element(rating_key)
+                if directory is not None:
+                    elements.append(directory)
+        return self._container(elements)
+
+    def _upload_poster(self, query, key):
+        playlist = self.library.playlists.get(int(key))
+        if playlist is not None:
+            playlist['posters'] += 1
+        return self._container()
+
+    def _playlist_lookup(self, query):
+        title = query.get('title', '').lower()
+        return self._container([self._playlist_element(playlist_id)
+                                for playlist_id, playlist in self.library.playlists.items()
+                                if title in playlist['title'].lower()])
+
+    def _playlist_create(self, query):
+        playlist_id = self.library.create_playlist(query.get('title', ''), self._uri_keys(query.get('uri', '')))
+        return self._container([self._playlist_element(playlist_id)])
+
+    def _playlist_upload(self, query):
+        self.library.import_m3u(query['path'])
+        return self._container()
+
+    def _playlist_delete(self, query, key):
+        self.library.playlists.pop(int(key), None)
+        return self._container()
+
+    def _playlist_get(self, query, key):
+        return self._container([self._playlist_element(int(key))])
+
+    def _playlist_edit(self, query, key):
+        # plexapi's editTitle/editSummary send title.value and summary.value
+        for field in ('title', 'summary'):
+            for name in (field, f'{field}.value'):
+                if name in query:
+                    self.library.playlists[int(key)][field] = query[name]
+        return self._container()
+
+    def _playlist_items(self, query, key):
+        items = self.library.playlists[int(key)]['items']
+        return self._page([self._track_element(rating_key, item_id) for item_id, rating_key in items
+                           if rating_key in self.library.tracks])
+
+    def _playlist_add(self, query, key):
+        self.library.add_playlist_items(int(key), self._uri_keys(query.get('uri', '')))
+        return self._container([self._playlist_element(int(key))])
+
+    def _playlist_clear(self, query, key):
+        self.library.playlists[int(key)]['items'] = []
+        return self._container()
+
+    def _playlist_remove(self, query, key, item):
+        playlist = self.library.playlists[int(key)]
+        playlist['items'] = [entry for entry in playlist['items'] if entry[0] != int(item)]
+        return self._container()
+
+class FakePlexServer(ThreadingHTTPServer):
+    """Fake Plex server running on a background thread; use as a context manager."""
+    daemon_threads = True
+
+    def __init__(self, candidates, latency=0.0, host='127.0.0.1', port=0):
+        super().__init__((host, port), FakePlexHandler)
+        self.library = FakePlexLibrary(candidates)
+        self.latency = latency
+        self.counts = Counter()
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self._counter_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def record(self, kind, size):
+        with self._counter_lock:
+            self.counts[kind] += 1
+            self.bytes_in += size
+
+    def record_bytes(self, size):
+        with self._counter_lock:
+            self.bytes_out += size
+
+    def reset_counts(self):
+        with self._counter_lock:
+            self.counts.clear()
+            self.bytes_in = self.bytes_out = 0
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,201 @@
+"""
+Local stand-in for the Spotify Web API endpoints the sync uses.
+
+Serves the client-credentials token endpoint, playlist metadata, paginated playlist
+tracks, track lookups and cover images, with configurable latency, page size and a share of requests answered with
+429 Too Many Requests. Requests are counted by kind.
+"""
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+def spotify_track_object(track_info, position):
+    """Expand synthetic track info (see benchmarks.synthetic) into a Web API track object."""
+    track_id = track_info.id
+    return {
+        'id': track_id,
+        'name': track_info.name,
+        'type': 'track',
+        'artists': [{'id': f"artist{zlib.crc32(name.encode('utf-8')):08x}", 'name': name} for name in track_info.artists],
+        'album': {
+            'id': f"album{zlib.crc32((track_info.artist + track_info.album).encode('utf-8')):08x}",
+            'name': track_info.album,
+            'images': [],
+            'release_date': '2020-01-01',
+            'total_tracks': 12,
+        },
+        'duration_ms': track_info.duration_ms,
+        'disc_number': track_info.disc_number or 1,
+        'track_number': track_info.track_number or position % 12 + 1,
+        'explicit': False,
+        'popularity': 50,
+        'is_local': False,
+        'preview_url': None,
+        'external_ids': {'isrc': f"XX{track_id[-10:].upper():0>10}"},
+        'external_urls': {'spotify': f"https://open.spotify.com/track/{track_id}"},
+        'href': f"https://api.spotify.com/v1/tracks/{track_id}",
+        'uri': f"spotify:track:{track_id}",
+    }
+
+class FakeSpotifyHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    ROUTES = [
+        ('POST', r'/api/token$', 'token'),
+        ('GET', r'/v1/playlists/(?P<playlist_id>[^/]+)$', 'playlist'),
+        # Older spotipy releases page through /tracks, newer ones through /items
+        ('GET', r'/v1/playlists/(?P<playlist_id>[^/]+)/(?:tracks|items)$', 'playlist_tracks'),
+        ('GET', r'/v1/tracks/?$', 'tracks'),
+        ('GET', r'/image/(?P<name>[^/]+)$', 'image'),
+    ]
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def _dispatch(self, method):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        parts = urlsplit(self.path)
+        query = {key: values[0] for key, values in parse_qs(parts.query).items()}
+        for route_method, pattern, kind in self.ROUTES:
+            match = re.match(pattern, parts.path)
+            if route_method == method and match:
+                if self.server.latency:
+                    time.sleep(self.server.latency)
+                if kind != 'token' and self.server.should_throttle():
+                    self.server.record('rate_limited')
+                    self._send(429, {'error': {'status': 429, 'message': 'API rate limit exceeded'}},
+                               {'Retry-After': '0'})
+                    return
+                self.server.record(kind)
+                status, body = getattr(self, f'_{kind}')(query, **match.groupdict())
+                self._send(status, body)
+                return
+        self.server.record('unknown')
+        self._send(404, {'error': {'status': 404, 'message': 'Not found'}})
+
+    def _send(self, status, body, headers=None):
+        is_image = isinstance(body, bytes)
+        payload = body if is_image else json.dumps(body).encode('utf-8')
+        self.server.record_bytes(len(payload))
+        self.send_response(status)
+        self.send_header('Content-Type', 'image/jpeg' if is_image else 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _token(self, query):
+        return 200, {'access_token': 'fake-token', 'token_type': 'Bearer', 'expires_in': 3600}
+
+    def _playlist(self, query, playlist_id):
+        playlist = self.server.playlists.get(playlist_id)
+        if playlist is None:
+            return 404, {'error': {'status': 404, 'message': 'Not found'}}
+        return 200, {
+            'id': playlist_id,
+            'name': playlist['name'],
+            'description': playlist['description'],
+            'images': [{'url': playlist['poster']}] if playlist['poster'] else [],
+            'snapshot_id': playlist['snapshot_id'],
+            'tracks': {'total': len(playlist['items'])},
+        }
+
+    def _playlist_tracks(self, query, playlist_id):
+        playlist = self.server.playlists.get(playlist_id)
+        if playlist is None:
+            return 404, {'error': {'status': 404, 'message': 'Not found'}}
+        offset = int(query.get('offset', 0))
+        limit = min(int(query.get('limit', 100)), self.server.page_size)
+        items = playlist['items'][offset:offset + limit]
+        next_offset = offset + len(items)
+        next_url = None
+        if next_offset < len(playlist['items']):
+            next_url = f"{self.server.url}{urlsplit(self.path).path}?offset={next_offset}&limit={limit}"
+        return 200, {'items': items, 'offset': offset, 'limit': limit, 'total': len(playlist['items']), 'next': next_url}
+
+    def _tracks(self, query):
+        return 200, {'tracks': [self.server.tracks.get(track_id) for track_id in query.get('ids', '').split(',')]}
+
+    def _image(self, query, name):
+        # Stable bytes per name, standing in for a cover image
+        return 200, hashlib.sha256(name.encode('utf-8')).digest() * 256
+
+class FakeSpotifyServer(ThreadingHTTPServer):
+    """Fake Spotify Web API running on a background thread; use as a context manager."""
+    daemon_threads = True
+
+    def __init__(self, latency=0.0, page_size=100, throttle_rate=0.0, seed=0, host='127.0.0.1', port=0):
+        super().__init__((host, port), FakeSpotifyHandler)
+        self.latency = latency
+        self.page_size = page_size
+        self.throttle_rate = throttle_rate
+        self.playlists = {}
+        self.tracks = {}
+        self.counts = Counter()
+        self.bytes_out = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def api_url(self):
+        return f'{self.url}/v1/'
+
+    @property
+    def auth_url(self):
+        return f'{self.url}/api/token'
+
+    def add_playlist(self, playlist_id, name, track_infos, description='', poster=''):
+        """Register a playlist built from synthetic Tracks."""
+        items = [{'added_at': '2024-01-01T00:00:00Z', 'track': spotify_track_object(track_info, position)}
+                 for position, track_info in enumerate(track_infos)]
+        self.tracks.update((item['track']['id'], item['track']) for item in items)
+        self.playlists[playlist_id] = {'name': name, 'description': description, 'poster': poster,
+                                       'snapshot_id': f'snapshot-{len(items)}', 'items': items}
+
+    def should_throttle(self):
+        with self._lock:
+            return self._random.random() < self.throttle_rate
+
+    def record(self, kind):
+        with self._lock:
+            self.counts[kind] += 1
+
+    def record_bytes(self, size):
+        with self._lock:
+            self.bytes_out += size
+
+    def reset_counts(self):
+        with self._lock:
+            self.counts.clear()
+            self.bytes_out = 0
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,82 @@
+import random
+from helper_classes.candidate import PlexCandidate
+from helper_classes.track import Track
+
+WORDS = [
+    'love', 'night', 'heart', 'fire', 'dream', 'light', 'rain', 'summer', 'blue', 'gold',
+    'city', 'river', 'stars', 'shadow', 'echo', 'wild', 'home', 'ghost', 'paper', 'silver',
+    'electric', 'ocean', 'midnight', 'sugar', 'thunder', 'velvet', 'neon', 'glass', 'storm', 'honey',
+    'intro', 'outro', 'forever', 'young', 'broken', 'golden', 'secret', 'falling', 'highway', 'morning',
+]
+
+def _words(rng, low, high):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(low, high))).title()
+
+def make_library(size, seed=0, tracks_per_artist=40, tracks_per_album=12):
+    """Generate a synthetic Plex music library of PlexCandidates with unique rating keys."""
+    rng = random.Random(seed)
+    candidates = []
+    rating_key = 100000
+    artist_count = max(1, size // tracks_per_artist)
+    artists = [f"{_words(rng, 1, 3)} {i}" for i in range(artist_count)]
+    while len(candidates) < size:
+        artist = rng.choice(artists)
+        album = _words(rng, 1, 4)
+        for disc_index in range(1, tracks_per_album + 1):
+            if len(candidates) >= size:
+                break
+            rating_key += rng.randint(1, 5)
+            title = _words(rng, 1, 4)
+            duration = rng.randint(90000, 420000)
+            file = f"/music/{artist}/{album}/{disc_index:02} - {title}.flac"
+            candidates.append(PlexCandidate.create(rating_key, title, artist, album, duration, file))
+    return candidates
+
+def make_spotify_track(candidate, rng, noise):
+    """Build a Spotify Track for a library track, applying the requested noise."""
+    name = candidate.title
+    artists = [candidate.artist]
+    album = candidate.album
+    duration_ms = candidate.duration
+
+    if rng.random() < noise.get('featuring', 0):
+        featured = _words(rng, 1, 2)
+        name = f"{name} (feat. {featured})"
+        artists.append(featured)
+    if rng.random() < noise.get('parentheses', 0):
+        name = f"{name} ({rng.choice(['Live', 'Radio Edit', 'Acoustic', 'Mono'])})"
+    if rng.random() < noise.get('remaster', 0):
+        suffix = f" - Remastered {rng.randint(1995, 2023)}"
+        name += suffix
+        album += suffix
+    jitter = noise.get('duration_jitter_ms', 0)
+    if jitter:
+        duration_ms += rng.randint(-jitter, jitter)
+
+    # make_library names files "<track number> - <title>.flac"
+    track_number = int(candidate.file.rsplit('/', 1)[-1].split(' - ', 1)[0]) if candidate.file else None
+    return Track(id=f"sp{candidate.rating_key}", name=name, artists=artists, album=album, duration_ms=duration_ms,
+                 disc_number=1, track_number=track_number)
+
+def make_playlist(library, size, seed=0, noise=None, missing_rate=0.1):
+    """
+    Generate (Track, expected_rating_key) pairs from a synthetic library.
+
+    A missing_rate share of the tracks has no counterpart in the library and expects None.
+    """
+    rng = random.Random(seed + 1)
+    noise = noise or {}
+    # Missing tracks take rating keys past the library's, which keeps their Spotify ids base62
+    missing_key = max((candidate.rating_key for candidate in library), default=0) + 1
+    playlist = []
+    for i in range(size):
+        source = rng.choice(library)
+        if rng.random() < missing_rate:
+            # Same artist, unknown song: the hardest kind of negative for the matcher
+            missing = PlexCandidate.create(missing_key + i, _words(rng, 5, 6), source.artist, _words(rng, 2, 3),
+                                           rng.randint(90000, 420000))
+            track_info = make_spotify_track(missing, rng, noise)
+            playlist.append((track_info, None))
+        else:
+            playlist.append((make_spotify_track(source, rng, noise), source.rating_key))
+    return playlist
@@ -0,0 +1,2 @@
+# pre_match_tracks_gui_test.py is a variant of the pre-match GUI, not a test module
+collect_ignore = ['pre_match_tracks_gui_test.py']
@@ -0,0 +1,38 @@
+from collections import namedtuple
+from utils.normalization import normalize_name
+
+
+class PlexCandidate(namedtuple('PlexCandidate', [
+        'rating_key', 'title', 'artist', 'album', 'duration', 'file',
+        'norm_title', 'norm_artist', 'norm_album', 'guid'], defaults=(None,))):
+    """
+    Plain, picklable view of a Plex track holding only the fields matching needs, plus
+    the agent GUID that identifies the recording across Plex servers.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def create(cls, rating_key, title, artist, album, duration=None, file=None, guid=None):
+        return cls(rating_key, title, artist, album, duration, file,
+                   normalize_name(title or ''), normalize_name(artist or ''), normalize_name(album or ''), guid)
+
+    @classmethod
+    def from_plex_track(cls, track):
+        # grandparentTitle/parentTitle come with the search response, unlike
+        # track.artist()/track.album() which each cost a request.
+        media = getattr(track, 'media', None)
+        file = media[0].parts[0].file if media and media[0].parts else None
+        return cls.create(track.ratingKey, track.title, track.grandparentTitle, track.parentTitle,
+                          getattr(track, 'duration', None), file, getattr(track, 'guid', None))
+
+
+def as_candidate(track):
+    """Return the track as a PlexCandidate, converting plexapi tracks on the fly."""
+    if isinstance(track, PlexCandidate):
+        return track
+    return PlexCandidate.from_plex_track(track)
+
+
+def rating_key_of(track):
+    """The rating key of a PlexCandidate or plexapi track."""
+    return track.rating_key if isinstance(track, PlexCandidate) else track.ratingKey
@@ -0,0 +1,36 @@
+class SyncOptions:
+    def __init__(self, processes=0, certain_score=None, max_duration_diff_ms=None, use_library_index=False,
+                 interactive=True, match_storage_file="matched_tracks.json",
+                 metrics_textfile_dir=None, library_snapshot=None, library_snapshot_max_age_hours=None,
+                 delta_sync=False, sync_state_file="sync_state.json", playlist_chunk_size=200, write_threads=4,
+                 resolve_artists=False, resolve_albums=False, album_min_tracks=2, scoped_search=False,
+                 music_section=None, search_max_results=50, checkpoint_dir="checkpoints", checkpoint_every=50,
+                 checkpoint_interval_seconds=60, resume=False, playlist_write="items", m3u_dir="m3u",
+                 m3u_server_dir=None, report_details=False):
+        self.processes = processes  # Worker processes for candidate scoring; 0 or 1 scores inline
+        self.certain_score = certain_score  # Stop scoring a track's candidates once one scores this high (0-100)
+        self.max_duration_diff_ms = max_duration_diff_ms  # Skip candidates whose length differs by more
+        self.use_library_index = use_library_index  # Match against a local index of the library instead of per-track searches
+        self.library_snapshot = library_snapshot  # File the library index is memory-mapped from and saved to
+        self.library_snapshot_max_age_hours = library_snapshot_max_age_hours  # Rebuild the snapshot from Plex when older
+        self.interactive = interactive  # Ask the user to pick a track when no match is certain enough
+        self.match_storage_file = match_storage_file
+        self.metrics_textfile_dir = metrics_textfile_dir  # Node exporter textfile collector directory for sync metrics
+        self.delta_sync = delta_sync  # Only process playlist items added or removed since the last sync
+        self.sync_state_file = sync_state_file  # What was last written to each Plex playlist, for delta syncs
+        self.playlist_chunk_size = playlist_chunk_size  # Tracks per Plex playlist add/remove request batch
+        self.write_threads = write_threads  # Concurrent Plex requests while writing a playlist
+        self.resolve_artists = resolve_artists  # Fetch each artist's Plex tracks once instead of searching per track
+        self.resolve_albums = resolve_albums  # Match whole albums and align their tracks by disc and track number
+        self.album_min_tracks = album_min_tracks  # Playlist tracks from one album needed before it is resolved as a whole
+        self.scoped_search = scoped_search  # Search only the music section, filtering by artist on the server
+        self.music_section = music_section  # ID or title of the music section; the first one when None
+        self.search_max_results = search_max_results  # Cap on the tracks returned per search
+        self.checkpoint_dir = checkpoint_dir  # Where the progress of running playlist syncs is saved when resume is on
+        self.checkpoint_every = checkpoint_every  # Tracks processed between checkpoints
+        self.checkpoint_interval_seconds = checkpoint_interval_seconds  # Longest time between checkpoints
+        self.resume = resume  # Checkpoint syncs and continue an interrupted one from its checkpoint
+        self.playlist_write = playlist_write  # How playlists are written: items (plexapi objects), keys or m3u
+        self.m3u_dir = m3u_dir  # Where M3U8 files for Plex to import are written
+        self.m3u_server_dir = m3u_server_dir  # The same directory as the Plex server sees it, when it differs
+        self.report_details = report_details  # Fetch media details of new matches for the report when not writing items
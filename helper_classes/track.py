@@ -1,5 +1,88 @@
+def format_duration(ms):
+    """Convert milliseconds to hh:mm:ss or mm:ss format."""
+    seconds = int((ms / 1000) % 60)
+    minutes = int((ms / (1000 * 60)) % 60)
+    hours = int((ms / (1000 * 60 * 60)) % 24)
+    if hours > 0:
+        return f"{hours:02}:{minutes:02}:{seconds:02}"
+    else:
+        return f"{minutes:02}:{seconds:02}"
+
 class Track:
-    def __init__(self, title, artist, album=None):
-        self.title = title
-        self.artist = artist
+    """A Spotify track reduced to the fields matching and the sync report need."""
+    __slots__ = ('id', 'name', 'artists', 'album', 'album_id', 'album_year', 'album_total_tracks', 'duration_ms',
+                 'disc_number', 'track_number', 'isrc', 'cover_url', 'preview_url', 'added_at')
+
+    def __init__(self, id: str, name: str, artists: tuple, album: str, duration_ms: int = 0, album_id: str = None,
+                 disc_number: int = None, track_number: int = None, isrc: str = None, cover_url: str = None,
+                 preview_url: str = None, added_at: str = None, album_year: str = None, album_total_tracks: int = None):
+        self.id = id
+        self.name = name
+        self.artists = tuple(artists)
         self.album = album
+        self.album_id = album_id
+        self.album_year = album_year
+        self.album_total_tracks = album_total_tracks
+        self.duration_ms = duration_ms
+        self.disc_number = disc_number
+        self.track_number = track_number
+        self.isrc = isrc
+        self.cover_url = cover_url
+        self.preview_url = preview_url
+        self.added_at = added_at
+
+    @classmethod
+    def from_spotify(cls, track: dict, added_at: str = None):
+        """Build a Track from a Spotify Web API track object."""
+        album = track.get('album') or {}
+        images = album.get('images') or []
+        return cls(
+            id=track.get('id'),
+            name=track['name'],
+            artists=[artist['name'] for artist in track['artists']],
+            album=album.get('name', ''),
+            duration_ms=track.get('duration_ms') or 0,
+            album_id=album.get('id'),
+            disc_number=track.get('disc_number'),
+            track_number=track.get('track_number'),
+            isrc=(track.get('external_ids') or {}).get('isrc'),
+            cover_url=images[0]['url'] if images else None,
+            preview_url=track.get('preview_url'),
+            added_at=added_at,
+            album_year=(album.get('release_date') or '')[:4] or None,
+            album_total_tracks=album.get('total_tracks')
+        )
+
+    @property
+    def artist(self):
+        """The primary artist."""
+        return self.artists[0] if self.artists else ''
+
+    @property
+    def duration(self):
+        return format_duration(self.duration_ms)
+
+    def to_dict(self):
+        """Spotify track info for the JSON output, with the derived fields formatted on demand."""
+        return {
+            'name': self.name,
+            'artists': list(self.artists),
+            'album': self.album,
+            'album_id': self.album_id,
+            'album_year': self.album_year,
+            'album_total_tracks': self.album_total_tracks,
+            'preview_url': self.preview_url,
+            'disc_number': self.disc_number,
+            'track_number': self.track_number,
+            'duration': self.duration,
+            'duration_ms': self.duration_ms,
+            'external_ids': {'isrc': self.isrc} if self.isrc else {},
+            'external_urls': {'spotify': f"https://open.spotify.com/track/{self.id}"} if self.id else {},
+            'id': self.id,
+            'uri': f"spotify:track:{self.id}" if self.id else None,
+            'added_at': self.added_at,
+            'cover_url': self.cover_url
+        }
+
+    def __repr__(self):
+        return f"Track({self.id!r}, {self.name!r}, {self.artist!r})"
@@ -1,8 +1,10 @@
 class UserInputs:
-    def __init__(self, spotify_client_id, spotify_client_secret, spotify_redirect_uri, plex_url, plex_token, spotify_playlist_ids):
+    def __init__(self, spotify_client_id, spotify_client_secret, spotify_redirect_uri, plex_url, plex_token, spotify_playlist_ids, spotify_api_url=None, spotify_auth_url=None):
         self.spotify_client_id = spotify_client_id
         self.spotify_client_secret = spotify_client_secret
         self.spotify_redirect_uri = spotify_redirect_uri
         self.plex_url = plex_url
         self.plex_token = plex_token
         self.spotify_playlist_ids = spotify_playlist_ids
+        self.spotify_api_url = spotify_api_url  # Stand-in Spotify Web API, e.g. for offline benchmarks
+        self.spotify_auth_url = spotify_auth_url
@@ -1,4 +1,7 @@
 import sys
+import argparse
+import signal
+from contextlib import nullcontext
 from pathlib import Path
 from configparser import ConfigParser
 import logging
@@ -9,59 +12,154 @@ from utils.spotify_functions import sync_spotify_playlist_with_plex, fetch_playl
 from helper_classes.playlist import Playlist
 from helper_classes.user_inputs import UserInputs
 from utils.gui import UserSelectionApp
+from utils.config import read_job_queue, read_sync_options, read_user_tokens
+from utils.library_index import LibraryIndex
+from utils.library_snapshot import load_or_build_index
+from utils.tag_index import TagIndex, DEFAULT_SCAN_THREADS
+from utils.daemon import SyncDaemon, DEFAULT_POLL_INTERVAL
+from utils.worker import SyncWorker, DEFAULT_IDLE_WAIT
+from utils.profiling import SyncProfiler, add_profile_arguments
+from utils.structured_logging import create_formatter, queue_handler
 from datetime import datetime
 
-def setup_logging(log_directory):
+def setup_logging(log_directory, structured=False):
     log_directory.mkdir(parents=True, exist_ok=True)
+    suffix = '.jsonl' if structured else '.log'
 
     console_handler = logging.StreamHandler()
     console_handler.setStream(sys.stdout)
-    console_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    console_handler.setFormatter(create_formatter(False))
 
     def create_file_handler(log_filename):
         file_handler = logging.FileHandler(log_filename, encoding='utf-8')
-        file_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+        file_handler.setFormatter(create_formatter(structured))
         return file_handler
 
     # Create log files
-    main_log_file = log_directory / 'main.log'
-    spotify_log_file = log_directory / 'spotify.log'
-    plex_log_file = log_directory / 'plex.log'
-    error_log_file = log_directory / 'error.log'
-    app_log_file = log_directory / 'app.log'
-
-    logging.basicConfig(level=logging.INFO, handlers=[
+    main_log_file = log_directory / f'main{suffix}'
+    spotify_log_file = log_directory / f'spotify{suffix}'
+    plex_log_file = log_directory / f'plex{suffix}'
+    error_log_file = log_directory / f'error{suffix}'
+    app_log_file = log_directory / f'app{suffix}'
+
+    # Handlers sit behind queues so writing the logs doesn't slow down the sync thread.
+    # force replaces the stderr handler utils.spotify_functions installs on import.
+    logging.basicConfig(level=logging.INFO, force=True, handlers=[queue_handler([
         console_handler,
         create_file_handler(main_log_file),
         create_file_handler(app_log_file)
-    ])
+    ])])
 
     # Create individual loggers
     error_logger = logging.getLogger('error')
     error_logger.setLevel(logging.ERROR)
-    error_logger.addHandler(create_file_handler(error_log_file))
+    error_logger.addHandler(queue_handler([create_file_handler(error_log_file)]))
 
     spotify_logger = logging.getLogger('spotify')
     spotify_logger.setLevel(logging.INFO)
-    spotify_logger.addHandler(create_file_handler(spotify_log_file))
+    spotify_logger.addHandler(queue_handler([create_file_handler(spotify_log_file)]))
 
     plex_logger = logging.getLogger('plex')
     plex_logger.setLevel(logging.INFO)
-    plex_logger.addHandler(create_file_handler(plex_log_file))
+    plex_logger.addHandler(queue_handler([create_file_handler(plex_log_file)]))
 
     return logging.getLogger('main'), spotify_logger, plex_logger, error_logger
 
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Sync Spotify playlists to Plex.")
+    add_profile_arguments(parser)
+    parser.add_argument('--refresh-library', action='store_true',
+                        help="Rebuild the library snapshot from Plex even if it is still fresh")
+    parser.add_argument('--resume', action='store_true',
+                        help="Checkpoint playlist syncs and continue interrupted ones from their last checkpoint; "
+                             "set [sync] resume to checkpoint every run")
+    parser.add_argument('--daemon', action='store_true',
+                        help="Keep running and resync playlists for all configured users whenever they change on Spotify")
+    parser.add_argument('--enqueue', action='store_true',
+                        help="Queue a sync job for every configured playlist and user in the [worker] queue and exit")
+    parser.add_argument('--worker', action='store_true',
+                        help="Run sync jobs from the [worker] queue, alongside workers on this or other hosts")
+    parser.add_argument('--exit-when-idle', action='store_true',
+                        help="Stop the worker once the queue has no due jobs")
+    args, _ = parser.parse_known_args(argv)  # Leave Qt's own arguments alone
+    return args
+
 def main():
+    args = parse_args()
+
+    # Read configuration
+    config = ConfigParser()
+    config.read('config.txt')
+
     # Create log directory with timestamp
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     log_directory = Path('logs') / timestamp
-    main_logger, spotify_logger, plex_logger, error_logger = setup_logging(log_directory)
+    structured_logs = config.getboolean('logging', 'structured', fallback=False)
+    main_logger, spotify_logger, plex_logger, error_logger = setup_logging(log_directory, structured_logs)
 
     main_logger.info("Starting application...")
 
-    # Read configuration
-    config = ConfigParser()
-    config.read('config.txt')
+    options = read_sync_options(config)
+    options.resume = options.resume or args.resume
+
+    if args.enqueue:
+        job_queue = read_job_queue(config)
+        playlist_ids = [playlist_id.strip() for playlist_id in config['playlists']['playlist_ids'].split(',') if playlist_id.strip()]
+        queued = 0
+        for playlist_id in playlist_ids:
+            for user in read_user_tokens(config):
+                queued += job_queue.enqueue(playlist_id, user)
+        main_logger.info(f"Queued {queued} sync jobs in {job_queue.path}; jobs by status: {job_queue.counts()}")
+        return
+
+    library_index = None
+    if options.use_library_index:
+        try:
+            plex = PlexServer(config['plex']['url'], config['plex']['token'])
+            if options.library_snapshot:
+                library_index = load_or_build_index(plex, options.library_snapshot,
+                                                    options.library_snapshot_max_age_hours, args.refresh_library)
+            else:
+                library_index = LibraryIndex.from_plex(plex)
+        except Exception as e:
+            error_logger.error(f"Error indexing Plex library, falling back to per-track searches: {e}")
+
+    if library_index is not None and config.has_option('tags', 'music_dir'):
+        try:
+            tag_index = TagIndex(config.get('tags', 'cache_file', fallback='tag_index.json'))
+            tag_index.scan(config['tags']['music_dir'], config.getint('tags', 'threads', fallback=DEFAULT_SCAN_THREADS))
+            tag_index.save()
+            library_index = tag_index.join(library_index, config.get('tags', 'plex_music_dir', fallback=None),
+                                           config['tags']['music_dir'])
+        except Exception as e:
+            error_logger.error(f"Error scanning music file tags, matching with Plex metadata only: {e}")
+
+    profiler = SyncProfiler(log_directory, 'sync_profile', args.profile_sample_interval) if args.profile else None
+
+    if args.worker:
+        worker = SyncWorker(config, options, Path('output') / 'worker', read_job_queue(config),
+                            worker_id=config.get('worker', 'worker_id', fallback=None),
+                            idle_wait=config.getfloat('worker', 'idle_wait_seconds', fallback=DEFAULT_IDLE_WAIT),
+                            library_index=library_index)
+        signal.signal(signal.SIGTERM, lambda signum, frame: worker.stop())
+        with profiler.section() if profiler else nullcontext():
+            worker.run(args.exit_when_idle)
+        if profiler:
+            profiler.write()
+        return
+
+    if args.daemon:
+        job_queue = read_job_queue(config) if config.getboolean('daemon', 'enqueue', fallback=False) else None
+        daemon = SyncDaemon(config, options, Path('output') / 'daemon',
+                            state_file=config.get('daemon', 'state_file', fallback='daemon_state.json'),
+                            interval=config.getfloat('daemon', 'interval_seconds', fallback=DEFAULT_POLL_INTERVAL),
+                            library_index=library_index, job_queue=job_queue)
+        signal.signal(signal.SIGTERM, lambda signum, frame: daemon.stop())
+        with profiler.section() if profiler else nullcontext():
+            daemon.run()
+        if profiler:
+            profiler.write()
+        return
 
     # Start the GUI to select users
     app = QApplication(sys.argv)
@@ -72,7 +170,8 @@ def main():
 
         try:
             # Fetch playlist information
-            playlist_info = fetch_playlist_info(config['spotify']['client_id'], config['spotify']['client_secret'], playlist_id)
+            playlist_info = fetch_playlist_info(config['spotify']['client_id'], config['spotify']['client_secret'], playlist_id,
+                                                config['spotify'].get('api_url'), config['spotify'].get('auth_url'))
             spotify_logger.info(f"Fetched playlist info: {playlist_info}")
 
             # Create Playlist instance
@@ -107,7 +206,9 @@ def main():
                     plex_url=config['plex']['url'],
                     plex_token=token,
                     spotify_redirect_uri=config['spotify']['redirect_uri'],
-                    spotify_playlist_ids=config['playlists']['playlist_ids']
+                    spotify_playlist_ids=config['playlists']['playlist_ids'],
+                    spotify_api_url=config['spotify'].get('api_url'),
+                    spotify_auth_url=config['spotify'].get('auth_url')
                 )
 
                 main_logger.info(f"Plex URL: {user_inputs.plex_url}")
@@ -121,12 +222,16 @@ def main():
                 try:
                     plex = PlexServer(user_inputs.plex_url, user_inputs.plex_token)
                     plex_logger.info(f"Connected to Plex server at {user_inputs.plex_url}")
-                    sync_spotify_playlist_with_plex(plex, playlist, user_inputs, playlist_id, output_dir)
+                    with profiler.section() if profiler else nullcontext():
+                        sync_spotify_playlist_with_plex(plex, playlist, user_inputs, playlist_id, output_dir, options, library_index)
                 except Exception as e:
                     error_logger.error(f"Error connecting to Plex server: {e}")
 
         except Exception as e:
             error_logger.error(f"Error processing playlist ID {playlist_id}: {e}")
 
+    if profiler:
+        profiler.write()
+
 if __name__ == "__main__":
     main()
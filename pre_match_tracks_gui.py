@@ -1,5 +1,8 @@
 import sys
-import json
+import argparse
+import concurrent.futures
+from configparser import ConfigParser
+from contextlib import nullcontext
 import logging
 from datetime import datetime
 from pathlib import Path
@@ -9,12 +12,38 @@ from PyQt5.QtCore import Qt, QUrl
 from PyQt5.QtMultimedia import QMediaPlayer, QMediaContent
 from spotipy import Spotify
 from spotipy.oauth2 import SpotifyClientCredentials
-from utils.config import read_config
+from plexapi.server import PlexServer
+from helper_classes.candidate import as_candidate
+from helper_classes.track import Track, format_duration
+from utils.config import read_config, read_sync_options
+from utils.library_index import LibraryIndex
+from utils.library_snapshot import load_or_build_index
+from utils.match_store import MatchStore
+from utils.matching import MAX_RANK_SCORE, auto_accepted, rank_candidates
+from utils.profiling import SyncProfiler, add_profile_arguments
+from utils.similarity import MAX_NAME_SIMILARITY
+from utils.structured_logging import create_formatter, queue_handler
+
+DEFAULT_SUGGESTIONS = 5
+
+def suggest_matches(track_info, plex, library_index=None, limit=DEFAULT_SUGGESTIONS):
+    """
+    Return the top (PlexCandidate, score) pairs for a Spotify Track, scored like the sync
+    scores them. With a library index every indexed track by the artist is a candidate;
+    without one the candidates come from a Plex title search.
+    """
+    if library_index is not None:
+        candidates = library_index.artist_candidates(track_info.artist)
+    else:
+        candidates = [as_candidate(track) for track in plex.library.search(title=track_info.name, libtype='track')]
+    return rank_candidates(candidates, track_info, limit)
 
 class RatingKeyDialog(QDialog):
-    def __init__(self, track_name, artist_name, album_name, year, duration, track_url, poster_url=None, preview_url=None):
+    def __init__(self, track_name, artist_name, album_name, year, duration, track_url, poster_url=None, preview_url=None,
+                 suggestions=None):
         super().__init__()
         self.result = None
+        self.selected_key = None
         self.preview_url = preview_url
         self.media_player = None
 
@@ -74,6 +103,18 @@ class RatingKeyDialog(QDialog):
 
             self.media_player = QMediaPlayer()
 
+        if suggestions:
+            suggestions_label = QLabel("Suggested Plex tracks:")
+            suggestions_label.setFont(font)
+            layout.addWidget(suggestions_label)
+            for candidate, score in suggestions:
+                button = QPushButton(f"{candidate.title} - {candidate.artist} - {candidate.album} "
+                                     f"({format_duration(candidate.duration or 0)}) [{score:.0f}]")
+                button.setFont(font)
+                button.setToolTip(f"Rating key {candidate.rating_key}\n{candidate.file or ''}")
+                button.clicked.connect(lambda checked, key=candidate.rating_key: self.choose(key))
+                layout.addWidget(button)
+
         input_layout = QHBoxLayout()
         self.input = QLineEdit(self)
         self.input.setFont(font)
@@ -122,7 +163,14 @@ class RatingKeyDialog(QDialog):
         return urlopen(url).read()
         
     def get_rating_key(self):
+        if self.selected_key is not None:
+            return str(self.selected_key)
         return self.input.text().strip()
+
+    def choose(self, rating_key):
+        """Confirm a suggested track with one click."""
+        self.selected_key = rating_key
+        self.submit()
     
     def submit(self):
         self.result = "submit"
@@ -154,6 +202,15 @@ class RatingKeyDialog(QDialog):
             self.media_player.stop()
 
 def main():
+    parser = argparse.ArgumentParser(description="Pre-match Spotify tracks to Plex rating keys.")
+    add_profile_arguments(parser)
+    parser.add_argument('--log-format', choices=['text', 'json'], default='text')
+    parser.add_argument('--auto-accept', type=float, default=None, metavar='SCORE',
+                        help=f"Accept the top suggestion without asking when it scores at least this high. Scores are "
+                             f"not percentages: identical names at the same length score {MAX_RANK_SCORE:g}, or "
+                             f"{MAX_NAME_SIMILARITY:g} when Spotify gives no length")
+    args, _ = parser.parse_known_args()
+
     app = QApplication(sys.argv)
     app.setStyle("Fusion")
     palette = QPalette()
@@ -176,7 +233,12 @@ def main():
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     log_dir = Path("logs") / timestamp
     log_dir.mkdir(parents=True, exist_ok=True)
-    logging.basicConfig(level=logging.INFO, handlers=[logging.FileHandler(log_dir / 'pre_match.log'), logging.StreamHandler()])
+    structured_logs = args.log_format == 'json'
+    file_handler = logging.FileHandler(log_dir / ('pre_match.jsonl' if structured_logs else 'pre_match.log'), encoding='utf-8')
+    file_handler.setFormatter(create_formatter(structured_logs))
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(create_formatter(False))
+    logging.basicConfig(level=logging.INFO, handlers=[queue_handler([file_handler, console_handler])])
     logger = logging.getLogger('pre_match')
 
     config = read_config('config.txt', logger)
@@ -189,22 +251,41 @@ def main():
     client_credentials_manager = SpotifyClientCredentials(client_id=config['SPOTIPY_CLIENT_ID'], client_secret=config['SPOTIPY_CLIENT_SECRET'])
     sp = Spotify(client_credentials_manager=client_credentials_manager)
 
-    matched_tracks_file = Path("matched_tracks.json")
-    if matched_tracks_file.exists():
-        with open(matched_tracks_file, 'r') as f:
-            matched_tracks = json.load(f)
-    else:
-        matched_tracks = {}
+    config_parser = ConfigParser()
+    config_parser.read('config.txt')
+    suggestion_count = config_parser.getint('prematch', 'suggestions', fallback=DEFAULT_SUGGESTIONS)
+    auto_accept_score = args.auto_accept
+    if auto_accept_score is None:
+        auto_accept_score = config_parser.getfloat('prematch', 'auto_accept_score', fallback=None)
+
+    plex = PlexServer(config['PLEX_URL'], config['PLEX_TOKEN'])
+    sync_options = read_sync_options(config_parser)
+    library_index = None
+    if sync_options.use_library_index:
+        try:
+            if sync_options.library_snapshot:
+                library_index = load_or_build_index(plex, sync_options.library_snapshot, sync_options.library_snapshot_max_age_hours)
+            else:
+                library_index = LibraryIndex.from_plex(plex)
+        except Exception as e:
+            logger.error(f"Error indexing Plex library, suggesting from per-track searches: {e}")
+
+    # Suggestions are ranked on a background thread, in queue order, while the operator works through the dialogs
+    suggestion_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+    match_store = MatchStore(sync_options.match_storage_file)
+    matched_tracks = match_store.matches_for(plex, library_index)
 
     def process_playlist(spotify_playlist_id):
         try:
             logger.info(f"Fetching playlist info for ID: {spotify_playlist_id}")
             playlist_info = sp.playlist(spotify_playlist_id)
-            logger.info(f"Playlist info: {playlist_info}")
 
             if not playlist_info:
                 logger.error(f"Failed to fetch playlist info for ID: {spotify_playlist_id}")
                 return
+            logger.info(f"Playlist info: '{playlist_info['name']}' with {playlist_info['tracks']['total']} tracks",
+                        extra={'playlist_id': spotify_playlist_id})
 
             playlist_name = playlist_info['name']
             logger.info(f"Processing playlist '{playlist_name}'...")
@@ -231,6 +312,14 @@ def main():
                 logger.error(f"Failed to fetch tracks for playlist ID: {spotify_playlist_id}")
                 return
 
+            suggestion_futures = {}
+            for position, item in enumerate(spotify_tracks):
+                track = item.get('track')
+                if track and track.get('id') and track['id'] not in matched_tracks:
+                    suggestion_futures[position] = suggestion_executor.submit(
+                        suggest_matches, Track.from_spotify(track), plex, library_index, suggestion_count)
+            logger.info(f"Ranking suggestions for {len(suggestion_futures)} unmatched tracks in the background.")
+
             i = 0
             history = []
             while i < len(spotify_tracks):
@@ -243,7 +332,7 @@ def main():
                 try:
                     track_id = spotify_track['id']
                     if track_id in matched_tracks:
-                        logger.info(f"Track '{spotify_track['name']}' by '{spotify_track['artists'][0]['name']}' is already matched. Skipping.")
+                        logger.debug("Track '%s' is already matched. Skipping.", spotify_track['name'])
                         i += 1
                         continue
 
@@ -264,8 +353,25 @@ def main():
 
                 poster_url = spotify_track['album']['images'][0]['url'] if spotify_track['album']['images'] else None
 
+                try:
+                    suggestions = suggestion_futures[i].result() if i in suggestion_futures else []
+                except Exception as e:
+                    logger.error(f"Error ranking suggestions for '{track_name}': {e}")
+                    suggestions = []
+
+                accepted = auto_accepted(suggestions, auto_accept_score)
+                if accepted:
+                    candidate, score = accepted
+                    matched_tracks[track_id] = candidate.rating_key
+                    match_store.remember(track_id, candidate.file, candidate.guid, spotify_track.get('external_ids', {}).get('isrc'))
+                    logger.info(f"Auto-accepted '{candidate.title}' by '{candidate.artist}' for '{track_name}' (score {score:.1f}).",
+                                extra={'track_id': track_id, 'outcome': 'auto_accepted', 'rating_key': candidate.rating_key})
+                    i += 1
+                    continue
+
                 logger.info(f"Creating dialog for track '{track_name}' by '{artist_name}'")
-                dialog = RatingKeyDialog(track_name, artist_name, album_name, year, duration, track_url, poster_url, preview_url)
+                dialog = RatingKeyDialog(track_name, artist_name, album_name, year, duration, track_url, poster_url, preview_url,
+                                         suggestions)
                 dialog_result = dialog.exec_()
                 logger.info(f"Dialog result for track '{track_name}': {dialog.result}")
 
@@ -276,6 +382,11 @@ def main():
                             matched_tracks[track_id] = int(rating_key)
                         except ValueError:
                             logger.error(f"Invalid rating key '{rating_key}' entered for track '{track_name}'")
+                        else:
+                            chosen = library_index.get(int(rating_key)) if library_index is not None else None
+                            if chosen is not None:
+                                match_store.remember(track_id, chosen.file, chosen.guid,
+                                                     spotify_track.get('external_ids', {}).get('isrc'))
                     i += 1
                 elif dialog.result == "skip":
                     i += 1
@@ -287,21 +398,25 @@ def main():
                     else:
                         logger.warning("Already at the first track, cannot go back.")
                 elif dialog.result == "save":
-                    with open(matched_tracks_file, 'w') as f:
-                        json.dump(matched_tracks, f)
+                    match_store.save()
                 elif dialog.result == "save_and_close":
-                    with open(matched_tracks_file, 'w') as f:
-                        json.dump(matched_tracks, f)
+                    match_store.save()
+                    for future in suggestion_futures.values():
+                        future.cancel()
                     return
 
-            with open(matched_tracks_file, 'w') as f:
-                json.dump(matched_tracks, f)
+            match_store.save()
 
         except Exception as e:
             logger.error(f"Error processing playlist '{spotify_playlist_id}': {e}")
 
+    profiler = SyncProfiler(log_dir, 'pre_match_profile', args.profile_sample_interval) if args.profile else None
     for spotify_playlist_id in spotify_playlist_ids:
-        process_playlist(spotify_playlist_id)
+        with profiler.section() if profiler else nullcontext():
+            process_playlist(spotify_playlist_id)
+    if profiler:
+        profiler.write()
+    suggestion_executor.shutdown(wait=False, cancel_futures=True)
 
     logger.info("Processing complete. Exiting.")
     app.exit()
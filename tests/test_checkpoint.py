@@ -0,0 +1,96 @@
+from helper_classes.candidate import PlexCandidate
+from utils.checkpoint import SyncCheckpoint
+
+TRACK_IDS = ['spotify1', 'spotify2', 'spotify3']
+
+def make_checkpoint(tmp_path, track_ids=TRACK_IDS, target='server/user', **kwargs):
+    return SyncCheckpoint.for_playlist(tmp_path, target, 'playlist', track_ids, resume=True, **kwargs)
+
+def test_save_and_resume(tmp_path):
+    checkpoint = make_checkpoint(tmp_path)
+    candidate = PlexCandidate.create(1, 'Song', 'Artist', 'Album', 200000, '/music/song.flac', 'plex://track/1')
+    checkpoint.record_lookup(0, [candidate], direct=True)
+    checkpoint.record_lookup(1, [])
+    checkpoint.save()
+    checkpoint.record_outcome(0, 1)
+    checkpoint.record_outcome(1, None)
+    checkpoint.save()
+
+    resumed = make_checkpoint(tmp_path)
+    assert resumed.lookups == {0: (True, [candidate]), 1: (False, [])}
+    assert resumed.outcomes == {0: 1, 1: None}
+
+def test_saves_append_only_new_records(tmp_path):
+    checkpoint = make_checkpoint(tmp_path)
+    checkpoint.record_outcome(0, 1)
+    checkpoint.save()
+    size = checkpoint.path.stat().st_size
+    checkpoint.save()
+    assert checkpoint.path.stat().st_size == size
+    checkpoint.record_outcome(1, 2)
+    checkpoint.save()
+    assert len(checkpoint.path.read_text().splitlines()) == 3
+
+def test_resumed_run_appends_to_the_journal(tmp_path):
+    checkpoint = make_checkpoint(tmp_path)
+    checkpoint.record_outcome(0, 1)
+    checkpoint.save()
+    resumed = make_checkpoint(tmp_path)
+    resumed.record_outcome(1, 2)
+    resumed.save()
+    assert make_checkpoint(tmp_path).outcomes == {0: 1, 1: 2}
+
+def test_partial_last_record_is_dropped(tmp_path):
+    checkpoint = make_checkpoint(tmp_path)
+    checkpoint.record_outcome(0, 1)
+    checkpoint.record_outcome(1, 2)
+    checkpoint.save()
+    text = checkpoint.path.read_text()
+    checkpoint.path.write_text(text[:-5])
+
+    resumed = make_checkpoint(tmp_path)
+    assert resumed.outcomes == {0: 1}
+    resumed.record_outcome(2, 3)
+    resumed.save()
+    assert make_checkpoint(tmp_path).outcomes == {0: 1, 2: 3}
+
+def test_nothing_is_kept_without_resume(tmp_path):
+    checkpoint = SyncCheckpoint.for_playlist(tmp_path, 'server/user', 'playlist', TRACK_IDS, every=1)
+    checkpoint.record_lookup(0, [PlexCandidate.create(1, 'Song', 'Artist', 'Album')])
+    checkpoint.record_outcome(0, 1)
+    assert not checkpoint.due()
+    checkpoint.save()
+    assert not checkpoint.path.exists()
+    assert checkpoint.lookups == {} and checkpoint.outcomes == {}
+
+def test_checkpoint_of_other_tracks_is_ignored(tmp_path):
+    checkpoint = make_checkpoint(tmp_path)
+    checkpoint.record_outcome(0, 1)
+    checkpoint.save()
+    resumed = make_checkpoint(tmp_path, TRACK_IDS[:2])
+    assert resumed.outcomes == {}
+    resumed.save()
+    assert make_checkpoint(tmp_path, TRACK_IDS[:2]).outcomes == {}
+
+def test_checkpoints_are_kept_per_target(tmp_path):
+    checkpoint = make_checkpoint(tmp_path, target='server/user1')
+    checkpoint.record_outcome(0, 1)
+    checkpoint.save()
+    assert make_checkpoint(tmp_path, target='server/user2').outcomes == {}
+
+def test_due_after_every_so_many_changes(tmp_path):
+    checkpoint = make_checkpoint(tmp_path, every=2, interval_seconds=3600)
+    assert not checkpoint.due()
+    checkpoint.record_outcome(0, 1)
+    assert not checkpoint.due()
+    checkpoint.record_outcome(1, 2)
+    assert checkpoint.due()
+    checkpoint.save()
+    assert not checkpoint.due()
+
+def test_discard(tmp_path):
+    checkpoint = make_checkpoint(tmp_path)
+    checkpoint.save()
+    checkpoint.discard()
+    assert not checkpoint.path.exists()
+    checkpoint.discard()
@@ -0,0 +1,20 @@
+import pytest
+from plexapi.server import PlexServer
+from benchmarks.fake_plex import FakePlexServer
+from benchmarks.synthetic import make_library
+
+@pytest.fixture
+def plex():
+    library = make_library(30)
+    with FakePlexServer(library) as server:
+        yield PlexServer(server.url, 'token')
+
+def test_edit_title_and_summary(plex):
+    tracks = plex.library.search(libtype='track')[:3]
+    playlist = plex.createPlaylist('spotify_import', items=tracks)
+    playlist.editTitle('Renamed')
+    playlist.editSummary('Synced from Spotify')
+    playlist = plex.playlist('Renamed')
+    assert playlist.title == 'Renamed'
+    assert playlist.summary == 'Synced from Spotify'
+    assert [item.ratingKey for item in playlist.items()] == [track.ratingKey for track in tracks]
@@ -0,0 +1,70 @@
+import time
+from utils.job_queue import JobQueue
+
+def make_queue(tmp_path, **kwargs):
+    return JobQueue(tmp_path / 'jobs.sqlite', **kwargs)
+
+def test_enqueue_skips_jobs_already_waiting_or_running(tmp_path):
+    queue = make_queue(tmp_path)
+    assert queue.enqueue('playlist', 'user')
+    assert not queue.enqueue('playlist', 'user')
+    assert queue.enqueue('playlist', 'other user')
+    job = queue.lease('worker1')
+    assert not queue.enqueue(job.playlist_id, job.user)
+    queue.complete(job, 'worker1')
+    assert queue.enqueue(job.playlist_id, job.user)
+
+def test_lease_hands_out_each_job_once(tmp_path):
+    queue = make_queue(tmp_path)
+    queue.enqueue('playlist1', 'user')
+    queue.enqueue('playlist2', 'user')
+    first = queue.lease('worker1')
+    second = queue.lease('worker2')
+    assert (first.playlist_id, second.playlist_id) == ('playlist1', 'playlist2')
+    assert first.attempts == 1
+    assert queue.lease('worker3') is None
+    queue.complete(first, 'worker1')
+    assert queue.counts() == {'done': 1, 'leased': 1}
+
+def test_expired_lease_goes_to_another_worker(tmp_path):
+    queue = make_queue(tmp_path, lease_seconds=0.05)
+    queue.enqueue('playlist', 'user')
+    job = queue.lease('worker1')
+    time.sleep(0.1)
+    assert not queue.renew(job, 'worker2')
+    taken = queue.lease('worker2')
+    assert taken.id == job.id
+    assert taken.attempts == 2
+    assert not queue.renew(job, 'worker1')
+    assert queue.renew(taken, 'worker2')
+    # The first worker can no longer finish the job
+    queue.complete(job, 'worker1')
+    assert queue.counts() == {'leased': 1}
+
+def test_failed_job_is_retried_after_the_delay(tmp_path):
+    queue = make_queue(tmp_path, retry_delay_seconds=0.05)
+    queue.enqueue('playlist', 'user')
+    job = queue.lease('worker1')
+    queue.fail(job, 'worker1', RuntimeError('Plex unreachable'))
+    assert queue.lease('worker1') is None
+    time.sleep(0.1)
+    retry = queue.lease('worker1')
+    assert retry.id == job.id
+    assert retry.attempts == 2
+
+def test_job_fails_for_good_after_max_attempts(tmp_path):
+    queue = make_queue(tmp_path, max_attempts=2, retry_delay_seconds=0)
+    queue.enqueue('playlist', 'user')
+    for _ in range(2):
+        job = queue.lease('worker1')
+        queue.fail(job, 'worker1', 'error')
+    assert queue.lease('worker1') is None
+    assert queue.counts() == {'failed': 1}
+
+def test_expired_lease_without_attempts_left_fails(tmp_path):
+    queue = make_queue(tmp_path, lease_seconds=0.05, max_attempts=1)
+    queue.enqueue('playlist', 'user')
+    queue.lease('worker1')
+    time.sleep(0.1)
+    assert queue.lease('worker2') is None
+    assert queue.counts() == {'failed': 1}
@@ -0,0 +1,89 @@
+from helper_classes.candidate import PlexCandidate
+from helper_classes.track import Track
+from utils.library_index import LibraryIndex
+from utils.library_snapshot import load_snapshot, write_snapshot
+
+def make_index():
+    return LibraryIndex([
+        PlexCandidate.create(1, 'Song', 'Artist', 'Album', 200000),
+        PlexCandidate.create(2, 'Song (Live)', 'Artist', 'Live Album', 260000),
+        PlexCandidate.create(3, 'Other Song', 'Artist', 'Album', None),
+        PlexCandidate.create(4, 'Song', 'Someone Else', 'Album', 200000),
+        PlexCandidate.create(5, 'Different', 'Artist', 'Album', 201000),
+    ])
+
+def spotify_track(name='Song', artist='Artist', duration_ms=201000):
+    return Track('spotify1', name, (artist,), 'Album', duration_ms)
+
+def keys(candidates):
+    return [candidate.rating_key for candidate in candidates]
+
+def test_candidates_for_filters_by_artist_duration_and_title():
+    index = make_index()
+    # Track 2 is too long, 4 by another artist, 5 has another title; 3 has no known length
+    assert keys(index.candidates_for(spotify_track(), window_ms=15000)) == [1, 3]
+    assert keys(index.candidates_for(spotify_track(), window_ms=60000)) == [1, 2, 3]
+
+def test_candidates_for_without_spotify_duration_keeps_every_length():
+    assert keys(make_index().candidates_for(spotify_track(duration_ms=0))) == [1, 2, 3]
+
+def test_overlay_updates_and_deletes():
+    index = make_index()
+    index.delete(1)
+    index.update(PlexCandidate.create(10, 'Song', 'Artist', 'New Album', 199000))
+    index.update(PlexCandidate.create(3, 'Other Song', 'Renamed Artist', 'Album', 180000))
+
+    assert len(index) == 5
+    assert 1 not in index
+    assert index.get(10).album == 'New Album'
+    assert list(index.artist_keys('Artist')) == [2, 5, 10]
+    assert list(index.artist_keys('Renamed Artist')) == [3]
+    assert keys(index) == [2, 3, 4, 5, 10]
+    assert keys(index.candidates_for(spotify_track())) == [10]
+
+    # A deleted track that comes back replaces nothing but its deletion
+    index.update(PlexCandidate.create(1, 'Song', 'Artist', 'Album', 200000))
+    index.delete(10)
+    assert list(index.artist_keys('Artist')) == [1, 2, 5]
+    assert len(index) == 5
+
+def test_artist_without_overlay_entries_gets_the_base_block():
+    index = make_index()
+    index.delete(4)
+    block = index.artist_keys('Artist')
+    assert block is index.artist_keys('Artist')
+    assert list(block) == [1, 2, 3, 5]
+
+def test_artist_candidates_follow_the_overlay():
+    index = make_index()
+    index.delete(2)
+    index.update(PlexCandidate.create(10, 'New Song', 'Artist', 'New Album', 199000))
+    assert keys(index.artist_candidates('Artist')) == [1, 3, 5, 10]
+    assert index.artist_candidates('Nobody') == []
+
+def test_events_during_retrieval_do_not_break_it(monkeypatch):
+    index = make_index()
+    index.update(PlexCandidate.create(10, 'Song', 'Artist', 'New Album', 199000))
+    position = index._position
+
+    def position_then_delete(rating_key):
+        # Library events arriving while candidates_for walks the artist's keys
+        monkeypatch.setattr(index, '_position', position)
+        index.delete(1)
+        index.delete(10)
+        return position(rating_key)
+
+    monkeypatch.setattr(index, '_position', position_then_delete)
+    assert keys(index.candidates_for(spotify_track())) == [1, 3, 10]
+    assert keys(index.candidates_for(spotify_track())) == [3]
+
+def test_snapshot_round_trip(tmp_path):
+    index = make_index()
+    path = write_snapshot(index, tmp_path / 'library.snapshot', {'server': 'abc'})
+    loaded = load_snapshot(path)
+    assert list(loaded) == list(index)
+    assert len(loaded) == len(index)
+    assert loaded.get(2) == index.get(2)
+    assert keys(loaded.candidates_for(spotify_track())) == keys(index.candidates_for(spotify_track()))
+    loaded.delete(1)
+    assert keys(loaded.candidates_for(spotify_track())) == [3]
@@ -0,0 +1,82 @@
+import json
+from types import SimpleNamespace
+from helper_classes.candidate import PlexCandidate
+from utils.library_index import LibraryIndex
+from utils.match_store import MatchStore
+
+SERVER_A = SimpleNamespace(machineIdentifier='server-a')
+SERVER_B = SimpleNamespace(machineIdentifier='server-b')
+
+def library_a():
+    return LibraryIndex([
+        PlexCandidate.create(1, 'One', 'Artist', 'Album', 1000, '/data/music/Artist/Album/01 One.flac'),
+        PlexCandidate.create(2, 'Two', 'Artist', 'Album', 1000, None, 'plex://track/two'),
+        PlexCandidate.create(3, 'Three', 'Artist', 'Album', 1000, '/data/music/Artist/Album/03 Three.flac'),
+    ])
+
+def library_b():
+    return LibraryIndex([
+        PlexCandidate.create(11, 'One', 'Artist', 'Album', 1000, '/mnt/music/Artist/Album/01 One.flac'),
+        PlexCandidate.create(12, 'Two', 'Artist', 'Album', 1000, '/mnt/other/02 Two.flac', 'plex://track/two'),
+    ])
+
+def test_flat_file_is_migrated_to_the_first_server(tmp_path):
+    path = tmp_path / 'matched_tracks.json'
+    path.write_text(json.dumps({'spotify1': 1, 'spotify2': 2}))
+    store = MatchStore(path)
+    assert store.for_server('server-a') == {'spotify1': 1, 'spotify2': 2}
+    assert store.for_server('server-b') == {}
+    store.save()
+    data = json.loads(path.read_text())
+    assert data['version'] == 2
+    assert data['servers']['server-a'] == {'spotify1': 1, 'spotify2': 2}
+
+def test_matches_are_translated_by_file_and_guid(tmp_path):
+    path = tmp_path / 'matched_tracks.json'
+    path.write_text(json.dumps({'spotify1': 1, 'spotify2': 2, 'spotify3': 3}))
+    store = MatchStore(path)
+    store.matches_for(SERVER_A, library_a())
+    store.save()
+
+    store = MatchStore(path)
+    assert store.matches_for(SERVER_B, library_b()) == {'spotify1': 11, 'spotify2': 12}
+    assert store.untranslated['server-b']['track_ids'] == {'spotify3'}
+
+def test_untranslated_tracks_are_tried_again_when_the_library_changes(tmp_path):
+    path = tmp_path / 'matched_tracks.json'
+    path.write_text(json.dumps({'spotify1': 1, 'spotify3': 3}))
+    store = MatchStore(path)
+    store.matches_for(SERVER_A, library_a())
+    index = library_b()
+    store.translate('server-b', index)
+    assert store.translate('server-b', index) == 0
+
+    index.update(PlexCandidate.create(13, 'Three', 'Artist', 'Album', 1000, '/mnt/music/Artist/Album/03 Three.flac'))
+    assert store.translate('server-b', index) == 1
+    assert store.for_server('server-b')['spotify3'] == 13
+
+def test_isrc_translation(tmp_path):
+    store = MatchStore(tmp_path / 'matched_tracks.json')
+    store.for_server('server-a')['spotify1'] = 1
+    store.remember('spotify1', isrc='usabc1234567')
+    index = LibraryIndex([PlexCandidate.create(21, 'One', 'Artist', 'Album')], isrc_keys={'USABC1234567': 21})
+    assert store.translate('server-b', index) == 1
+    assert store.for_server('server-b') == {'spotify1': 21}
+
+def test_save_merges_concurrent_changes(tmp_path):
+    path = tmp_path / 'matched_tracks.json'
+    first = MatchStore(path)
+    first.for_server('server-a')['spotify1'] = 1
+    first.save()
+
+    second = MatchStore(path)
+    third = MatchStore(path)
+    second.for_server('server-a')['spotify2'] = 2
+    del third.for_server('server-a')['spotify1']
+    third.for_server('server-a')['spotify3'] = 3
+    second.save()
+    third.save()
+
+    assert MatchStore(path).for_server('server-a') == {'spotify2': 2, 'spotify3': 3}
+    # Saving updates the dicts callers already hold
+    assert third.for_server('server-a') == {'spotify2': 2, 'spotify3': 3}
@@ -0,0 +1,27 @@
+from helper_classes.candidate import PlexCandidate
+from helper_classes.track import Track
+from utils.matching import MAX_RANK_SCORE, auto_accepted, rank_candidates
+from utils.similarity import MAX_NAME_SIMILARITY
+
+CANDIDATES = [
+    PlexCandidate.create(1, 'Song (Live)', 'Artist', 'Live Album', 260000),
+    PlexCandidate.create(2, 'Song', 'Artist', 'Album', 200000),
+]
+
+def test_identical_track_scores_the_maximum():
+    suggestions = rank_candidates(CANDIDATES, Track('spotify1', 'Song', ('Artist',), 'Album', 200000))
+    assert suggestions[0] == (CANDIDATES[1], MAX_RANK_SCORE)
+    # Above 100: a threshold of 100 does not mean only perfect matches
+    assert MAX_RANK_SCORE == 108
+    without_length = rank_candidates(CANDIDATES, Track('spotify1', 'Song', ('Artist',), 'Album', 0))
+    assert without_length[0] == (CANDIDATES[1], MAX_NAME_SIMILARITY)
+
+def test_auto_accept_boundary():
+    suggestions = rank_candidates(CANDIDATES, Track('spotify1', 'Song', ('Artist',), 'Album', 201000))
+    candidate, score = suggestions[0]
+    assert candidate.rating_key == 2
+    assert auto_accepted(suggestions, score) == (candidate, score)
+    assert auto_accepted(suggestions, score + 0.01) is None
+    assert auto_accepted(suggestions, MAX_RANK_SCORE) is None
+    assert auto_accepted(suggestions, None) is None
+    assert auto_accepted([], 0) is None
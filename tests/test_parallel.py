@@ -0,0 +1,44 @@
+import multiprocessing
+from functools import partial
+import pytest
+from benchmarks.synthetic import make_library, make_playlist
+from utils import parallel
+from utils.matching import find_fuzzy_match_key, rank_candidates
+from utils.parallel import score_in_pool
+
+NOISE = {'featuring': 0.2, 'parentheses': 0.2, 'remaster': 0.2, 'duration_jitter_ms': 3000}
+
+def rank_keys(spotify_track_info, candidates):
+    return [(candidate.rating_key, score) for candidate, score in rank_candidates(candidates, spotify_track_info, 3)]
+
+def make_jobs(size=40):
+    library = make_library(400, tracks_per_artist=20)
+    by_artist = {}
+    for candidate in library:
+        by_artist.setdefault(candidate.artist, []).append(candidate)
+    return [(track_info, by_artist[track_info.artist]) for track_info, _ in make_playlist(library, size, noise=NOISE)]
+
+@pytest.fixture(params=['fork', 'initializer'])
+def start_method(request, monkeypatch):
+    if request.param == 'initializer':
+        # Workers get the jobs through _init_worker, as on platforms that cannot fork
+        get_context = multiprocessing.get_context
+        monkeypatch.setattr(parallel.multiprocessing, 'get_all_start_methods', lambda: ['spawn'])
+        monkeypatch.setattr(parallel.multiprocessing, 'get_context', lambda method=None: get_context(method or 'spawn'))
+    elif 'fork' not in multiprocessing.get_all_start_methods():
+        pytest.skip("fork is not available on this platform")
+    return request.param
+
+@pytest.mark.parametrize('scorer', [rank_keys, partial(find_fuzzy_match_key, certain_score=95)],
+                         ids=['rank_keys', 'find_fuzzy_match_key'])
+def test_pool_scores_like_inline(start_method, scorer):
+    jobs = make_jobs()
+    inline = score_in_pool(scorer, jobs, processes=1)
+    assert any(inline)
+    assert score_in_pool(scorer, jobs, processes=2) == inline
+    assert parallel._scorer is None and parallel._jobs is None
+
+def test_few_jobs_are_scored_inline(monkeypatch):
+    monkeypatch.setattr(parallel.multiprocessing, 'get_context', None)
+    jobs = make_jobs(3)
+    assert score_in_pool(rank_keys, jobs, processes=2) == [rank_keys(*job) for job in jobs]
@@ -0,0 +1,55 @@
+from pathlib import Path
+import pytest
+
+pytest.importorskip('PyQt5.QtMultimedia', exc_type=ImportError)
+
+from plexapi.server import PlexServer
+from benchmarks.fake_plex import FakePlexServer
+from benchmarks.fake_spotify import FakeSpotifyServer
+from benchmarks.synthetic import make_library, make_playlist
+from helper_classes.playlist import Playlist
+from helper_classes.sync_options import SyncOptions
+from helper_classes.user_inputs import UserInputs
+from utils.spotify_functions import sync_spotify_playlist_with_plex
+
+PLAYLIST_ID = 'testplaylist0000000001'
+
+class AbortAfter:
+    """Abort event that turns set after the sync checked it the given number of times."""
+
+    def __init__(self, checks):
+        self.checks = checks
+
+    def is_set(self):
+        self.checks -= 1
+        return self.checks < 0
+
+def test_resumed_sync_skips_resolved_tracks(tmp_path):
+    library = make_library(200)
+    tracks = [track_info for track_info, _ in make_playlist(library, 20, missing_rate=0.2)]
+    options = SyncOptions(interactive=False, resume=True, checkpoint_every=1,
+                          checkpoint_dir=str(tmp_path / 'checkpoints'),
+                          sync_state_file=str(tmp_path / 'sync_state.json'),
+                          match_storage_file=str(tmp_path / 'matched_tracks.json'))
+    with FakePlexServer(library) as plex_server, FakeSpotifyServer() as spotify_server:
+        spotify_server.add_playlist(PLAYLIST_ID, 'Test Playlist', tracks)
+        user_inputs = UserInputs(
+            spotify_client_id='test', spotify_client_secret='test', spotify_redirect_uri='http://localhost/callback',
+            plex_url=plex_server.url, plex_token='token', spotify_playlist_ids=PLAYLIST_ID,
+            spotify_api_url=spotify_server.api_url, spotify_auth_url=spotify_server.auth_url)
+
+        def sync(abort=None):
+            plex_server.reset_counts()
+            plex = PlexServer(plex_server.url, 'token')
+            return sync_spotify_playlist_with_plex(plex, Playlist('Test Playlist', '', ''), user_inputs, PLAYLIST_ID,
+                                                   Path(tmp_path / 'output'), options, abort=abort)
+
+        sync(AbortAfter(12))
+        assert plex_server.counts['search'] == 12
+        assert 'Test Playlist' not in [playlist['title'] for playlist in plex_server.library.playlists.values()]
+
+        metrics = sync()
+        assert metrics.counters['resumed'] == 12
+        assert plex_server.counts['search'] == 8
+        assert [playlist['title'] for playlist in plex_server.library.playlists.values()] == ['Test Playlist']
+    assert not list((tmp_path / 'checkpoints').iterdir())
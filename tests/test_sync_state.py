@@ -0,0 +1,83 @@
+from utils.sync_state import SyncState, diff_playlist_items, merge_synced_entries, playlist_keys
+
+def entry(track_id, rating_key, added_at='2024-01-01T00:00:00Z'):
+    return {'id': track_id, 'added_at': added_at, 'rating_key': rating_key}
+
+def refs_of(entries):
+    return [(item['id'], item['added_at']) for item in entries]
+
+def test_unchanged_playlist_keeps_every_entry():
+    synced = [entry('a', 1), entry('b', 2), entry('c', 3)]
+    new_positions, kept, removed = diff_playlist_items(synced, refs_of(synced), {'a': 1, 'b': 2, 'c': 3})
+    assert new_positions == []
+    assert kept == synced
+    assert removed == []
+    assert merge_synced_entries(kept, refs_of(synced), new_positions, []) == synced
+
+def test_added_and_removed_items():
+    synced = [entry('a', 1), entry('b', 2), entry('c', 3)]
+    refs = [('a', synced[0]['added_at']), ('c', synced[2]['added_at']), ('d', '2024-02-01T00:00:00Z')]
+    new_positions, kept, removed = diff_playlist_items(synced, refs, {'a': 1, 'b': 2, 'c': 3})
+    assert new_positions == [2]
+    assert kept == [synced[0], synced[2]]
+    assert removed == [synced[1]]
+    new_entry = entry('d', 4, '2024-02-01T00:00:00Z')
+    assert merge_synced_entries(kept, refs, new_positions, [new_entry]) == [synced[0], synced[2], new_entry]
+
+def test_duplicate_tracks_count_as_separate_items():
+    synced = [entry('a', 1), entry('a', 1)]
+    new_positions, kept, removed = diff_playlist_items(synced, refs_of(synced)[:1], {'a': 1})
+    assert new_positions == []
+    assert len(kept) == 1
+    assert len(removed) == 1
+
+def test_unmatched_entries_are_matched_again():
+    synced = [entry('a', 1), entry('b', None), entry('c', 3)]
+    refs = refs_of(synced)
+    new_positions, kept, removed = diff_playlist_items(synced, refs, {'a': 1, 'b': 2, 'c': 3})
+    assert new_positions == [1]
+    assert kept == [synced[0], synced[2]]
+    assert removed == [synced[1]]
+    merged = merge_synced_entries(kept, refs, new_positions, [entry('b', 2)])
+    assert [item['rating_key'] for item in merged] == [1, 2, 3]
+
+def test_entries_matched_to_another_key_are_matched_again():
+    synced = [entry('a', 1), entry('b', 2)]
+    new_positions, kept, removed = diff_playlist_items(synced, refs_of(synced), {'a': 1, 'b': 20})
+    assert new_positions == [1]
+    assert removed == [synced[1]]
+
+def test_unmatched_local_files_wait_for_a_full_sync():
+    synced = [entry(None, None), entry('a', 1)]
+    new_positions, kept, removed = diff_playlist_items(synced, refs_of(synced), {'a': 1})
+    assert new_positions == []
+    assert kept == synced
+    assert removed == []
+
+def test_appending_after_a_kept_unmatched_entry_needs_no_rewrite():
+    synced = [entry('a', 1), entry(None, None), entry('b', 2)]
+    refs = refs_of(synced) + [('c', '2024-02-01T00:00:00Z')]
+    new_positions, kept, removed = diff_playlist_items(synced, refs, {'a': 1, 'b': 2})
+    assert new_positions == [3]
+    merged = merge_synced_entries(kept, refs, new_positions, [entry('c', 3, '2024-02-01T00:00:00Z')])
+    # The sync appends the new keys as long as the merged playlist is the kept keys followed by them
+    assert playlist_keys(merged) == playlist_keys(kept) + [3] == [1, 2, 3]
+
+def test_inserting_before_the_end_needs_a_rewrite():
+    synced = [entry('a', 1), entry('b', 2)]
+    refs = [refs_of(synced)[0], ('c', '2024-02-01T00:00:00Z'), refs_of(synced)[1]]
+    new_positions, kept, removed = diff_playlist_items(synced, refs, {'a': 1, 'b': 2})
+    merged = merge_synced_entries(kept, refs, new_positions, [entry('c', 3, '2024-02-01T00:00:00Z')])
+    assert playlist_keys(merged) != playlist_keys(kept) + [3]
+
+def test_save_merges_playlists_set_by_other_processes(tmp_path):
+    path = tmp_path / 'sync_state.json'
+    first = SyncState(path)
+    second = SyncState(path)
+    first.set('server/user', 'playlist1', {'items': [entry('a', 1)]})
+    first.save()
+    second.set('server/user', 'playlist2', {'items': [entry('b', 2)]})
+    second.save()
+    merged = SyncState(path)
+    assert merged.get('server/user', 'playlist1') == {'items': [entry('a', 1)]}
+    assert merged.get('server/user', 'playlist2') == {'items': [entry('b', 2)]}
@@ -0,0 +1,12 @@
+import re
+from benchmarks.synthetic import make_library, make_playlist
+
+def test_playlist_track_ids_are_valid_spotify_ids():
+    library = make_library(200)
+    playlist = make_playlist(library, 300, missing_rate=0.3)
+    track_ids = [track_info.id for track_info, _ in playlist]
+    assert all(re.fullmatch(r'[0-9A-Za-z]+', track_id) for track_id in track_ids)
+    assert any(expected is None for _, expected in playlist)
+    # Missing tracks never share an id with a library track
+    library_ids = {f"sp{candidate.rating_key}" for candidate in library}
+    assert not any(track_info.id in library_ids for track_info, expected in playlist if expected is None)
@@ -0,0 +1,86 @@
+import logging
+import re
+from fuzzywuzzy import fuzz
+from .library_index import find_music_section
+from .normalization import normalize_name, titles_overlap
+
+# Distance between Spotify and Plex durations still accepted for a track aligned by position
+ALIGNED_DURATION_TOLERANCE_MS = 10000
+
+class AlbumResolver:
+    """
+    Match Spotify albums to Plex albums once per sync, keyed by Spotify album ID, and
+    align their tracks by disc and track number. A playlist holding most of an album
+    costs one album search and one track listing instead of a search per track, and the
+    aligned tracks need no fuzzy scoring.
+    """
+
+    def __init__(self, plex, section=None):
+        self.plex = plex
+        self.section = section
+        self._albums = {}
+
+    def album_tracks(self, spotify_track_info):
+        """
+        The Plex tracks of the album matching the Spotify track's album, keyed by
+        (disc number, track number), or None when no Plex album matches.
+        """
+        album_id = spotify_track_info.album_id
+        if album_id not in self._albums:
+            self._albums[album_id] = self._fetch_album(spotify_track_info)
+        return self._albums[album_id]
+
+    def _fetch_album(self, spotify_track_info):
+        if self.section is None:
+            self.section = find_music_section(self.plex)
+        # Search by the name without edition suffixes, so "Album (Deluxe)" finds "Album" and vice versa
+        query = re.split(r'\s+[(\[-]', spotify_track_info.album)[0] or spotify_track_info.album
+        albums = [album for album in self.section.searchAlbums(title=query)
+                  if fuzz.ratio(album.parentTitle, spotify_track_info.artist) > 80]
+        if not albums:
+            logging.debug("No Plex album found for '%s' by '%s'.", spotify_track_info.album, spotify_track_info.artist)
+            return None
+
+        best_album = max(albums, key=lambda album: self._album_score(album, spotify_track_info))
+        if self._album_score(best_album, spotify_track_info) < 80:
+            return None
+        tracks = {(track.parentIndex or 1, track.index): track for track in best_album.tracks()}
+        logging.debug("Resolved album '%s' to Plex album %s with %d tracks.", spotify_track_info.album,
+                      best_album.ratingKey, len(tracks))
+        return tracks
+
+    @staticmethod
+    def _album_score(album, spotify_track_info):
+        """Name similarity, lowered when the release year or track count disagree."""
+        score = fuzz.ratio(normalize_name(album.title), normalize_name(spotify_track_info.album))
+        if spotify_track_info.album_year and album.year and str(album.year) != spotify_track_info.album_year:
+            score -= 10
+        if spotify_track_info.album_total_tracks and album.leafCount and album.leafCount != spotify_track_info.album_total_tracks:
+            score -= 5
+        return score
+
+    def resolve(self, spotify_track_info):
+        """
+        Return (aligned track, album tracks). The aligned track is the Plex track at the
+        Spotify track's disc and track number when its title and length agree, else None;
+        album tracks are the matched album's tracks with an overlapping title, left for
+        fuzzy scoring, or None when no Plex album matched.
+        """
+        tracks = self.album_tracks(spotify_track_info)
+        if tracks is None:
+            return None, None
+        spotify_title = normalize_name(spotify_track_info.name)
+        track = tracks.get((spotify_track_info.disc_number or 1, spotify_track_info.track_number))
+        if track is not None and self._agrees(track, spotify_title, spotify_track_info.duration_ms):
+            return track, None
+        leftovers = [track for track in tracks.values() if titles_overlap(spotify_title, normalize_name(track.title))]
+        return None, leftovers
+
+    @staticmethod
+    def _agrees(track, spotify_title, spotify_duration):
+        plex_title = normalize_name(track.title)
+        if not (titles_overlap(spotify_title, plex_title) or fuzz.ratio(spotify_title, plex_title) >= 80):
+            return False
+        if spotify_duration and track.duration and abs(track.duration - spotify_duration) > ALIGNED_DURATION_TOLERANCE_MS:
+            return False
+        return True
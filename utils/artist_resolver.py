@@ -0,0 +1,47 @@
+import logging
+from fuzzywuzzy import fuzz
+from helper_classes.candidate import PlexCandidate
+from .library_index import find_music_section
+from .normalization import normalize_name, titles_overlap
+
+class ArtistResolver:
+    """
+    Resolve each distinct Spotify artist to its Plex artist(s) once per sync and keep
+    their whole catalogue, so every playlist track by that artist is matched locally.
+    Plex requests then scale with the number of distinct artists, not tracks.
+    """
+
+    def __init__(self, plex, section=None):
+        self.plex = plex
+        self.section = section
+        self._catalogues = {}
+
+    def catalogue(self, artist_name):
+        """All Plex tracks, as PlexCandidates, of the Plex artists matching the name; fetched once per name."""
+        key = normalize_name(artist_name)
+        if key not in self._catalogues:
+            self._catalogues[key] = self._fetch_catalogue(artist_name)
+        return self._catalogues[key]
+
+    def _fetch_catalogue(self, artist_name):
+        if self.section is None:
+            self.section = find_music_section(self.plex)
+        artists = [artist for artist in self.section.searchArtists(title=artist_name)
+                   if fuzz.ratio(artist.title, artist_name) > 80]
+        candidates = []
+        for artist in artists:
+            candidates.extend(PlexCandidate.from_plex_track(track) for track in artist.tracks())
+        logging.debug("Resolved artist '%s' to %d Plex artists with %d tracks.", artist_name, len(artists), len(candidates))
+        return candidates
+
+    def candidates_for(self, spotify_track_info):
+        """
+        Tracks of the Spotify track's artist whose normalized title overlaps the Spotify
+        title, or None when the artist isn't in the Plex library at all.
+        """
+        catalogue = self.catalogue(spotify_track_info.artist)
+        if not catalogue:
+            return None
+        spotify_title = normalize_name(spotify_track_info.name)
+        return [candidate for candidate in catalogue
+                if candidate.norm_title and titles_overlap(spotify_title, candidate.norm_title)]
@@ -0,0 +1,124 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from helper_classes.candidate import PlexCandidate, as_candidate
+
+DEFAULT_CHECKPOINT_EVERY = 50
+DEFAULT_CHECKPOINT_INTERVAL_SECONDS = 60
+
+class SyncCheckpoint:
+    """
+    Progress of one playlist sync, kept in a JSON-lines journal: a header with the
+    playlist's track ids, then one record per playlist position looked up (its
+    candidates and whether they were a direct match) and per outcome decided (matched
+    rating key or None). Every so many tracks or seconds the records since the last
+    save are appended, so each is written once however long the sync runs.
+
+    A sync run with resume picks up the lookups and unmatched outcomes of a checkpoint
+    for the same tracks instead of searching and asking again; its matches are in the
+    match store. Without resume nothing is recorded or written.
+    """
+
+    def __init__(self, path, track_ids, every=DEFAULT_CHECKPOINT_EVERY, interval_seconds=DEFAULT_CHECKPOINT_INTERVAL_SECONDS,
+                 enabled=True):
+        self.path = Path(path)
+        self.track_ids = list(track_ids)
+        self.every = every
+        self.interval_seconds = interval_seconds
+        self.enabled = enabled
+        self.lookups = {}
+        self.outcomes = {}
+        self._pending = []
+        self._started = False
+        self._saved_at = time.monotonic()
+
+    @classmethod
+    def for_playlist(cls, checkpoint_dir, target, playlist_id, track_ids, resume=False,
+                     every=DEFAULT_CHECKPOINT_EVERY, interval_seconds=DEFAULT_CHECKPOINT_INTERVAL_SECONDS):
+        """The checkpoint of a playlist sync to a Plex target; only kept, and loaded, when resuming."""
+        target_hash = hashlib.sha256(target.encode('utf-8')).hexdigest()[:12]
+        checkpoint = cls(Path(checkpoint_dir) / f"{playlist_id}_{target_hash}.jsonl", track_ids, every, interval_seconds,
+                         enabled=resume)
+        if resume:
+            checkpoint.load()
+        return checkpoint
+
+    def load(self):
+        """Load the saved progress, unless it was saved for a different list of tracks."""
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, 'r') as f:
+                text = f.read()
+            lines = text.splitlines()
+            header = json.loads(lines[0]) if lines else {}
+        except (OSError, ValueError) as e:
+            logging.warning(f"Could not read checkpoint {self.path}, starting over: {e}")
+            return
+        if header.get('track_ids') != self.track_ids:
+            logging.info(f"Checkpoint {self.path} is of a different track list, starting over.")
+            return
+        records = []
+        for line in lines[1:]:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                break
+        # A run that died while appending leaves a partial last record; the next save starts a clean journal
+        self._started = text.endswith('\n') and len(records) == len(lines) - 1
+        if not self._started:
+            self._pending = records
+        for record in records:
+            if 'candidates' in record:
+                self.lookups[record['idx']] = (record['direct'], [PlexCandidate(*fields) for fields in record['candidates']])
+            else:
+                self.outcomes[record['idx']] = record['rating_key']
+        logging.info(f"Resuming from checkpoint {self.path}: {len(self.lookups)} of {len(self.track_ids)} tracks "
+                     f"looked up, {len(self.outcomes)} decided.")
+
+    def record_lookup(self, idx, candidates, direct=False):
+        if self.enabled:
+            candidates = [as_candidate(track) for track in candidates]
+            self.lookups[idx] = (direct, candidates)
+            self._pending.append({'idx': idx, 'direct': direct, 'candidates': [list(candidate) for candidate in candidates]})
+
+    def record_outcome(self, idx, rating_key):
+        if self.enabled:
+            self.outcomes[idx] = rating_key
+            self._pending.append({'idx': idx, 'rating_key': rating_key})
+
+    def due(self):
+        """Whether enough tracks or time went by since the last save."""
+        if not self._pending:
+            return False
+        return len(self._pending) >= self.every or time.monotonic() - self._saved_at >= self.interval_seconds
+
+    def save(self):
+        """
+        Append the records since the last save. A journal of an earlier run is replaced
+        by renaming a new one into place, so a crash never leaves a partial header.
+        """
+        if not self.enabled:
+            return
+        if not self._started:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = self.path.with_name(self.path.name + '.tmp')
+            with open(temp_path, 'w') as f:
+                f.write(json.dumps({'track_ids': self.track_ids}) + '\n')
+            os.replace(temp_path, self.path)
+            self._started = True
+        if self._pending:
+            with open(self.path, 'a') as f:
+                f.write(''.join(json.dumps(record) + '\n' for record in self._pending))
+                f.flush()
+                os.fsync(f.fileno())
+        self._pending = []
+        self._saved_at = time.monotonic()
+        logging.debug("Saved checkpoint %s.", self.path)
+
+    def discard(self):
+        """Remove the checkpoint once the sync finished."""
+        self.path.unlink(missing_ok=True)
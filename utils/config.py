@@ -1,6 +1,9 @@
 import configparser
 import logging
 from logging.handlers import RotatingFileHandler
+from helper_classes.sync_options import SyncOptions
+from utils.job_queue import (DEFAULT_LEASE_SECONDS, DEFAULT_MAX_ATTEMPTS, DEFAULT_RETRY_DELAY_SECONDS,
+                             JobQueue)
 
 def create_logger(name, log_file, level=logging.INFO):
     """Create a logger with the specified name, log file, and logging level."""
@@ -29,3 +32,51 @@ def read_config(config_file, logger):
     
     logger.info(f"Configuration file '{config_file}' loaded successfully.")
     return config_data
+
+def read_user_tokens(config):
+    """Return the Plex token of every user in [users] tokens, keyed by user name."""
+    tokens = {}
+    for user_token in config.get('users', 'tokens', fallback='').split(','):
+        if user_token.strip():
+            user, token = user_token.split(':', 1)
+            tokens[user.strip()] = token.strip()
+    return tokens
+
+def read_job_queue(config):
+    """Open the shared sync job queue configured in the [worker] section."""
+    return JobQueue(config.get('worker', 'queue', fallback='sync_jobs.sqlite'),
+                    lease_seconds=config.getfloat('worker', 'lease_seconds', fallback=DEFAULT_LEASE_SECONDS),
+                    max_attempts=config.getint('worker', 'max_attempts', fallback=DEFAULT_MAX_ATTEMPTS),
+                    retry_delay_seconds=config.getfloat('worker', 'retry_delay_seconds',
+                                                        fallback=DEFAULT_RETRY_DELAY_SECONDS))
+
+def read_sync_options(config):
+    """Build SyncOptions from the optional [sync] section of a ConfigParser."""
+    return SyncOptions(
+        processes=config.getint('sync', 'processes', fallback=0),
+        certain_score=config.getfloat('sync', 'certain_score', fallback=None),
+        max_duration_diff_ms=config.getint('sync', 'max_duration_diff_ms', fallback=None),
+        use_library_index=config.getboolean('sync', 'use_library_index', fallback=False),
+        library_snapshot=config.get('sync', 'library_snapshot', fallback=None),
+        library_snapshot_max_age_hours=config.getfloat('sync', 'library_snapshot_max_age_hours', fallback=None),
+        interactive=config.getboolean('sync', 'interactive', fallback=True),
+        metrics_textfile_dir=config.get('sync', 'metrics_textfile_dir', fallback=None),
+        delta_sync=config.getboolean('sync', 'delta', fallback=False),
+        sync_state_file=config.get('sync', 'state_file', fallback='sync_state.json'),
+        playlist_chunk_size=config.getint('sync', 'playlist_chunk_size', fallback=200),
+        write_threads=config.getint('sync', 'write_threads', fallback=4),
+        resolve_artists=config.getboolean('sync', 'resolve_artists', fallback=False),
+        resolve_albums=config.getboolean('sync', 'resolve_albums', fallback=False),
+        album_min_tracks=config.getint('sync', 'album_min_tracks', fallback=2),
+        scoped_search=config.getboolean('sync', 'scoped_search', fallback=False),
+        music_section=config.get('plex', 'music_section', fallback=None),
+        search_max_results=config.getint('sync', 'search_max_results', fallback=50),
+        checkpoint_dir=config.get('sync', 'checkpoint_dir', fallback='checkpoints'),
+        checkpoint_every=config.getint('sync', 'checkpoint_every', fallback=50),
+        checkpoint_interval_seconds=config.getfloat('sync', 'checkpoint_interval_seconds', fallback=60),
+        resume=config.getboolean('sync', 'resume', fallback=False),
+        playlist_write=config.get('sync', 'playlist_write', fallback='items'),
+        m3u_dir=config.get('sync', 'm3u_dir', fallback='m3u'),
+        m3u_server_dir=config.get('sync', 'm3u_server_dir', fallback=None),
+        report_details=config.getboolean('sync', 'report_details', fallback=False)
+    )
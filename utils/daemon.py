@@ -0,0 +1,232 @@
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from plexapi.server import PlexServer
+from helper_classes.playlist import Playlist
+from helper_classes.user_inputs import UserInputs
+from utils.config import read_user_tokens
+from utils.library_events import (DEFAULT_WEBHOOK_PORT, LibraryEventHandler, WebhookServer, invalidate_matches,
+                                   start_alert_listener)
+from utils.library_snapshot import load_or_build_index
+from utils.library_index import LibraryIndex
+from utils.spotify_functions import (create_spotify_client, fetch_playlist_snapshot_id, read_playlist_info,
+                                     sync_spotify_playlist_with_plex)
+
+DEFAULT_POLL_INTERVAL = 300
+
+class SyncService:
+    """
+    Base of the long-running sync processes. It keeps the Spotify client, one Plex client
+    per user in [users] tokens and the library index in memory, rebuilds the index when
+    it gets too old and, with [daemon] plex_events set to websocket or webhook, applies
+    library changes to it as Plex reports them.
+    """
+
+    def __init__(self, config, options, output_root, library_index=None):
+        self.config = config
+        # Nobody is around to answer a track selection dialog
+        self.options = options
+        self.options.interactive = False
+        self.output_root = Path(output_root)
+        self.library_index = library_index
+        self.index_loaded_at = time.time()
+        self.user_tokens = read_user_tokens(config)
+        self.sp = create_spotify_client(config['spotify']['client_id'], config['spotify']['client_secret'],
+                                        config['spotify'].get('api_url'), config['spotify'].get('auth_url'))
+        self.plex_clients = {}
+        self.stopped = threading.Event()
+        self.plex_events = config.get('daemon', 'plex_events', fallback='').strip().lower()
+        self.event_handler = None
+        self.event_listener = None
+
+    def plex_client(self, user):
+        if user not in self.plex_clients:
+            self.plex_clients[user] = PlexServer(self.config['plex']['url'], self.user_tokens[user])
+            logging.info(f"Connected to Plex server at {self.config['plex']['url']} as {user}")
+        return self.plex_clients[user]
+
+    def user_inputs(self, user):
+        return UserInputs(
+            spotify_client_id=self.config['spotify']['client_id'],
+            spotify_client_secret=self.config['spotify']['client_secret'],
+            plex_url=self.config['plex']['url'],
+            plex_token=self.user_tokens[user],
+            spotify_redirect_uri=self.config['spotify']['redirect_uri'],
+            spotify_playlist_ids=self.config['playlists']['playlist_ids'],
+            spotify_api_url=self.config['spotify'].get('api_url'),
+            spotify_auth_url=self.config['spotify'].get('auth_url')
+        )
+
+    def start_event_listener(self):
+        if self.plex_events not in ('websocket', 'webhook'):
+            return
+        try:
+            plex = PlexServer(self.config['plex']['url'], self.config['plex']['token'])
+            self.event_handler = LibraryEventHandler(plex, self.library_index)
+            if self.plex_events == 'websocket':
+                self.event_listener = start_alert_listener(plex, self.event_handler)
+            else:
+                port = self.config.getint('daemon', 'webhook_port', fallback=DEFAULT_WEBHOOK_PORT)
+                self.event_listener = WebhookServer(self.event_handler, port).start()
+        except Exception as e:
+            self.event_handler = None
+            logging.error(f"Error starting the Plex {self.plex_events} listener, relying on polling only: {e}")
+
+    def stop_event_listener(self):
+        if self.event_listener is not None:
+            self.event_listener.stop()
+            self.event_listener = None
+
+    def apply_library_events(self):
+        """Invalidate the matches the library events since the last call affect; return the playlists to sync again."""
+        if self.event_handler is None:
+            return set()
+        added, deleted = self.event_handler.take_changes()
+        if not added and not deleted:
+            return set()
+        try:
+            return invalidate_matches(self.options.match_storage_file, self.options.sync_state_file,
+                                      self.event_handler.plex.machineIdentifier, deleted, bool(added))
+        except Exception as e:
+            logging.error(f"Error invalidating matches after library changes: {e}")
+            return set()
+
+    def refresh_library_index(self):
+        """Rebuild the library index once it is older than the snapshot's maximum age."""
+        max_age_hours = self.options.library_snapshot_max_age_hours
+        if self.library_index is None or not max_age_hours:
+            return
+        if time.time() - self.index_loaded_at < max_age_hours * 3600:
+            return
+        try:
+            plex = PlexServer(self.config['plex']['url'], self.config['plex']['token'])
+            if self.options.library_snapshot:
+                self.library_index = load_or_build_index(plex, self.options.library_snapshot, refresh=True)
+            else:
+                self.library_index = LibraryIndex.from_plex(plex)
+            self.index_loaded_at = time.time()
+            if self.event_handler is not None:
+                self.event_handler.library_index = self.library_index
+        except Exception as e:
+            logging.error(f"Error refreshing the library index, keeping the current one: {e}")
+
+    def sync_playlist(self, playlist_id, user, playlist, output_dir, abort=None):
+        """Sync the playlist for the user; a failure drops the user's Plex client in case the connection went bad."""
+        try:
+            sync_spotify_playlist_with_plex(self.plex_client(user), playlist, self.user_inputs(user), playlist_id,
+                                            output_dir, self.options, self.library_index, self.sp, abort)
+        except Exception:
+            self.plex_clients.pop(user, None)
+            raise
+
+    def stop(self):
+        self.stopped.set()
+
+class SyncDaemon(SyncService):
+    """
+    Long-running sync service that polls the snapshot_id of every configured playlist and
+    re-syncs a playlist for the users in [users] tokens only when its snapshot changed.
+    With a job queue it enqueues the syncs for workers instead of running them.
+
+    The last synced (or enqueued) snapshot per playlist and user is kept in a state file,
+    so a restart doesn't resync playlists that haven't changed. Playlists holding tracks
+    that Plex reported deleted, or tracks left unmatched before tracks were added, are
+    synced again at the next poll.
+    """
+
+    def __init__(self, config, options, output_root, state_file='daemon_state.json', interval=DEFAULT_POLL_INTERVAL,
+                 library_index=None, job_queue=None):
+        super().__init__(config, options, output_root, library_index)
+        self.state_file = Path(state_file)
+        self.interval = interval
+        self.job_queue = job_queue
+        self.playlist_ids = [playlist_id.strip() for playlist_id in config['playlists']['playlist_ids'].split(',')
+                             if playlist_id.strip()]
+        self.state = self.load_state()
+
+    def load_state(self):
+        if self.state_file.exists():
+            with open(self.state_file, 'r') as f:
+                return json.load(f)
+        return {}
+
+    def save_state(self):
+        temp_path = self.state_file.with_name(self.state_file.name + '.tmp')
+        with open(temp_path, 'w') as f:
+            json.dump(self.state, f, indent=4)
+        os.replace(temp_path, self.state_file)
+
+    def poll_once(self):
+        """Check every playlist once and sync those whose snapshot changed; return the number of syncs run or queued."""
+        self.refresh_library_index()
+        playlist_ids = self.apply_library_events()
+        for playlist_id in playlist_ids:
+            self.state.pop(playlist_id, None)
+        if playlist_ids:
+            self.save_state()
+        syncs = 0
+        for playlist_id in self.playlist_ids:
+            try:
+                snapshot_id = fetch_playlist_snapshot_id(self.sp, playlist_id)
+            except Exception as e:
+                logging.error(f"Error polling playlist ID {playlist_id}: {e}")
+                continue
+
+            synced = self.state.setdefault(playlist_id, {})
+            users = [user for user in self.user_tokens if synced.get(user) != snapshot_id]
+            if not users:
+                logging.debug("Playlist %s unchanged at snapshot %s.", playlist_id, snapshot_id)
+                continue
+
+            if self.job_queue is not None:
+                for user in users:
+                    if self.job_queue.enqueue(playlist_id, user):
+                        syncs += 1
+                    synced[user] = snapshot_id
+                self.save_state()
+                logging.info(f"Playlist {playlist_id} changed to snapshot {snapshot_id}, queued syncs for {', '.join(users)}.")
+                continue
+
+            try:
+                playlist_info = read_playlist_info(self.sp, playlist_id)
+            except Exception as e:
+                logging.error(f"Error fetching playlist info for {playlist_id}: {e}")
+                continue
+            playlist = Playlist(name=playlist_info['name'], description=playlist_info['description'],
+                                poster=playlist_info['poster'])
+            logging.info(f"Playlist '{playlist.name}' changed to snapshot {snapshot_id}, syncing for {', '.join(users)}.")
+
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            for user in users:
+                output_dir = self.output_root / timestamp / user
+                output_dir.mkdir(parents=True, exist_ok=True)
+                try:
+                    self.sync_playlist(playlist_id, user, playlist, output_dir)
+                except Exception as e:
+                    # The next poll retries
+                    logging.error(f"Error syncing playlist ID {playlist_id} for {user}: {e}")
+                    continue
+                synced[user] = snapshot_id
+                self.save_state()
+                syncs += 1
+        return syncs
+
+    def run(self):
+        """Poll until stop() is called or the process is interrupted."""
+        logging.info(f"Watching {len(self.playlist_ids)} playlists for {len(self.user_tokens)} users "
+                     f"every {self.interval} seconds.")
+        self.start_event_listener()
+        try:
+            while not self.stopped.is_set():
+                start = time.perf_counter()
+                syncs = self.poll_once()
+                logging.info(f"Poll finished in {time.perf_counter() - start:.2f}s, {syncs} playlist syncs run.")
+                self.stopped.wait(self.interval)
+        except KeyboardInterrupt:
+            logging.info("Interrupted, stopping.")
+        finally:
+            self.stop_event_listener()
@@ -113,10 +113,10 @@ class TrackSelectionDialog(QDialog):
         # Spotify Track Info
         spotify_info = (
             f"Spotify Track Info:\n"
-            f"Artist: {', '.join(self.spotify_track_info['artists'])}\n"
-            f"Album: {self.spotify_track_info['album']}\n"
-            f"Track: {self.spotify_track_info['name']}\n"
-            f"Duration: {self.spotify_track_info['duration']}"
+            f"Artist: {', '.join(self.spotify_track_info.artists)}\n"
+            f"Album: {self.spotify_track_info.album}\n"
+            f"Track: {self.spotify_track_info.name}\n"
+            f"Duration: {self.spotify_track_info.duration}"
         )
         spotify_label = QLabel(spotify_info)
         layout.addWidget(spotify_label)
@@ -0,0 +1,117 @@
+import os
+import socket
+import sqlite3
+import time
+from collections import namedtuple
+from contextlib import closing
+
+DEFAULT_LEASE_SECONDS = 600
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_RETRY_DELAY_SECONDS = 60
+
+Job = namedtuple('Job', ['id', 'playlist_id', 'user', 'attempts'])
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    playlist_id TEXT NOT NULL,
+    user TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    not_before REAL NOT NULL,
+    lease_owner TEXT,
+    lease_expires REAL,
+    last_error TEXT,
+    enqueued_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_pending ON jobs (status, not_before, id);
+"""
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+class JobQueue:
+    """
+    Playlist x user sync jobs in a SQLite database that workers on one or more hosts
+    share. A worker leases the oldest due job for a while and renews the lease as long
+    as it works on it; a job whose lease ran out, e.g. because its worker died, is handed
+    to the next worker. Failed jobs are retried after a delay until max_attempts.
+
+    Every call opens its own connection, so a queue object can be used from any thread.
+    """
+
+    def __init__(self, path, lease_seconds=DEFAULT_LEASE_SECONDS, max_attempts=DEFAULT_MAX_ATTEMPTS,
+                 retry_delay_seconds=DEFAULT_RETRY_DELAY_SECONDS):
+        self.path = str(path)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_delay_seconds = retry_delay_seconds
+        with closing(self._connect()) as db:
+            db.executescript(SCHEMA)
+
+    def _connect(self):
+        # Autocommit mode; writes take the database lock with BEGIN IMMEDIATE
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        db.execute('PRAGMA busy_timeout = 30000')
+        return db
+
+    def enqueue(self, playlist_id, user):
+        """Queue a sync of the playlist for the user, unless one is already waiting or running; return whether it was queued."""
+        with closing(self._connect()) as db:
+            db.execute('BEGIN IMMEDIATE')
+            pending = db.execute("SELECT 1 FROM jobs WHERE playlist_id = ? AND user = ? AND status IN ('queued', 'leased')",
+                                 (playlist_id, user)).fetchone()
+            if pending is None:
+                now = time.time()
+                db.execute('INSERT INTO jobs (playlist_id, user, max_attempts, not_before, enqueued_at) VALUES (?, ?, ?, ?, ?)',
+                           (playlist_id, user, self.max_attempts, now, now))
+            db.execute('COMMIT')
+        return pending is None
+
+    def lease(self, worker_id):
+        """Lease the oldest due job, or one whose lease expired, to the worker; None when there is none."""
+        now = time.time()
+        with closing(self._connect()) as db:
+            db.execute('BEGIN IMMEDIATE')
+            # Jobs whose workers keep dying with them are given up like failing ones
+            db.execute("UPDATE jobs SET status = 'failed', finished_at = ?, last_error = 'lease expired' "
+                       "WHERE status = 'leased' AND lease_expires < ? AND attempts >= max_attempts", (now, now))
+            row = db.execute("SELECT id, playlist_id, user, attempts FROM jobs "
+                             "WHERE (status = 'queued' AND not_before <= ?) OR (status = 'leased' AND lease_expires < ?) "
+                             "ORDER BY id LIMIT 1", (now, now)).fetchone()
+            if row is not None:
+                db.execute("UPDATE jobs SET status = 'leased', lease_owner = ?, lease_expires = ?, attempts = attempts + 1 "
+                           "WHERE id = ?", (worker_id, now + self.lease_seconds, row[0]))
+            db.execute('COMMIT')
+        if row is None:
+            return None
+        return Job(row[0], row[1], row[2], row[3] + 1)
+
+    def renew(self, job, worker_id):
+        """Extend the worker's lease of the job; return False when the lease was lost to another worker."""
+        with closing(self._connect()) as db:
+            cursor = db.execute("UPDATE jobs SET lease_expires = ? WHERE id = ? AND status = 'leased' AND lease_owner = ?",
+                                (time.time() + self.lease_seconds, job.id, worker_id))
+            return cursor.rowcount == 1
+
+    def complete(self, job, worker_id):
+        with closing(self._connect()) as db:
+            db.execute("UPDATE jobs SET status = 'done', finished_at = ?, lease_owner = NULL, lease_expires = NULL "
+                       "WHERE id = ? AND lease_owner = ?", (time.time(), job.id, worker_id))
+
+    def fail(self, job, worker_id, error):
+        """Record a failed attempt; the job is queued again after the retry delay until it ran out of attempts."""
+        now = time.time()
+        with closing(self._connect()) as db:
+            db.execute("UPDATE jobs SET status = CASE WHEN attempts < max_attempts THEN 'queued' ELSE 'failed' END, "
+                       "not_before = ? + ? * attempts, last_error = ?, lease_owner = NULL, lease_expires = NULL, "
+                       "finished_at = CASE WHEN attempts < max_attempts THEN NULL ELSE ? END "
+                       "WHERE id = ? AND lease_owner = ?",
+                       (now, self.retry_delay_seconds, str(error), now, job.id, worker_id))
+
+    def counts(self):
+        """Number of jobs by status."""
+        with closing(self._connect()) as db:
+            return dict(db.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall())
@@ -0,0 +1,175 @@
+import json
+import logging
+import threading
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from helper_classes.candidate import PlexCandidate
+from .match_store import MatchStore
+from .sync_state import SyncState
+
+# Plex item type and timeline states of library notifications
+TRACK_TYPE = 10
+STATE_PROCESSED = 5
+STATE_DELETED = 9
+
+DEFAULT_WEBHOOK_PORT = 32600
+
+class LibraryEventHandler:
+    """
+    Apply Plex library events to the library index as they arrive and collect the
+    changed rating keys, so the caches that refer to them can be invalidated between
+    syncs. Events come from the server's websocket notifications (tracks added, edited
+    and deleted) or from webhook POSTs (tracks, albums and artists added).
+    """
+
+    def __init__(self, plex, library_index=None):
+        self.plex = plex
+        self.library_index = library_index
+        self._added = set()
+        self._deleted = set()
+        self._lock = threading.Lock()
+
+    def handle_alert(self, data):
+        """Callback for plexapi's AlertListener."""
+        container = data.get('NotificationContainer') or {}
+        if container.get('type') != 'timeline':
+            return
+        for entry in container.get('TimelineEntry') or []:
+            if entry.get('type') != TRACK_TYPE:
+                continue
+            if entry.get('state') == STATE_PROCESSED:
+                self.track_updated(int(entry['itemID']))
+            elif entry.get('state') == STATE_DELETED:
+                self.track_deleted(int(entry['itemID']))
+
+    def handle_webhook(self, payload):
+        """Apply a decoded webhook payload; Plex only reports additions to the library this way."""
+        metadata = payload.get('Metadata') or {}
+        if payload.get('event') != 'library.new' or metadata.get('type') not in ('track', 'album', 'artist'):
+            return
+        try:
+            item = self.plex.fetchItem(int(metadata['ratingKey']))
+            tracks = [item] if metadata['type'] == 'track' else item.tracks()
+        except Exception as e:
+            logging.error(f"Error fetching new Plex {metadata['type']} with key {metadata.get('ratingKey')}: {e}")
+            return
+        for track in tracks:
+            self._apply_update(PlexCandidate.from_plex_track(track))
+
+    def track_updated(self, rating_key):
+        try:
+            track = self.plex.fetchItem(rating_key)
+        except Exception as e:
+            logging.error(f"Error fetching changed Plex track with key {rating_key}: {e}")
+            return
+        self._apply_update(PlexCandidate.from_plex_track(track))
+
+    def track_deleted(self, rating_key):
+        if self.library_index is not None:
+            self.library_index.delete(rating_key)
+        with self._lock:
+            self._added.discard(rating_key)
+            self._deleted.add(rating_key)
+        logging.info(f"Plex track {rating_key} was deleted.")
+
+    def _apply_update(self, candidate):
+        if self.library_index is not None:
+            self.library_index.update(candidate)
+        with self._lock:
+            self._deleted.discard(candidate.rating_key)
+            self._added.add(candidate.rating_key)
+        logging.info(f"Plex track {candidate.rating_key} '{candidate.title}' by '{candidate.artist}' was added or changed.")
+
+    def take_changes(self):
+        """Return and reset the (added or changed, deleted) rating keys seen since the last call."""
+        with self._lock:
+            changes = (self._added, self._deleted)
+            self._added, self._deleted = set(), set()
+        return changes
+
+def invalidate_matches(match_storage_file, sync_state_file, server_id, deleted_keys, library_grew):
+    """
+    Forget the server's cached matches to deleted tracks and, when tracks were added or
+    changed, the playlist items the last sync left unmatched, so the next sync matches
+    them again. Returns the IDs of the Spotify playlists that hold forgotten items.
+    """
+    match_store = MatchStore(match_storage_file)
+    matched_tracks = match_store.for_server(server_id)
+    stale = [track_id for track_id, rating_key in matched_tracks.items() if rating_key in deleted_keys]
+    for track_id in stale:
+        del matched_tracks[track_id]
+    if stale:
+        match_store.save()
+
+    sync_state = SyncState(sync_state_file)
+    playlist_ids = set()
+    for target, playlists in sync_state.data.items():
+        if not target.startswith(f"{server_id}/"):
+            continue
+        for playlist_id, last_sync in playlists.items():
+            items = last_sync.get('items')
+            if not items:
+                continue
+            # Dropped entries look new to the delta sync, which matches and adds them again
+            kept = [entry for entry in items if not (entry['rating_key'] in deleted_keys
+                                                     or (library_grew and entry['rating_key'] is None))]
+            if len(kept) != len(items):
+                sync_state.set(target, playlist_id, {**last_sync, 'items': kept})
+                playlist_ids.add(playlist_id)
+    if playlist_ids:
+        sync_state.save()
+    logging.info(f"Forgot {len(stale)} cached matches to deleted tracks; {len(playlist_ids)} playlists need matching again.")
+    return playlist_ids
+
+def start_alert_listener(plex, handler):
+    """Listen to the server's notification websocket; needs the websocket-client package."""
+    def on_error(error):
+        logging.error(f"Plex notification listener error: {error}")
+    return plex.startAlertListener(callback=handler.handle_alert, callbackError=on_error)
+
+class _WebhookRequestHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        logging.debug("Webhook %s", format % args)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        try:
+            payload = self._payload(body)
+        except ValueError as e:
+            logging.warning(f"Ignoring malformed Plex webhook: {e}")
+            self.send_response(400)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.end_headers()
+        self.server.event_handler.handle_webhook(payload)
+
+    def _payload(self, body):
+        # Plex posts multipart/form-data with the event JSON in the 'payload' part
+        content_type = self.headers.get('Content-Type', '')
+        if content_type.startswith('application/json'):
+            return json.loads(body)
+        message = BytesParser(policy=HTTP).parsebytes(f'Content-Type: {content_type}\r\n\r\n'.encode('latin-1') + body)
+        for part in message.iter_parts():
+            if part.get_param('name', header='content-disposition') == 'payload':
+                return json.loads(part.get_content())
+        raise ValueError("no payload part")
+
+class WebhookServer(ThreadingHTTPServer):
+    """HTTP endpoint for Plex webhooks, served from a background thread."""
+
+    daemon_threads = True
+
+    def __init__(self, event_handler, port=DEFAULT_WEBHOOK_PORT, host=''):
+        super().__init__((host, port), _WebhookRequestHandler)
+        self.event_handler = event_handler
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name='plex-webhooks', daemon=True).start()
+        logging.info(f"Listening for Plex webhooks on port {self.server_address[1]}.")
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,203 @@
+import heapq
+import logging
+import threading
+from array import array
+from bisect import bisect_left
+from helper_classes.candidate import PlexCandidate
+from .normalization import normalize_name, titles_overlap
+
+# Default distance between Spotify and Plex durations still considered the same recording
+DEFAULT_DURATION_WINDOW_MS = 15000
+
+def find_music_section(plex, section=None):
+    """Return the music section given by ID or title, or the first music section of the Plex server."""
+    if section is not None:
+        return plex.library.sectionByID(int(section)) if str(section).isdigit() else plex.library.section(section)
+    for section in plex.library.sections():
+        if section.type == 'artist':
+            return section
+    raise ValueError("No music library found on the Plex server.")
+
+class LibraryIndex:
+    """
+    In-memory index of the Plex music library for candidate retrieval without searches.
+
+    Rows are kept in rating key order, with a duration column alongside. Next to them
+    the index holds one ascending rating key array per normalized artist, so retrieval
+    is a scan of the artist block that checks durations before touching any row.
+    Optionally it maps ISRCs, e.g. from file tags, to rating keys.
+
+    Library changes, e.g. from Plex events, are applied with update() and delete() to
+    an overlay over the base columns, which stay untouched and may be memory-mapped.
+    """
+
+    def __init__(self, candidates, isrc_keys=None):
+        self._rows = sorted(candidates, key=lambda candidate: candidate.rating_key)
+        self._keys = array('q', (candidate.rating_key for candidate in self._rows))
+        self._durations = array('q', (candidate.duration or 0 for candidate in self._rows))
+
+        self._artist_blocks = {}
+        for candidate in self._rows:
+            self._artist_blocks.setdefault(candidate.norm_artist, array('q')).append(candidate.rating_key)
+        self._isrc_keys = dict(isrc_keys or {})
+        self._init_overlay()
+
+    def _init_overlay(self):
+        # Tracks added or changed since the base columns were built, and the base rating keys
+        # they replace or that were deleted, each also grouped by normalized artist
+        self._overlay = {}
+        self._hidden = set()
+        self._overlay_by_artist = {}
+        self._hidden_by_artist = {}
+        self._overlay_lock = threading.Lock()
+
+    @classmethod
+    def from_columns(cls, rows, keys, durations, artist_blocks):
+        """
+        Build the index from prebuilt columns, e.g. the memory-mapped arrays of a library
+        snapshot. rows and durations (0 when unknown) must be indexable by rating key
+        position and all key sequences ascending.
+        """
+        index = cls.__new__(cls)
+        index._rows = rows
+        index._keys = keys
+        index._durations = durations
+        index._artist_blocks = artist_blocks
+        index._isrc_keys = {}
+        index._init_overlay()
+        return index
+
+    @classmethod
+    def from_plex(cls, plex, section=None):
+        """Build the index by walking every track of the Plex music section."""
+        section = section or find_music_section(plex)
+        logging.info(f"Indexing Plex music section '{section.title}'...")
+        candidates = [PlexCandidate.from_plex_track(track) for track in section.searchTracks()]
+        logging.info(f"Indexed {len(candidates)} Plex tracks.")
+        return cls(candidates)
+
+    def update(self, candidate):
+        """Add a track to the index, or replace the indexed track with the same rating key."""
+        with self._overlay_lock:
+            self._drop_from_overlay(candidate.rating_key)
+            self._overlay[candidate.rating_key] = candidate
+            self._overlay_by_artist.setdefault(candidate.norm_artist, set()).add(candidate.rating_key)
+            self._hide_base_row(candidate.rating_key)
+
+    def delete(self, rating_key):
+        """Remove a track from the index."""
+        with self._overlay_lock:
+            self._drop_from_overlay(rating_key)
+            self._hide_base_row(rating_key)
+
+    def _drop_from_overlay(self, rating_key):
+        candidate = self._overlay.pop(rating_key, None)
+        if candidate is not None:
+            keys = self._overlay_by_artist[candidate.norm_artist]
+            keys.discard(rating_key)
+            if not keys:
+                del self._overlay_by_artist[candidate.norm_artist]
+
+    def _hide_base_row(self, rating_key):
+        if rating_key in self._hidden:
+            return
+        pos = self._position(rating_key)
+        if pos is not None:
+            self._hidden.add(rating_key)
+            self._hidden_by_artist.setdefault(self._rows[pos].norm_artist, set()).add(rating_key)
+
+    def __len__(self):
+        with self._overlay_lock:
+            return len(self._keys) - len(self._hidden) + len(self._overlay)
+
+    def __iter__(self):
+        """The indexed PlexCandidates in rating key order."""
+        with self._overlay_lock:
+            overlay = dict(self._overlay)
+            hidden = set(self._hidden)
+        if not overlay and not hidden:
+            for pos in range(len(self._keys)):
+                yield self._rows[pos]
+            return
+        base_positions = (pos for pos in range(len(self._keys)) if self._keys[pos] not in hidden)
+        for key, pos in heapq.merge(((self._keys[pos], pos) for pos in base_positions),
+                                    ((key, None) for key in sorted(overlay))):
+            yield overlay[key] if pos is None else self._rows[pos]
+
+    def __contains__(self, rating_key):
+        return self.get(rating_key) is not None
+
+    def _position(self, rating_key):
+        pos = bisect_left(self._keys, rating_key)
+        if pos < len(self._keys) and self._keys[pos] == rating_key:
+            return pos
+        return None
+
+    def get(self, rating_key):
+        """Return the PlexCandidate for a rating key, or None if it is not indexed."""
+        if self._overlay or self._hidden:
+            with self._overlay_lock:
+                if rating_key in self._overlay:
+                    return self._overlay[rating_key]
+                if rating_key in self._hidden:
+                    return None
+        pos = self._position(rating_key)
+        return self._rows[pos] if pos is not None else None
+
+    def key_for_isrc(self, isrc):
+        """Rating key of the indexed track with the ISRC, or None."""
+        return self._isrc_keys.get(isrc.upper()) if isrc else None
+
+    def _artist_view(self, artist):
+        """
+        The artist's ascending rating keys with the overlay candidates among them, taken
+        under one hold of the overlay lock. Keys not in the overlay are base rows, which
+        never change, so the view stays consistent while events keep arriving.
+        """
+        norm_artist = normalize_name(artist)
+        base_keys = self._artist_blocks.get(norm_artist, array('q'))
+        with self._overlay_lock:
+            hidden = set(self._hidden_by_artist.get(norm_artist, ()))
+            added = {key: self._overlay[key] for key in self._overlay_by_artist.get(norm_artist, ())}
+        if not hidden and not added:
+            return base_keys, added
+        # Only this artist's block and overlay entries are merged, however many events arrived
+        keys = [key for key in base_keys if key not in hidden]
+        keys.extend(added)
+        keys.sort()
+        return array('q', keys), added
+
+    def artist_keys(self, artist):
+        """Ascending rating keys of the tracks by the artist."""
+        return self._artist_view(artist)[0]
+
+    def artist_candidates(self, artist):
+        """The indexed PlexCandidates by the artist, in rating key order."""
+        keys, added = self._artist_view(artist)
+        return [added[key] if key in added else self._rows[self._position(key)] for key in keys]
+
+    def candidates_for(self, spotify_track_info, window_ms=DEFAULT_DURATION_WINDOW_MS):
+        """
+        Return the indexed tracks by the Spotify track's artist, close to its duration,
+        whose normalized title contains or is contained in the Spotify title.
+        """
+        spotify_duration = spotify_track_info.duration_ms
+        spotify_title = normalize_name(spotify_track_info.name)
+        keys, added = self._artist_view(spotify_track_info.artist)
+        candidates = []
+        for rating_key in keys:
+            candidate = added.get(rating_key)
+            if candidate is None:
+                # Base rows are only built once their duration column passes
+                pos = self._position(rating_key)
+                duration = self._durations[pos]
+            else:
+                duration = candidate.duration or 0
+            # Tracks of unknown length stay candidates
+            if spotify_duration and duration and abs(duration - spotify_duration) > window_ms:
+                continue
+            if candidate is None:
+                candidate = self._rows[pos]
+            if candidate.norm_title and titles_overlap(spotify_title, candidate.norm_title):
+                candidates.append(candidate)
+        return candidates
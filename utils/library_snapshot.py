@@ -0,0 +1,182 @@
+import json
+import logging
+import mmap
+import os
+import sys
+import time
+from array import array
+from pathlib import Path
+from helper_classes.candidate import PlexCandidate
+from .library_index import LibraryIndex
+
+SNAPSHOT_MAGIC = b'SPXLIB01'
+SNAPSHOT_VERSION = 3
+
+# Per-row string columns, each stored as an int32 id into the snapshot's string table
+STRING_COLUMNS = ('title', 'artist', 'album', 'file', 'norm_title', 'norm_artist', 'norm_album', 'guid')
+
+class _SnapshotRows:
+    """Rows of a memory-mapped snapshot, materialized as PlexCandidates on access."""
+
+    def __init__(self, keys, durations, columns, string_offsets, strings):
+        self._keys = keys
+        self._durations = durations
+        self._columns = [columns[name] for name in STRING_COLUMNS]
+        self._string_offsets = string_offsets
+        self._strings = strings
+
+    def string(self, string_id):
+        if string_id < 0:
+            return None
+        return str(self._strings[self._string_offsets[string_id]:self._string_offsets[string_id + 1]], 'utf-8')
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __getitem__(self, pos):
+        title, artist, album, file, norm_title, norm_artist, norm_album, guid = (
+            self.string(column[pos]) for column in self._columns)
+        return PlexCandidate(self._keys[pos], title, artist, album, self._durations[pos] or None, file,
+                             norm_title, norm_artist, norm_album, guid)
+
+def write_snapshot(index, path, metadata=None):
+    """
+    Write a LibraryIndex to a columnar snapshot file that load_snapshot can memory-map.
+
+    The file is a magic number, a JSON header describing the sections, then 8-byte aligned
+    native-endian arrays: rating keys, durations, one string id column per name field,
+    the artist blocks and a deduplicated UTF-8 string table. It is written next to its
+    final name and renamed, so readers never see a partial snapshot.
+    """
+    path = Path(path)
+    rows = list(index)
+    strings = {}
+
+    def string_id(value):
+        if value is None:
+            return -1
+        return strings.setdefault(value, len(strings))
+
+    sections = {
+        'keys': array('q', (row.rating_key for row in rows)),
+        'durations': array('q', (row.duration or 0 for row in rows)),
+    }
+    for name in STRING_COLUMNS:
+        sections[name] = array('i', (string_id(getattr(row, name)) for row in rows))
+
+    artist_blocks = {}
+    for row in rows:
+        artist_blocks.setdefault(row.norm_artist, array('q')).append(row.rating_key)
+    sections['artist_names'] = array('i', (string_id(artist) for artist in artist_blocks))
+    sections['artist_offsets'] = array('q', [0])
+    sections['artist_keys'] = array('q')
+    for keys in artist_blocks.values():
+        sections['artist_keys'].extend(keys)
+        sections['artist_offsets'].append(len(sections['artist_keys']))
+
+    encoded = [value.encode('utf-8') for value in strings]
+    sections['string_offsets'] = array('q', [0])
+    for value in encoded:
+        sections['string_offsets'].append(sections['string_offsets'][-1] + len(value))
+    sections['strings'] = b''.join(encoded)
+
+    layout = {}
+    offset = 0
+    for name, data in sections.items():
+        size = len(data) * data.itemsize if isinstance(data, array) else len(data)
+        layout[name] = {'offset': offset, 'size': size, 'typecode': getattr(data, 'typecode', 'B')}
+        offset += (size + 7) & ~7
+    header = json.dumps({
+        'version': SNAPSHOT_VERSION,
+        'byteorder': sys.byteorder,
+        'rows': len(rows),
+        'created_at': time.time(),
+        'metadata': metadata or {},
+        'sections': layout,
+    }).encode('utf-8')
+    header += b' ' * (-(len(SNAPSHOT_MAGIC) + 4 + len(header)) % 8)
+
+    temp_path = path.with_name(path.name + '.tmp')
+    with open(temp_path, 'wb') as f:
+        f.write(SNAPSHOT_MAGIC)
+        f.write(len(header).to_bytes(4, 'little'))
+        f.write(header)
+        for name, data in sections.items():
+            f.write(data.tobytes() if isinstance(data, array) else data)
+            f.write(b'\0' * (-layout[name]['size'] % 8))
+    os.replace(temp_path, path)
+    logging.info(f"Wrote library snapshot of {len(rows)} tracks to {path}.")
+    return path
+
+def read_snapshot_header(path):
+    """Return the JSON header of a snapshot file without mapping its columns."""
+    with open(path, 'rb') as f:
+        if f.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+            raise ValueError(f"{path} is not a library snapshot.")
+        length = int.from_bytes(f.read(4), 'little')
+        header = json.loads(f.read(length))
+    if header['version'] != SNAPSHOT_VERSION or header['byteorder'] != sys.byteorder:
+        raise ValueError(f"Library snapshot {path} was written by an incompatible version or platform.")
+    # The header is padded so the columns after it start 8-byte aligned
+    header['data_start'] = len(SNAPSHOT_MAGIC) + 4 + length
+    return header
+
+def load_snapshot(path):
+    """
+    Memory-map a snapshot written by write_snapshot and return a LibraryIndex over it.
+
+    Nothing but the header and the artist names is decoded up front; the columns are read
+    through the page cache, so processes loading the same snapshot share its pages.
+    """
+    header = read_snapshot_header(path)
+    with open(path, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    buffer = memoryview(mapped)
+
+    def section(name):
+        layout = header['sections'][name]
+        start = header['data_start'] + layout['offset']
+        view = buffer[start:start + layout['size']]
+        return view if layout['typecode'] == 'B' else view.cast(layout['typecode'])
+
+    keys = section('keys')
+    durations = section('durations')
+    rows = _SnapshotRows(keys, durations, {name: section(name) for name in STRING_COLUMNS},
+                         section('string_offsets'), section('strings'))
+    artist_keys = section('artist_keys')
+    artist_offsets = section('artist_offsets')
+    artist_blocks = {
+        rows.string(name_id): artist_keys[artist_offsets[i]:artist_offsets[i + 1]]
+        for i, name_id in enumerate(section('artist_names'))
+    }
+    return LibraryIndex.from_columns(rows, keys, durations, artist_blocks)
+
+def load_or_build_index(plex, path, max_age_hours=None, refresh=False):
+    """
+    Return the library index from the snapshot at path, building it from the Plex server
+    and writing the snapshot when it is missing, unreadable, older than max_age_hours or
+    refresh is set, or when it was built from another Plex server.
+    """
+    path = Path(path)
+    server = getattr(plex, 'machineIdentifier', None)
+    if path.exists() and not refresh:
+        try:
+            header = read_snapshot_header(path)
+            age_hours = (time.time() - header['created_at']) / 3600
+            if header['metadata'].get('server') not in (None, server):
+                logging.info(f"Library snapshot {path} is of another Plex server, rebuilding it.")
+            elif max_age_hours is None or age_hours <= max_age_hours:
+                start = time.perf_counter()
+                index = load_snapshot(path)
+                logging.info(f"Loaded library snapshot of {len(index)} tracks from {path} "
+                             f"in {time.perf_counter() - start:.3f}s ({age_hours:.1f} hours old).")
+                return index
+            else:
+                logging.info(f"Library snapshot {path} is {age_hours:.1f} hours old, rebuilding it.")
+        except (OSError, ValueError, KeyError) as e:
+            logging.warning(f"Could not load library snapshot {path}, rebuilding it: {e}")
+
+    index = LibraryIndex.from_plex(plex)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    write_snapshot(index, path, {'server': server})
+    return index
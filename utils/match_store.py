@@ -0,0 +1,187 @@
+import json
+import logging
+import os
+from pathlib import Path
+from .file_lock import file_lock
+
+STORE_VERSION = 2
+
+def file_tail(path, parts=3):
+    """The last parts of a file path, usually artist/album/file, which survive different library mount points."""
+    if not path:
+        return None
+    return '/'.join(path.replace('\\', '/').lower().split('/')[-parts:])
+
+def portable_guid(guid):
+    """The track GUID when it names the recording on every server; local agent GUIDs are per server."""
+    return guid if guid and not guid.startswith(('local://', 'com.plexapp.agents.none')) else None
+
+class MatchStore:
+    """
+    Spotify track ID to Plex rating key matches, kept per Plex server by its
+    machineIdentifier, since rating keys are only valid on the server that issued them.
+
+    Next to the matches the store keeps, per Spotify track, what identifies the matched
+    recording anywhere: the file path, the agent GUID and the ISRC. A server without
+    matches of its own is seeded from these in one pass over its library index, instead
+    of matching every track again.
+
+    The file is {'version': 2, 'servers': {machineIdentifier: {track id: rating key}},
+    'tracks': {track id: {'file', 'guid', 'isrc'}}, 'untranslated': {machineIdentifier:
+    {'library_size', 'track_ids'}}}. The last part holds the tracks a server's library
+    had no match for, which are only tried again when the library's size or the track's
+    identity changes. A flat file of the old format holds the matches of the one server
+    synced before, and is adopted by the first server that opens it.
+
+    Several processes, e.g. sync workers on different hosts, can share the file: saving
+    merges this store's changes since it was loaded into the file's current content.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.servers, self.tracks, self.untranslated, self._legacy = self._read()
+        self._untranslated_changed = set()
+        self._mark_loaded()
+
+    def _read(self):
+        """(servers, tracks, untranslated tracks, flat matches of the old format or None) from the file."""
+        if not self.path.exists():
+            return {}, {}, {}, None
+        with open(self.path, 'r') as f:
+            data = json.load(f)
+        if data.get('version') == STORE_VERSION:
+            untranslated = {server_id: {'library_size': entry['library_size'], 'track_ids': set(entry['track_ids'])}
+                            for server_id, entry in data.get('untranslated', {}).items()}
+            return data['servers'], data.get('tracks', {}), untranslated, None
+        return {}, {}, {}, data
+
+    def _mark_loaded(self):
+        self._loaded_servers = {server_id: dict(matches) for server_id, matches in self.servers.items()}
+        self._loaded_tracks = dict(self.tracks)
+
+    def for_server(self, server_id):
+        """The mutable {track id: rating key} matches of a server."""
+        if server_id not in self.servers and self._legacy is not None:
+            logging.info(f"Migrating {len(self._legacy)} matches from {self.path} to Plex server {server_id}.")
+            self.servers[server_id] = self._legacy
+            self._legacy = None
+        return self.servers.setdefault(server_id, {})
+
+    def remember(self, track_id, file=None, guid=None, isrc=None):
+        """Record what identifies the recording a Spotify track was matched to."""
+        identity = {'file': file, 'guid': portable_guid(guid), 'isrc': isrc.upper() if isrc else None}
+        if any(identity.values()) and self.tracks.get(track_id) != identity:
+            self.tracks[track_id] = identity
+            # Another recording may be found where this one wasn't
+            for server_id, untranslated in self.untranslated.items():
+                if track_id in untranslated['track_ids']:
+                    untranslated['track_ids'].discard(track_id)
+                    self._untranslated_changed.add(server_id)
+
+    def describe_from_index(self, server_id, library_index):
+        """Record identities of the server's matches that have none yet, from its library index."""
+        described = 0
+        for track_id, rating_key in self.for_server(server_id).items():
+            if track_id in self.tracks:
+                continue
+            candidate = library_index.get(rating_key)
+            if candidate is not None:
+                self.remember(track_id, candidate.file, candidate.guid)
+                described += track_id in self.tracks
+        return described
+
+    def translate(self, server_id, library_index):
+        """
+        Match the tracks matched on other servers but not on this one, by file path, GUID
+        or ISRC, in one pass over the server's library index. Returns the number matched.
+
+        Tracks the pass finds no match for are remembered, and left out of later passes
+        until the size of the server's library changes.
+        """
+        matches = self.for_server(server_id)
+        library_size = len(library_index)
+        untranslated = self.untranslated.get(server_id)
+        tried = untranslated['track_ids'] if untranslated and untranslated['library_size'] == library_size else set()
+        missing = {track_id: identity for track_id, identity in self.tracks.items()
+                   if track_id not in matches and track_id not in tried}
+        if not missing:
+            return 0
+        by_file = {}
+        by_guid = {}
+        for candidate in library_index:
+            if candidate.file:
+                by_file.setdefault(file_tail(candidate.file), candidate.rating_key)
+            if portable_guid(candidate.guid):
+                by_guid.setdefault(candidate.guid, candidate.rating_key)
+
+        translated = 0
+        for track_id, identity in missing.items():
+            rating_key = by_file.get(file_tail(identity.get('file')))
+            if rating_key is None and identity.get('guid'):
+                rating_key = by_guid.get(identity['guid'])
+            if rating_key is None and identity.get('isrc'):
+                rating_key = library_index.key_for_isrc(identity['isrc'])
+            if rating_key is not None:
+                matches[track_id] = rating_key
+                translated += 1
+            else:
+                tried.add(track_id)
+        # Tracks matched since they were tried, e.g. by a sync, need not be remembered
+        self.untranslated[server_id] = {'library_size': library_size,
+                                        'track_ids': {track_id for track_id in tried if track_id not in matches}}
+        self._untranslated_changed.add(server_id)
+        logging.info(f"Carried {translated} of {len(missing)} matches from other Plex servers over to {server_id}.")
+        return translated
+
+    def matches_for(self, plex, library_index=None):
+        """
+        The matches of the Plex server, first described and completed from the other
+        servers' matches when a library index of the server is at hand.
+        """
+        server_id = plex.machineIdentifier
+        matches = self.for_server(server_id)
+        if library_index is not None:
+            self.describe_from_index(server_id, library_index)
+            self.translate(server_id, library_index)
+        return matches
+
+    def save(self):
+        """
+        Merge the matches added, changed and removed since loading into the file, under
+        a lock, and write it next to its final name and rename it, so a crash never
+        leaves a partial file. Afterwards the store holds the merged matches.
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with file_lock(self.path):
+            servers, tracks, untranslated, _ = self._read()
+            for server_id, matches in self.servers.items():
+                _merge_changes(servers.setdefault(server_id, {}), matches, self._loaded_servers.get(server_id, {}))
+            _merge_changes(tracks, self.tracks, self._loaded_tracks)
+            # Only a hint for the next translate; the last store to try a server wins
+            for server_id in self._untranslated_changed:
+                untranslated[server_id] = self.untranslated[server_id]
+            temp_path = self.path.with_name(self.path.name + '.tmp')
+            with open(temp_path, 'w') as f:
+                json.dump({'version': STORE_VERSION, 'servers': servers, 'tracks': tracks,
+                           'untranslated': {server_id: {'library_size': entry['library_size'],
+                                                        'track_ids': sorted(entry['track_ids'])}
+                                            for server_id, entry in untranslated.items()}}, f, indent=4)
+            os.replace(temp_path, self.path)
+        # Update in place, since callers hold on to the dicts for_server returned
+        for server_id, matches in servers.items():
+            own = self.servers.setdefault(server_id, {})
+            own.clear()
+            own.update(matches)
+        self.tracks.clear()
+        self.tracks.update(tracks)
+        self.untranslated = untranslated
+        self._untranslated_changed.clear()
+        self._mark_loaded()
+
+def _merge_changes(merged, current, loaded):
+    """Apply the differences between loaded and current to merged."""
+    for key, value in current.items():
+        if loaded.get(key) != value:
+            merged[key] = value
+    for key in loaded.keys() - current.keys():
+        merged.pop(key, None)
@@ -1,31 +1,119 @@
-from .similarity import calculate_similarity, calculate_duration_similarity
+import heapq
+from fuzzywuzzy import fuzz
+from helper_classes.candidate import as_candidate
+from .similarity import calculate_name_similarity, calculate_duration_similarity, MAX_NAME_SIMILARITY
 from .normalization import normalize_name
 
-def filter_and_sort_tracks(plex_tracks, spotify_track_info):
-    """Filter and sort Plex tracks based on similarity to Spotify track info."""
-    spotify_track = spotify_track_info['name']
-    spotify_artist = spotify_track_info['artists'][0]
-    spotify_album = spotify_track_info['album']
-    spotify_duration = spotify_track_info.get('duration_ms')
+# Highest rank_candidates score: identical names at the exact Spotify length. Tracks without
+# a Spotify length are scored on names alone and reach MAX_NAME_SIMILARITY instead.
+MAX_RANK_SCORE = MAX_NAME_SIMILARITY * 0.8 + 100 * 0.2
 
-    scored_tracks = []
+def _rank(entries, spotify_track_info, limit, certain_score=None, max_duration_diff_ms=None):
+    """
+    Score (candidate, payload) pairs and return the top (payload, score) pairs.
 
-    for plex_track in plex_tracks:
-        similarity = calculate_similarity(plex_track, spotify_track, spotify_artist, spotify_album)
+    The exact artist gate and the duration check run before any fuzzy ratio, and a
+    candidate is only fuzzy-scored if its best possible score could still enter the
+    top `limit`. Scoring stops at the first candidate reaching `certain_score`.
+    """
+    spotify_title = normalize_name(spotify_track_info.name)
+    spotify_artist = normalize_name(spotify_track_info.artist)
+    spotify_album = normalize_name(spotify_track_info.album)
+    spotify_duration = spotify_track_info.duration_ms
+
+    # Min-heap of (score, -position, payload) holding the best `limit` tracks so far;
+    # the negated position makes earlier candidates win ties, as a stable sort would.
+    top_tracks = []
+
+    for position, (candidate, payload) in enumerate(entries):
+        # Filter out tracks where artist does not match
+        if candidate.norm_artist != spotify_artist:
+            continue
+
+        duration_similarity = None
         if spotify_duration:
-            duration_similarity = calculate_duration_similarity(plex_track.duration, spotify_duration)
+            if (max_duration_diff_ms is not None and candidate.duration
+                    and abs(candidate.duration - spotify_duration) > max_duration_diff_ms):
+                continue
+            duration_similarity = calculate_duration_similarity(candidate.duration, spotify_duration)
+            best_possible = MAX_NAME_SIMILARITY * 0.8 + duration_similarity * 0.2
+            if len(top_tracks) == limit and best_possible <= top_tracks[0][0]:
+                continue
+
+        similarity = calculate_name_similarity(candidate.norm_title, candidate.norm_artist, candidate.norm_album,
+                                               spotify_title, spotify_artist, spotify_album)
+        if duration_similarity is not None:
             similarity = (similarity * 0.8) + (duration_similarity * 0.2)
-        
-        scored_tracks.append((plex_track, similarity))
-    
-    # Filter out tracks where artist does not match
-    scored_tracks = [track for track in scored_tracks if normalize_name(track[0].artist().title) == normalize_name(spotify_artist)]
-    
-    # Sort tracks by similarity score in descending order and limit to top 10
-    scored_tracks.sort(key=lambda x: x[1], reverse=True)
-    return [track[0] for track in scored_tracks[:10]]
+
+        entry = (similarity, -position, payload)
+        if len(top_tracks) < limit:
+            heapq.heappush(top_tracks, entry)
+        elif entry[:2] > top_tracks[0][:2]:
+            heapq.heapreplace(top_tracks, entry)
+
+        if certain_score is not None and similarity >= certain_score:
+            break
+
+    # Sort tracks by similarity score in descending order
+    top_tracks.sort(key=lambda x: x[:2], reverse=True)
+    return [(payload, similarity) for similarity, _, payload in top_tracks]
+
+def rank_candidates(candidates, spotify_track_info, limit=10, certain_score=None, max_duration_diff_ms=None):
+    """Return the top (PlexCandidate, score) pairs for Spotify track info."""
+    return _rank(((candidate, candidate) for candidate in candidates), spotify_track_info, limit,
+                 certain_score, max_duration_diff_ms)
+
+def auto_accepted(suggestions, min_score):
+    """
+    The top (PlexCandidate, score) pair of rank_candidates suggestions when it scores at least
+    min_score, on the rank_candidates scale (up to MAX_RANK_SCORE, not 100); None otherwise.
+    """
+    if suggestions and min_score is not None and suggestions[0][1] >= min_score:
+        return suggestions[0]
+    return None
+
+def filter_and_sort_tracks(plex_tracks, spotify_track_info, limit=10, certain_score=None, max_duration_diff_ms=None):
+    """
+    Filter and sort Plex tracks based on similarity to Spotify track info.
+
+    certain_score stops scoring at the first track that good; max_duration_diff_ms
+    drops tracks whose length differs by more than that before any fuzzy scoring.
+    """
+    entries = ((as_candidate(plex_track), plex_track) for plex_track in plex_tracks)
+    return [plex_track for plex_track, _ in _rank(entries, spotify_track_info, limit,
+                                                  certain_score, max_duration_diff_ms)]
 
 def match_track(plex_tracks, spotify_track_info):
     """Match a Spotify track with Plex tracks using a hierarchical matching strategy."""
     filtered_tracks = filter_and_sort_tracks(plex_tracks, spotify_track_info)
     return filtered_tracks[0] if filtered_tracks else None
+
+def find_fuzzy_match(spotify_track_info, plex_tracks, threshold=80, certain_score=None):
+    """
+    Return the Plex track whose name, artist, and album best match above the threshold, if any.
+
+    certain_score stops scoring at the first track whose combined score is that high.
+    """
+    best_match = None
+    highest_score = 0
+
+    for plex_track in plex_tracks:
+        candidate = as_candidate(plex_track)
+        track_name_ratio = fuzz.ratio(spotify_track_info.name, candidate.title)
+        artist_name_ratio = fuzz.ratio(spotify_track_info.artist, candidate.artist)
+        album_name_ratio = fuzz.ratio(spotify_track_info.album, candidate.album)
+
+        combined_score = (track_name_ratio + artist_name_ratio + album_name_ratio) / 3
+
+        if combined_score > highest_score and combined_score > threshold:
+            highest_score = combined_score
+            best_match = plex_track
+            if certain_score is not None and combined_score >= certain_score:
+                break
+
+    return best_match
+
+def find_fuzzy_match_key(spotify_track_info, candidates, certain_score=None):
+    """Pool-friendly variant of find_fuzzy_match returning only the rating key."""
+    best_match = find_fuzzy_match(spotify_track_info, candidates, certain_score=certain_score)
+    return best_match.rating_key if best_match else None
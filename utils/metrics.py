@@ -0,0 +1,171 @@
+import json
+import logging
+import os
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+
+# Upper bounds, in seconds, of the per-track latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class SyncMetrics:
+    """
+    Wall time, call counts and request volume of one playlist sync, broken down by
+    phase and by backend (Spotify, Plex), plus per-track latency histograms. target
+    names the Plex server and account synced to (see SyncState.target_id), since
+    several users sync the same playlist.
+    """
+
+    def __init__(self, playlist_id, playlist_name='', target=None):
+        self.playlist_id = playlist_id
+        self.playlist_name = playlist_name
+        self.target = target
+        self.started_at = time.time()
+        self.phases = defaultdict(lambda: {'seconds': 0.0, 'calls': 0})
+        self.backends = defaultdict(lambda: {'requests': 0, 'bytes': 0, 'seconds': 0.0})
+        self.phase_requests = defaultdict(int)
+        self.phase_bytes = defaultdict(int)
+        self.histograms = defaultdict(lambda: [0] * (len(LATENCY_BUCKETS) + 1))
+        self.histogram_sums = defaultdict(float)
+        self.counters = defaultdict(int)
+        self.current_phase = None
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name):
+        """Attribute the wall time and requests of the block to a phase; phases may nest."""
+        outer = self.current_phase
+        self.current_phase = name
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name]['seconds'] += time.perf_counter() - start
+            self.phases[name]['calls'] += 1
+            self.current_phase = outer
+
+    def record_request(self, backend, size, seconds):
+        self.backends[backend]['requests'] += 1
+        self.backends[backend]['bytes'] += size
+        self.backends[backend]['seconds'] += seconds
+        self.phase_requests[(self.current_phase or 'other', backend)] += 1
+        self.phase_bytes[(self.current_phase or 'other', backend)] += size
+
+    def observe(self, histogram, seconds):
+        """Add one observation, e.g. a track's lookup latency, to a histogram."""
+        self.histograms[histogram][bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.histogram_sums[histogram] += seconds
+
+    def count(self, name, amount=1):
+        self.counters[name] += amount
+
+    def summary(self):
+        """Machine-readable summary of the sync so far."""
+        return {
+            'playlist_id': self.playlist_id,
+            'playlist_name': self.playlist_name,
+            'target': self.target,
+            'started_at': self.started_at,
+            'seconds': time.perf_counter() - self._start,
+            'phases': dict(self.phases),
+            'backends': dict(self.backends),
+            'requests_per_phase': [
+                {'phase': phase, 'backend': backend, 'requests': requests,
+                 'bytes': self.phase_bytes[(phase, backend)]}
+                for (phase, backend), requests in sorted(self.phase_requests.items())
+            ],
+            'histograms': {
+                name: {
+                    'buckets': dict(zip([str(bound) for bound in LATENCY_BUCKETS] + ['+Inf'], buckets)),
+                    'sum': self.histogram_sums[name],
+                    'count': sum(buckets),
+                }
+                for name, buckets in self.histograms.items()
+            },
+            'counters': dict(self.counters),
+        }
+
+    def write_summary(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.summary(), f, indent=4)
+
+    def prometheus_text(self):
+        """Render the metrics in the Prometheus text exposition format."""
+        labels = (f'playlist_id="{_escape(self.playlist_id)}",playlist="{_escape(self.playlist_name)}",'
+                  f'target="{_escape(self.target or "")}"')
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f'# HELP spotiplex_sync_{name} {help_text}')
+            lines.append(f'# TYPE spotiplex_sync_{name} {kind}')
+            for extra_labels, value in samples:
+                lines.append(f'spotiplex_sync_{name}{{{labels}{extra_labels}}} {value}')
+
+        metric('duration_seconds', 'gauge', 'Wall time of the last sync.',
+               [('', time.perf_counter() - self._start)])
+        metric('last_run_timestamp_seconds', 'gauge', 'Start time of the last sync.',
+               [('', self.started_at)])
+        metric('phase_seconds', 'gauge', 'Wall time per sync phase.',
+               [(f',phase="{phase}"', stats['seconds']) for phase, stats in self.phases.items()])
+        metric('phase_calls', 'gauge', 'Times each sync phase was entered.',
+               [(f',phase="{phase}"', stats['calls']) for phase, stats in self.phases.items()])
+        metric('backend_requests', 'gauge', 'HTTP requests per backend and phase.',
+               [(f',phase="{phase}",backend="{backend}"', requests)
+                for (phase, backend), requests in self.phase_requests.items()])
+        metric('backend_bytes', 'gauge', 'HTTP response bytes per backend and phase.',
+               [(f',phase="{phase}",backend="{backend}"', size)
+                for (phase, backend), size in self.phase_bytes.items()])
+        metric('backend_seconds', 'gauge', 'Time spent waiting on each backend.',
+               [(f',backend="{backend}"', stats['seconds']) for backend, stats in self.backends.items()])
+        metric('tracks', 'gauge', 'Tracks by outcome.',
+               [(f',outcome="{name}"', value) for name, value in self.counters.items()])
+
+        for name, buckets in self.histograms.items():
+            lines.append(f'# HELP spotiplex_sync_{name}_seconds Per-track latency.')
+            lines.append(f'# TYPE spotiplex_sync_{name}_seconds histogram')
+            cumulative = 0
+            for bound, count in zip([str(bound) for bound in LATENCY_BUCKETS] + ['+Inf'], buckets):
+                cumulative += count
+                lines.append(f'spotiplex_sync_{name}_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'spotiplex_sync_{name}_seconds_sum{{{labels}}} {self.histogram_sums[name]}')
+            lines.append(f'spotiplex_sync_{name}_seconds_count{{{labels}}} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus_textfile(self, directory):
+        """
+        Write the metrics for the node exporter textfile collector, one file per playlist
+        and target. The file is written next to its final name and renamed so the
+        collector never reads a partial file.
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        name = self.playlist_id if self.target is None else f"{self.playlist_id}_{self.target.replace('/', '_')}"
+        path = directory / f'spotiplex_{name}.prom'
+        temp_path = path.with_suffix('.prom.tmp')
+        with open(temp_path, 'w') as f:
+            f.write(self.prometheus_text())
+        os.replace(temp_path, path)
+        return path
+
+    def log_summary(self, logger=logging):
+        phases = ', '.join(f"{phase} {stats['seconds']:.2f}s" for phase, stats in self.phases.items())
+        backends = ', '.join(f"{backend} {stats['requests']} requests/{stats['bytes']} bytes"
+                             for backend, stats in self.backends.items())
+        logger.info(f"Sync metrics for '{self.playlist_name}': {phases}; {backends}")
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+@contextmanager
+def instrumented_session(session, metrics, backend):
+    """Count the requests, response bytes and latency of a requests session while the block runs."""
+    def record(response, *args, **kwargs):
+        metrics.record_request(backend, len(response.content or b''), response.elapsed.total_seconds())
+
+    session.hooks['response'].append(record)
+    try:
+        yield session
+    finally:
+        session.hooks['response'].remove(record)
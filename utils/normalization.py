@@ -18,3 +18,10 @@ def normalize_name(name):
     # Remove extra whitespace
     name = re.sub(r'\s+', ' ', name).strip()
     return name
+
+def titles_overlap(normalized_a, normalized_b):
+    """
+    Whether one normalized title contains the other, e.g. a title and its "- Remastered"
+    variant. A title that normalized to nothing overlaps with every title.
+    """
+    return normalized_a in normalized_b or normalized_b in normalized_a
@@ -0,0 +1,50 @@
+import logging
+import multiprocessing
+import os
+
+# Scorer and jobs of the pool currently running. They are set before the pool
+# starts so that forked workers inherit them copy-on-write; tasks then only
+# carry a job index instead of a pickled track and candidate list.
+_scorer = None
+_jobs = None
+
+def _init_worker(scorer, jobs):
+    """Receive the jobs once per worker on platforms that cannot fork."""
+    global _scorer, _jobs
+    _scorer = scorer
+    _jobs = jobs
+
+def _run_job(idx):
+    spotify_track_info, candidates = _jobs[idx]
+    return _scorer(spotify_track_info, candidates)
+
+def score_in_pool(scorer, jobs, processes=None):
+    """
+    Apply scorer(spotify_track_info, candidates) to every (spotify_track_info, candidates)
+    job and return the results in job order.
+
+    scorer must be a module-level function, or a partial of one, and candidates PlexCandidate lists so the
+    work can be shipped to worker processes. processes defaults to the CPU count;
+    with 0 or 1, or only a handful of jobs, scoring runs inline.
+    """
+    global _scorer, _jobs
+    if processes is None:
+        processes = os.cpu_count() or 1
+    if processes <= 1 or len(jobs) < 2 * processes:
+        return [scorer(spotify_track_info, candidates) for spotify_track_info, candidates in jobs]
+
+    chunksize = max(1, len(jobs) // (processes * 4))
+    if 'fork' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('fork')
+        _scorer, _jobs = scorer, jobs
+        pool_args = {}
+    else:
+        context = multiprocessing.get_context()
+        pool_args = {'initializer': _init_worker, 'initargs': (scorer, jobs)}
+
+    logging.info(f"Scoring {len(jobs)} tracks across {processes} processes...")
+    try:
+        with context.Pool(processes, **pool_args) as pool:
+            return pool.map(_run_job, range(len(jobs)), chunksize=chunksize)
+    finally:
+        _scorer, _jobs = None, None
@@ -0,0 +1,100 @@
+import hashlib
+import logging
+import os
+from pathlib import Path
+from urllib.parse import urlencode
+from plexapi.playlist import Playlist
+
+# Rating keys per addItems/createPlaylist request; the keys travel in the URL
+DEFAULT_CHUNK_SIZE = 200
+
+def chunked(items, size):
+    """Split a list into consecutive lists of at most size items."""
+    size = max(1, size)
+    return [items[start:start + size] for start in range(0, len(items), size)]
+
+def content_hash(value):
+    """Short, stable hash of a playlist description or poster URL, to detect changes between syncs."""
+    return hashlib.sha256((value or '').encode('utf-8')).hexdigest()[:16]
+
+def create_playlist_chunked(plex, name, items, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Create a playlist from the first chunk of items and append the rest chunk by chunk."""
+    chunks = chunked(items, chunk_size)
+    playlist = plex.createPlaylist(name, items=chunks[0] if chunks else [])
+    add_items_chunked(playlist, [item for chunk in chunks[1:] for item in chunk], chunk_size)
+    return playlist
+
+def add_items_chunked(playlist, items, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Append items to a playlist in chunks. The chunks go out one after the other, since
+    concurrent appends to the same playlist would land in arbitrary order.
+    """
+    for chunk in chunked(items, chunk_size):
+        playlist.addItems(chunk)
+
+def items_uri(plex, rating_keys):
+    """The library URI of tracks by rating key, as playlist requests take them."""
+    keys = ','.join(str(rating_key) for rating_key in rating_keys)
+    return f"server://{plex.machineIdentifier}/com.plexapp.plugins.library/library/metadata/{keys}"
+
+def create_playlist_from_keys(plex, name, rating_keys, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Create an audio playlist straight from rating keys, without plexapi objects for the
+    tracks. Keys beyond the first chunk are appended with add_keys_chunked.
+    """
+    chunks = chunked(rating_keys, chunk_size)
+    key = f"/playlists?{urlencode({'type': 'audio', 'title': name, 'smart': 0, 'uri': items_uri(plex, chunks[0] if chunks else [])})}"
+    data = plex.query(key, method=plex._session.post)
+    playlist = Playlist(plex, data[0], initpath=key)
+    add_keys_chunked(plex, playlist, [rating_key for chunk in chunks[1:] for rating_key in chunk], chunk_size)
+    return playlist
+
+def add_keys_chunked(plex, playlist, rating_keys, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Append tracks to a playlist by rating key, one chunk after the other like add_items_chunked."""
+    for chunk in chunked(rating_keys, chunk_size):
+        plex.query(f"/playlists/{playlist.ratingKey}/items?{urlencode({'uri': items_uri(plex, chunk)})}",
+                   method=plex._session.put)
+
+def write_m3u(path, entries):
+    """Write an extended M3U8 playlist of (file path, duration ms, artist, title) entries."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.with_name(path.name + '.tmp')
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        f.write('#EXTM3U\n')
+        for file, duration, artist, title in entries:
+            f.write(f"#EXTINF:{(duration or 0) // 1000},{artist or ''} - {title or ''}\n{file}\n")
+    os.replace(temp_path, path)
+
+def import_m3u_playlist(plex, name, section, m3u_path, server_path=None):
+    """
+    Have Plex import the M3U8 file at m3u_path into a music playlist called name, in one
+    request. The server reads the file itself, at server_path when it sees the file
+    under a different path than this machine.
+    """
+    playlist = plex.createPlaylist(name, section=section, m3ufilepath=str(server_path or m3u_path))
+    logging.info(f"Plex imported playlist '{name}' from {server_path or m3u_path}.")
+    return playlist
+
+def clear_playlist(plex, playlist):
+    """Remove every item of a playlist in one request, where plexapi would delete them one by one."""
+    plex.query(f"/playlists/{playlist.ratingKey}/items", method=plex._session.delete)
+
+def remove_items_concurrently(playlist, items, executor, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Remove playlist items, one chunk per task on the executor. plexapi deletes playlist
+    items one request at a time, so the chunks run in parallel; order doesn't matter here.
+    Returns the futures.
+    """
+    return [executor.submit(playlist.removeItems, chunk) for chunk in chunked(items, chunk_size)]
+
+def wait_for_writes(futures, description):
+    """Wait for write futures and log, rather than raise, the ones that failed; return whether all succeeded."""
+    succeeded = True
+    for future in futures:
+        try:
+            future.result()
+        except Exception as e:
+            logging.error(f"Error during {description}: {e}")
+            succeeded = False
+    return succeeded
@@ -0,0 +1,69 @@
+import logging
+from urllib.parse import urlencode
+from fuzzywuzzy import fuzz
+from helper_classes.candidate import PlexCandidate
+from .library_index import find_music_section
+
+# Results asked for per search; playlist tracks rarely have more plausible namesakes
+DEFAULT_MAX_RESULTS = 50
+
+# Plex search type of tracks
+TRACK_TYPE = 10
+
+# Parts of track elements matching doesn't need, left out of the response
+EXCLUDED_ELEMENTS = 'Genre,Mood,Collection,Field,Image,Guid,UltraBlurColors'
+EXCLUDED_FIELDS = 'summary,thumb,art,parentThumb,grandparentThumb,grandparentArt,grandparentTheme'
+
+class SectionSearch:
+    """
+    Track searches scoped to the music section, with the artist filter applied by the
+    server, a capped result count and trimmed response elements. Results come back as
+    PlexCandidates parsed straight from the response.
+    """
+
+    def __init__(self, plex, section_key=None, max_results=DEFAULT_MAX_RESULTS):
+        self.plex = plex
+        if section_key is None:
+            section = find_music_section(plex)
+            logging.info(f"Searching Plex music section '{section.title}' ({section.key}).")
+            section_key = section.key
+        self.section_key = str(section_key)
+        self.max_results = max_results
+
+    @classmethod
+    def for_section(cls, plex, section=None, max_results=DEFAULT_MAX_RESULTS):
+        """Search the music section given by ID or title, or the first music section when None."""
+        if section is not None and not str(section).isdigit():
+            section = plex.library.section(section).key
+        return cls(plex, section, max_results)
+
+    def search(self, title, artist=None):
+        """Return up to max_results PlexCandidates whose title, and artist when given, contain the arguments."""
+        params = {'type': TRACK_TYPE, 'title': title, 'excludeElements': EXCLUDED_ELEMENTS,
+                  'excludeFields': EXCLUDED_FIELDS}
+        if artist:
+            params['artist.title'] = artist
+        headers = {'X-Plex-Container-Start': '0', 'X-Plex-Container-Size': str(self.max_results)}
+        data = self.plex.query(f'/library/sections/{self.section_key}/all?{urlencode(params)}', headers=headers)
+        return [self._candidate(element) for element in data if element.tag == 'Track'][:self.max_results]
+
+    def candidates_for(self, spotify_track_info):
+        """
+        Tracks named like the Spotify track by its artist. When the server-side artist
+        filter finds nothing, e.g. for artists spelled differently, the search is repeated
+        without it and artists are compared fuzzily, like the library-wide search.
+        """
+        candidates = self.search(spotify_track_info.name, spotify_track_info.artist)
+        if candidates:
+            return candidates
+        return [candidate for candidate in self.search(spotify_track_info.name)
+                if fuzz.ratio(candidate.artist or '', spotify_track_info.artist) > 80]
+
+    @staticmethod
+    def _candidate(element):
+        part = element.find('Media/Part')
+        duration = element.attrib.get('duration')
+        return PlexCandidate.create(int(element.attrib['ratingKey']), element.attrib.get('title'),
+                                    element.attrib.get('grandparentTitle'), element.attrib.get('parentTitle'),
+                                    int(duration) if duration else None,
+                                    part.attrib.get('file') if part is not None else None, element.attrib.get('guid'))
@@ -0,0 +1,59 @@
+import hashlib
+import io
+import logging
+import threading
+from collections import OrderedDict
+import requests
+
+class PosterCache:
+    """
+    Poster images downloaded once per process, keyed by URL, with the hash of their
+    content. Syncing the same playlist for several users or servers then fetches the
+    cover from Spotify once and uploads the same bytes everywhere.
+    """
+
+    def __init__(self, max_images=64, timeout=30):
+        self.max_images = max_images
+        self.timeout = timeout
+        self._images = OrderedDict()
+        self._lock = threading.Lock()
+
+    def fetch(self, url):
+        """Return (image bytes, content hash) for the poster URL, downloading it on first use."""
+        with self._lock:
+            if url in self._images:
+                self._images.move_to_end(url)
+                return self._images[url]
+        response = requests.get(url, timeout=self.timeout)
+        response.raise_for_status()
+        image = (response.content, hashlib.sha256(response.content).hexdigest())
+        with self._lock:
+            self._images[url] = image
+            while len(self._images) > self.max_images:
+                self._images.popitem(last=False)
+        return image
+
+def upload_poster_if_changed(plex_playlist, url, last_upload, cache, force=False):
+    """
+    Upload the poster at url to a Plex playlist unless the record of its last upload,
+    {'url', 'content_hash'}, shows the same image. Returns the record to keep.
+
+    An unchanged URL is trusted without downloading; a new URL is downloaded and only
+    uploaded when its content differs. When the download fails, Plex is handed the URL.
+    """
+    last_upload = last_upload or {}
+    if not force and last_upload.get('url') == url:
+        return last_upload
+    try:
+        data, content_hash = cache.fetch(url)
+    except requests.RequestException as e:
+        logging.warning(f"Could not download poster {url}, letting Plex fetch it: {e}")
+        plex_playlist.uploadPoster(url=url)
+        return {'url': url, 'content_hash': None}
+    if not force and last_upload.get('content_hash') == content_hash:
+        logging.info(f"Poster for '{plex_playlist.title}' is unchanged, skipping the upload.")
+    else:
+        plex_playlist.uploadPoster(filepath=io.BytesIO(data))
+    return {'url': url, 'content_hash': content_hash}
+
+DEFAULT_POSTER_CACHE = PosterCache()
@@ -0,0 +1,87 @@
+import cProfile
+import logging
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+
+class SyncProfiler:
+    """
+    Profile selected sections of a run, e.g. each playlist sync, and write the results
+    into the run's log directory:
+
+    - <name>.pstats: cProfile statistics, readable with pstats, snakeviz or gprof2dot
+    - <name>.txt: the top functions by cumulative time
+    - <name>.folded: sampled stacks in collapsed format for flamegraph.pl or speedscope,
+      only when a sample interval is given
+    """
+
+    def __init__(self, log_directory, name, sample_interval=None):
+        self.log_directory = Path(log_directory)
+        self.name = name
+        self.sample_interval = sample_interval
+        self.profile = cProfile.Profile()
+        self.stacks = Counter()
+        self._sampling = threading.Event()
+
+    @contextmanager
+    def section(self):
+        """Profile the block; sections may be entered repeatedly and accumulate."""
+        sampler = None
+        if self.sample_interval:
+            self._sampling.set()
+            sampler = threading.Thread(target=self._sample, args=(threading.get_ident(),), daemon=True)
+            sampler.start()
+        self.profile.enable()
+        try:
+            yield
+        finally:
+            self.profile.disable()
+            if sampler:
+                self._sampling.clear()
+                sampler.join()
+
+    def _sample(self, thread_id):
+        while self._sampling.is_set():
+            frame = sys._current_frames().get(thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+            time.sleep(self.sample_interval)
+
+    def write(self):
+        """Write the collected profile files and return their paths."""
+        self.log_directory.mkdir(parents=True, exist_ok=True)
+        stats_path = self.log_directory / f'{self.name}.pstats'
+        self.profile.dump_stats(stats_path)
+        paths = [stats_path]
+
+        report_path = self.log_directory / f'{self.name}.txt'
+        with open(report_path, 'w') as f:
+            stats = pstats.Stats(self.profile, stream=f)
+            stats.sort_stats('cumulative').print_stats(50)
+        paths.append(report_path)
+
+        if self.stacks:
+            folded_path = self.log_directory / f'{self.name}.folded'
+            with open(folded_path, 'w') as f:
+                for stack, count in self.stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+            paths.append(folded_path)
+
+        logging.info(f"Profile written to {', '.join(str(path) for path in paths)}")
+        return paths
+
+def add_profile_arguments(parser):
+    """Add the --profile options shared by the entry points to an ArgumentParser."""
+    parser.add_argument('--profile', action='store_true',
+                        help="Profile the sync loop and write the results to the log directory")
+    parser.add_argument('--profile-sample-interval', type=float, default=None, metavar='SECONDS',
+                        help="With --profile, also sample stacks at this interval for a flame graph")
@@ -1,6 +1,9 @@
 from fuzzywuzzy import fuzz
 from .normalization import normalize_name
 
+# Highest score calculate_name_similarity can return (its weights sum to 1.1)
+MAX_NAME_SIMILARITY = 110
+
 def calculate_similarity(plex_track, spotify_track, spotify_artist, spotify_album):
     """Calculate similarity score based on artist, album, and track names."""
     plex_artist = normalize_name(plex_track.artist().title)
@@ -11,6 +14,10 @@ def calculate_similarity(plex_track, spotify_track, spotify_artist, spotify_albu
     spotify_album = normalize_name(spotify_album)
     spotify_title = normalize_name(spotify_track)
 
+    return calculate_name_similarity(plex_title, plex_artist, plex_album, spotify_title, spotify_artist, spotify_album)
+
+def calculate_name_similarity(plex_title, plex_artist, plex_album, spotify_title, spotify_artist, spotify_album):
+    """Calculate similarity score from already normalized artist, album, and track names."""
     artist_similarity = fuzz.token_sort_ratio(plex_artist, spotify_artist)
     album_similarity = fuzz.token_sort_ratio(plex_album, spotify_album)
     track_similarity = fuzz.token_sort_ratio(plex_title, spotify_title)
@@ -5,9 +5,27 @@ import logging
 from pathlib import Path
 from plexapi.server import PlexServer
 from helper_classes.playlist import Playlist
+from helper_classes.track import Track, format_duration
 from helper_classes.user_inputs import UserInputs
+from helper_classes.sync_options import SyncOptions
+from helper_classes.candidate import PlexCandidate, as_candidate, rating_key_of
+from utils.matching import find_fuzzy_match, find_fuzzy_match_key
+from utils.parallel import score_in_pool
+from utils.library_index import LibraryIndex, DEFAULT_DURATION_WINDOW_MS, find_music_section
+from utils.artist_resolver import ArtistResolver
+from utils.album_resolver import AlbumResolver
+from utils.plex_search import SectionSearch
+from utils.metrics import SyncMetrics, instrumented_session
+from utils.sync_state import SyncState, diff_playlist_items, merge_synced_entries, playlist_keys
+from utils.match_store import MatchStore
+from utils.checkpoint import SyncCheckpoint
+from utils.poster_cache import DEFAULT_POSTER_CACHE, upload_poster_if_changed
+from utils.plex_playlist import (add_items_chunked, add_keys_chunked, chunked, clear_playlist, content_hash,
+                                 create_playlist_chunked, create_playlist_from_keys, import_m3u_playlist,
+                                 remove_items_concurrently, wait_for_writes, write_m3u)
 from spotipy import Spotify
 from spotipy.oauth2 import SpotifyClientCredentials
+from spotipy.cache_handler import MemoryCacheHandler
 import json
 from datetime import datetime
 from PyQt5.QtWidgets import QApplication, QDialog, QVBoxLayout, QLabel, QRadioButton, QPushButton, QButtonGroup, QHBoxLayout, QDesktopWidget, QTextBrowser
@@ -15,7 +33,12 @@ from PyQt5.QtGui import QPixmap, QFont, QPalette, QColor
 from PyQt5.QtCore import Qt, QUrl
 from PyQt5.QtMultimedia import QMediaPlayer, QMediaContent
 import sys
+import time
 import concurrent.futures
+import hashlib
+import threading
+from collections import Counter
+from functools import partial
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -51,15 +74,15 @@ class TrackSelectionDialog(QDialog):
         cover_layout = QHBoxLayout()
         spotify_info = (
             f"Spotify Track Info:\n"
-            f"Artist: {', '.join(self.spotify_track_info['artists'])}\n"
-            f"Album: {self.spotify_track_info['album']}\n"
-            f"Track: {self.spotify_track_info['name']}\n"
-            f"Duration: {self.spotify_track_info['duration']}"
+            f"Artist: {', '.join(self.spotify_track_info.artists)}\n"
+            f"Album: {self.spotify_track_info.album}\n"
+            f"Track: {self.spotify_track_info.name}\n"
+            f"Duration: {self.spotify_track_info.duration}"
         )
         spotify_label = QLabel(spotify_info)
         cover_layout.addWidget(spotify_label)
 
-        cover_url = self.spotify_track_info.get('cover_url')
+        cover_url = self.spotify_track_info.cover_url
         if cover_url:
             cover_image = self.fetch_cover_image(cover_url)
             cover_label = QLabel()
@@ -69,7 +92,7 @@ class TrackSelectionDialog(QDialog):
         layout.addLayout(cover_layout)
 
         # Play Preview Button
-        preview_url = self.spotify_track_info.get('preview_url')
+        preview_url = self.spotify_track_info.preview_url
         if preview_url:
             preview_layout = QHBoxLayout()
             play_button = QPushButton("Play Preview")
@@ -87,11 +110,12 @@ class TrackSelectionDialog(QDialog):
         self.button_group = QButtonGroup(self)
 
         for idx, track in enumerate(self.similar_tracks):
+            candidate = as_candidate(track)
             track_info = (
-                f"Artist: {track.artist().title}, "
-                f"Album: {track.album().title}, "
-                f"Track: {track.title}, "
-                f"Duration: {format_duration(track.duration if hasattr(track, 'duration') else 0)}"
+                f"Artist: {candidate.artist}, "
+                f"Album: {candidate.album}, "
+                f"Track: {candidate.title}, "
+                f"Duration: {format_duration(candidate.duration or 0)}"
             )
             radio_button = QRadioButton(track_info)
             self.button_group.addButton(radio_button, id=idx)
@@ -160,16 +184,6 @@ class TrackSelectionDialog(QDialog):
 
 # Utility Functions
 
-def format_duration(ms):
-    """Convert milliseconds to hh:mm:ss or mm:ss format."""
-    seconds = int((ms / 1000) % 60)
-    minutes = int((ms / (1000 * 60)) % 60)
-    hours = int((ms / (1000 * 60 * 60)) % 24)
-    if hours > 0:
-        return f"{hours:02}:{minutes:02}:{seconds:02}"
-    else:
-        return f"{minutes:02}:{seconds:02}"
-
 def fetch_playlist_tracks(sp, playlist_id):
     """Fetch all tracks from a Spotify playlist, handling pagination."""
     tracks = []
@@ -183,52 +197,99 @@ def fetch_playlist_tracks(sp, playlist_id):
         offset += limit
     return tracks
 
-def fetch_playlist_info(spotify_client_id, spotify_client_secret, spotify_playlist_id):
-    """Fetch playlist information from Spotify."""
-    client_credentials_manager = SpotifyClientCredentials(client_id=spotify_client_id, client_secret=spotify_client_secret)
+def fetch_playlist_item_refs(sp, playlist_id):
+    """Fetch only the (track id, added_at) pair of every playlist item, in playlist order."""
+    refs = []
+    offset = 0
+    limit = 100
+    while True:
+        results = sp.playlist_items(playlist_id, fields='items(added_at,track(id)),next', offset=offset, limit=limit,
+                                    additional_types=('track',))
+        refs.extend(((item.get('track') or {}).get('id'), item.get('added_at')) for item in results['items'])
+        if results['next'] is None:
+            break
+        offset += limit
+    return refs
+
+def fetch_items_by_ref(sp, refs):
+    """Build playlist items for (track id, added_at) pairs, fetching the tracks 50 per request."""
+    items = []
+    for start in range(0, len(refs), 50):
+        batch = refs[start:start + 50]
+        tracks = sp.tracks([track_id for track_id, _ in batch])['tracks']
+        items.extend({'added_at': added_at, 'track': track} for (_, added_at), track in zip(batch, tracks))
+    return items
+
+def create_spotify_client(spotify_client_id, spotify_client_secret, api_url=None, auth_url=None):
+    """
+    Create a Spotify client using client credentials.
+
+    api_url and auth_url point the client at a stand-in Web API and token endpoint,
+    e.g. the fake server used by the benchmarks.
+    """
+    # Tokens are kept in memory; spotipy's default cache file would land in the working directory
+    client_credentials_manager = SpotifyClientCredentials(client_id=spotify_client_id, client_secret=spotify_client_secret,
+                                                          cache_handler=MemoryCacheHandler())
+    if auth_url:
+        client_credentials_manager.OAUTH_TOKEN_URL = auth_url
     sp = Spotify(client_credentials_manager=client_credentials_manager)
-    playlist = sp.playlist(spotify_playlist_id)
+    if api_url:
+        sp.prefix = api_url.rstrip('/') + '/'
+    return sp
+
+def fetch_playlist_info(spotify_client_id, spotify_client_secret, spotify_playlist_id, api_url=None, auth_url=None):
+    """Fetch playlist information from Spotify."""
+    sp = create_spotify_client(spotify_client_id, spotify_client_secret, api_url, auth_url)
+    return read_playlist_info(sp, spotify_playlist_id)
+
+def read_playlist_info(sp, spotify_playlist_id):
+    """Fetch playlist information with an existing Spotify client."""
+    playlist = sp.playlist(spotify_playlist_id, fields='name,description,images,snapshot_id')
     name = playlist['name']
     description = playlist['description']
     poster = playlist['images'][0]['url'] if playlist['images'] else ""
-    return {'name': name, 'description': description, 'poster': poster}
+    return {'name': name, 'description': description, 'poster': poster, 'snapshot_id': playlist.get('snapshot_id')}
 
-def load_matched_tracks(storage_file):
-    """Load matched tracks from the storage file."""
-    if Path(storage_file).exists():
-        with open(storage_file, 'r') as f:
-            return json.load(f)
-    return {}
-
-def save_matched_tracks(storage_file, matched_tracks):
-    """Save matched tracks to the storage file."""
-    with open(storage_file, 'w') as f:
-        json.dump(matched_tracks, f, indent=4)
+def fetch_playlist_snapshot_id(sp, spotify_playlist_id):
+    """Fetch only the playlist's snapshot_id, which changes whenever its tracks change."""
+    return sp.playlist(spotify_playlist_id, fields='snapshot_id')['snapshot_id']
 
 def fuzzy_match(spotify_track_info, plex_tracks, threshold=80):
     """Perform fuzzy matching of track names, artists, and albums."""
-    best_match = None
-    highest_score = 0
+    best_match = find_fuzzy_match(spotify_track_info, plex_tracks, threshold)
 
-    for plex_track in plex_tracks:
-        track_name_ratio = fuzz.ratio(spotify_track_info['name'], plex_track.title)
-        artist_name_ratio = fuzz.ratio(spotify_track_info['artists'][0], plex_track.artist().title)
-        album_name_ratio = fuzz.ratio(spotify_track_info['album'], plex_track.album().title)
-        
-        combined_score = (track_name_ratio + artist_name_ratio + album_name_ratio) / 3
-        
-        if combined_score > highest_score and combined_score > threshold:
-            highest_score = combined_score
-            best_match = plex_track
-    
     if not best_match and plex_tracks:
-        app = QApplication.instance() if QApplication.instance() else QApplication(sys.argv)
-        dialog = TrackSelectionDialog(spotify_track_info, plex_tracks)
-        if dialog.exec_() == QDialog.Accepted:
-            best_match = dialog.get_selected_track()
+        best_match = select_track_manually(spotify_track_info, plex_tracks)
 
     return best_match
 
+def select_track_manually(spotify_track_info, plex_tracks):
+    """Ask the user to pick the matching Plex track; return None if the dialog is dismissed."""
+    app = QApplication.instance() if QApplication.instance() else QApplication(sys.argv)
+    dialog = TrackSelectionDialog(spotify_track_info, plex_tracks)
+    if dialog.exec_() == QDialog.Accepted:
+        return dialog.get_selected_track()
+    return None
+
+def score_pending_tracks(pending, options):
+    """
+    Find the automatic fuzzy match for every (spotify_track_info, plex_tracks) pair,
+    spreading the scoring over a process pool when options.processes asks for one.
+    """
+    if options.processes <= 1:
+        return [find_fuzzy_match(spotify_track_info, plex_tracks, certain_score=options.certain_score)
+                for spotify_track_info, plex_tracks in pending]
+
+    jobs = [(spotify_track_info, [as_candidate(track) for track in plex_tracks])
+            for spotify_track_info, plex_tracks in pending]
+    best_keys = score_in_pool(partial(find_fuzzy_match_key, certain_score=options.certain_score), jobs,
+                              options.processes)
+    best_matches = []
+    for (_, candidates), (_, plex_tracks), best_key in zip(jobs, pending, best_keys):
+        by_key = {candidate.rating_key: track for candidate, track in zip(candidates, plex_tracks)}
+        best_matches.append(by_key.get(best_key))
+    return best_matches
+
 def fetch_item_with_timeout(plex, rating_key, timeout=10):
     """Fetch Plex item with a timeout to avoid indefinite hangs."""
     with concurrent.futures.ThreadPoolExecutor() as executor:
@@ -252,135 +313,412 @@ def get_auth_token(user):
             return token
     return None
 
-def sync_spotify_playlist_with_plex(plex: PlexServer, playlist: Playlist, userInputs: UserInputs, spotify_playlist_id: str, output_dir: Path):
+def plex_track_report(track):
+    """The combined report's fields of a matched track; a PlexCandidate lacks the media details."""
+    if isinstance(track, PlexCandidate):
+        return {'title': track.title, 'artist': track.artist, 'album': track.album,
+                'duration': format_duration(track.duration or 0), 'audio_channels': None, 'location': track.file,
+                'disc_number': None, 'track_number': None}
+    part = track.media[0].parts[0] if getattr(track, 'media', None) and track.media[0].parts else None
+    return {
+        'title': track.title,
+        'artist': track.grandparentTitle,
+        'album': track.parentTitle,
+        'duration': format_duration(track.duration if hasattr(track, 'duration') else 0),
+        'audio_channels': track.media[0].audioChannels if getattr(track, 'media', None) else None,
+        'location': part.file if part is not None else None,
+        'disc_number': getattr(part, 'disc', None) if part is not None else None,
+        'track_number': track.index if hasattr(track, 'index') else None
+    }
+
+def track_log_fields(spotify_track_info, outcome, rating_key=None, candidates=None):
+    """Compact per-track fields for structured log records."""
+    fields = {'track_id': spotify_track_info.id, 'outcome': outcome, 'rating_key': rating_key}
+    if candidates is not None:
+        fields['candidates'] = candidates
+    return fields
+
+def sync_spotify_playlist_with_plex(plex: PlexServer, playlist: Playlist, userInputs: UserInputs, spotify_playlist_id: str, output_dir: Path, options: SyncOptions = None, library_index: LibraryIndex = None, sp: Spotify = None, abort: threading.Event = None):
+    """
+    Sync the Spotify playlist to the Plex playlist of the same name and return the sync's
+    metrics. Once abort is set the sync checkpoints its progress and returns without
+    writing the playlist.
+    """
+    options = options or SyncOptions()
+    metrics = SyncMetrics(spotify_playlist_id, playlist.name, SyncState.target_id(plex))
     logging.info(f"Starting sync for playlist ID: {spotify_playlist_id}")
-    client_credentials_manager = SpotifyClientCredentials(client_id=userInputs.spotify_client_id, client_secret=userInputs.spotify_client_secret)
-    sp = Spotify(client_credentials_manager=client_credentials_manager)
-    spotify_tracks = fetch_playlist_tracks(sp, spotify_playlist_id)
+    sp = sp or create_spotify_client(userInputs.spotify_client_id, userInputs.spotify_client_secret,
+                                     userInputs.spotify_api_url, userInputs.spotify_auth_url)
+    with instrumented_session(sp._session, metrics, 'spotify'), instrumented_session(plex._session, metrics, 'plex'):
+        _sync_playlist(plex, sp, playlist, spotify_playlist_id, output_dir, options, library_index, metrics, abort)
+    return metrics
+
+def find_plex_playlist(plex, name):
+    """Return the Plex playlist with the given title, or None."""
+    try:
+        existing_playlist = plex.playlist(name)
+        logging.info(f"Found existing playlist: {name}")
+        return existing_playlist
+    except Exception as e:
+        logging.info(f"No existing playlist found, creating a new one: {name}. Exception: {e}")
+        return None
+
+def _sync_playlist(plex, sp, playlist, spotify_playlist_id, output_dir, options, library_index, metrics, abort=None):
+    sync_state = SyncState(options.sync_state_file)
+    target = SyncState.target_id(plex)
+    last_sync = sync_state.get(target, spotify_playlist_id) or {}
+    synced = last_sync if options.delta_sync and 'items' in last_sync else None
+
+    with metrics.phase('playlist_write'):
+        logging.info(f"Creating or updating Plex playlist: {playlist.name}")
+        existing_playlist = find_plex_playlist(plex, playlist.name)
+    if existing_playlist is None:
+        synced = None
+
+    # Outside the plexapi items write, matches are kept as PlexCandidates and cached ones are never fetched
+    keys_only = options.playlist_write != 'items'
+    match_store = MatchStore(options.match_storage_file)
+    with metrics.phase('match_store'):
+        matched_track_ids = match_store.matches_for(plex, library_index)
+
+    with metrics.phase('spotify_fetch'):
+        if synced is not None:
+            refs = fetch_playlist_item_refs(sp, spotify_playlist_id)
+            new_positions, kept_entries, removed_entries = diff_playlist_items(synced['items'], refs, matched_track_ids)
+            if any(refs[position][0] is None for position in new_positions):
+                # Local files have no track id to fetch them by
+                logging.info(f"New local files in '{playlist.name}', running a full sync.")
+                synced = None
+            else:
+                logging.info(f"Delta sync of '{playlist.name}': {len(new_positions)} new or unmatched and "
+                             f"{len(removed_entries)} removed or unmatched items.")
+                metrics.count('delta_new', len(new_positions))
+                metrics.count('delta_removed', len(removed_entries))
+                spotify_tracks = fetch_items_by_ref(sp, [refs[position] for position in new_positions])
+        if synced is None:
+            spotify_tracks = fetch_playlist_tracks(sp, spotify_playlist_id)
     matched_tracks = []
-    matched_plex_tracks = []
     unmatched_tracks = []
     total_tracks = len(spotify_tracks)
+    # Plex track per playlist position, so cached and newly scored matches keep playlist order
+    resolved_plex_tracks = [None] * total_tracks
+    pending = []
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     playlist_output_dir = output_dir / f"{playlist.name}_{timestamp}"
     playlist_output_dir.mkdir(parents=True, exist_ok=True)
 
-    matched_track_ids = load_matched_tracks(MATCH_STORAGE_FILE)
+    checkpoint = SyncCheckpoint.for_playlist(options.checkpoint_dir, target, spotify_playlist_id,
+                                             [(item.get('track') or {}).get('id') for item in spotify_tracks],
+                                             options.resume, options.checkpoint_every, options.checkpoint_interval_seconds)
+
+    def save_checkpoint():
+        # Matches go to the match store first, so a checkpoint never refers to matches that weren't kept
+        match_store.save()
+        checkpoint.save()
+
+    def aborted():
+        # Checked between tracks and right before the playlist write
+        if abort is None or not abort.is_set():
+            return False
+        logging.warning(f"Sync of '{playlist.name}' aborted, keeping its progress and leaving the Plex playlist as it is.")
+        save_checkpoint()
+        return True
 
     app = None
-    if QApplication.instance() is None:
-        app = QApplication(sys.argv)
-    else:
-        app = QApplication.instance()
+    if options.interactive:
+        app = QApplication.instance() or QApplication(sys.argv)
+
+    processed_track_infos = []
+    artist_resolver = ArtistResolver(plex) if options.resolve_artists and library_index is None else None
+    album_resolver = AlbumResolver(plex) if options.resolve_albums else None
+    section_search = None
+    if options.scoped_search and library_index is None:
+        try:
+            section_search = SectionSearch.for_section(plex, options.music_section, options.search_max_results)
+        except Exception as e:
+            logging.error(f"Error finding the Plex music section, searching the whole library: {e}")
+    # Only albums the playlist holds several tracks of are worth resolving as a whole
+    album_counts = Counter(((item.get('track') or {}).get('album') or {}).get('id') for item in spotify_tracks)
+    # Matches found without scoring: by ISRC, or aligned by album position
+    direct_matches = {}
 
     for idx, item in enumerate(spotify_tracks):
+        if aborted():
+            return
+        track_start = time.perf_counter()
         track = item['track']
-        spotify_track_info = {
-            'name': track['name'],
-            'artists': [artist['name'] for artist in track['artists']],
-            'album': track['album']['name'],
-            'preview_url': track.get('preview_url'),
-            'explicit': track.get('explicit'),
-            'type': track.get('type'),
-            'episode': track.get('episode'),
-            'track': track.get('track'),
-            'disc_number': track.get('disc_number'),
-            'track_number': track.get('track_number'),
-            'duration': format_duration(track.get('duration_ms', 0)),
-            'duration_ms': track.get('duration_ms', 0),
-            'external_ids': track.get('external_ids'),
-            'external_urls': track.get('external_urls'),
-            'href': track.get('href'),
-            'id': track.get('id'),
-            'popularity': track.get('popularity'),
-            'uri': track.get('uri'),
-            'is_local': track.get('is_local'),
-            'cover_url': track['album']['images'][0]['url'] if track['album']['images'] else None
-        }
-        logging.info(f"{idx + 1}/{total_tracks} Matching Spotify track '{spotify_track_info['name']}'...")
-
-        if spotify_track_info['id'] in matched_track_ids:
-            matched_key = matched_track_ids[spotify_track_info['id']]
-            logging.info(f"Fetching previously matched track with key {matched_key}...")
-            try:
-                matched_track = plex.fetchItem(matched_key)
-            except Exception as e:
-                logging.error(f"Error fetching previously matched track with key {matched_key}: {e}")
-                matched_track = None
+        spotify_track_info = Track.from_spotify(track, item.get('added_at'))
+        processed_track_infos.append(spotify_track_info)
+        logging.debug("%d/%d Matching Spotify track '%s'...", idx + 1, total_tracks, spotify_track_info.name)
+
+        if spotify_track_info.id in matched_track_ids:
+            matched_key = matched_track_ids[spotify_track_info.id]
+            if keys_only:
+                # The key is all the write needs; the index, when there is one, tells whether it still exists
+                if library_index is not None:
+                    matched_track = library_index.get(matched_key)
+                else:
+                    matched_track = PlexCandidate.create(matched_key, None, None, None)
+            else:
+                logging.debug("Fetching previously matched track with key %s...", matched_key)
+                with metrics.phase('cached_fetch'):
+                    try:
+                        matched_track = plex.fetchItem(matched_key)
+                    except Exception as e:
+                        logging.error(f"Error fetching previously matched track with key {matched_key}: {e}")
+                        matched_track = None
 
             if matched_track:
-                logging.info(f"Found previously matched track for '{spotify_track_info['name']}' by '{spotify_track_info['artists'][0]}'.")
-                matched_plex_tracks.append(matched_track)
+                logging.info(f"{idx + 1}/{total_tracks} Found previously matched track for '{spotify_track_info.name}' by '{spotify_track_info.artist}'.",
+                             extra=track_log_fields(spotify_track_info, 'cached', matched_key))
+                resolved_plex_tracks[idx] = matched_track
+                metrics.count('cached')
+                metrics.observe('track_lookup', time.perf_counter() - track_start)
                 continue
             else:
-                logging.error(f"Failed to fetch previously matched track for '{spotify_track_info['name']}' by '{spotify_track_info['artists'][0]}'.")
-
-        logging.info(f"Searching Plex tracks for '{spotify_track_info['name']}' by '{spotify_track_info['artists'][0]}'...")
-        plex_tracks = plex.library.search(title=spotify_track_info['name'], libtype='track')
-        filtered_plex_tracks = [track for track in plex_tracks if fuzz.ratio(track.artist().title, spotify_track_info['artists'][0]) > 80]
-
-        logging.info(f"Found {len(filtered_plex_tracks)} potential matches for '{spotify_track_info['name']}'.")
-
-        matched_track = fuzzy_match(spotify_track_info, filtered_plex_tracks)
-        if not matched_track and filtered_plex_tracks:
-            dialog = TrackSelectionDialog(spotify_track_info, filtered_plex_tracks)
-            if dialog.exec_() == QDialog.Accepted:
-                matched_track = dialog.get_selected_track()
+                logging.error(f"Failed to fetch previously matched track for '{spotify_track_info.name}' by '{spotify_track_info.artist}'.")
+
+        if idx in checkpoint.outcomes and checkpoint.outcomes[idx] is None:
+            # Left unmatched by the interrupted run; neither search nor ask again
+            direct_matches[idx] = None
+            pending.append((idx, spotify_track_info, []))
+            metrics.count('resumed')
+            continue
+        if idx in checkpoint.lookups:
+            direct, filtered_plex_tracks = checkpoint.lookups[idx]
+            if direct:
+                direct_matches[idx] = filtered_plex_tracks[0]
+            pending.append((idx, spotify_track_info, filtered_plex_tracks))
+            metrics.count('resumed')
+            continue
+
+        filtered_plex_tracks = None
+        isrc_key = library_index.key_for_isrc(spotify_track_info.isrc) if library_index is not None else None
+        if isrc_key is not None and isrc_key in library_index:
+            direct_matches[idx] = library_index.get(isrc_key)
+            filtered_plex_tracks = [direct_matches[idx]]
+            metrics.count('isrc_matched')
+        elif (album_resolver is not None and spotify_track_info.album_id
+                and album_counts[spotify_track_info.album_id] >= options.album_min_tracks):
+            with metrics.phase('album'):
+                try:
+                    aligned_track, filtered_plex_tracks = album_resolver.resolve(spotify_track_info)
+                except Exception as e:
+                    logging.error(f"Error resolving album '{spotify_track_info.album}': {e}")
+                    aligned_track = None
+            if aligned_track is not None:
+                direct_matches[idx] = aligned_track
+                metrics.count('album_aligned')
+                filtered_plex_tracks = [aligned_track]
+            elif not filtered_plex_tracks:
+                filtered_plex_tracks = None
+
+        if filtered_plex_tracks is None:
+            with metrics.phase('search'):
+                if library_index is not None:
+                    duration_window = options.max_duration_diff_ms or DEFAULT_DURATION_WINDOW_MS
+                    filtered_plex_tracks = library_index.candidates_for(spotify_track_info, duration_window)
+                elif artist_resolver is not None:
+                    try:
+                        filtered_plex_tracks = artist_resolver.candidates_for(spotify_track_info)
+                    except Exception as e:
+                        logging.error(f"Error resolving artist '{spotify_track_info.artist}': {e}")
+                if filtered_plex_tracks is None and section_search is not None:
+                    try:
+                        filtered_plex_tracks = section_search.candidates_for(spotify_track_info)
+                    except Exception as e:
+                        logging.error(f"Error searching the music section for '{spotify_track_info.name}': {e}")
+                if filtered_plex_tracks is None:
+                    logging.debug("Searching Plex tracks for '%s' by '%s'...", spotify_track_info.name, spotify_track_info.artist)
+                    plex_tracks = plex.library.search(title=spotify_track_info.name, libtype='track')
+                    filtered_plex_tracks = [track for track in plex_tracks if fuzz.ratio(track.grandparentTitle, spotify_track_info.artist) > 80]
+
+        logging.debug("Found %d potential matches for '%s'.", len(filtered_plex_tracks), spotify_track_info.name)
+        pending.append((idx, spotify_track_info, filtered_plex_tracks))
+        metrics.observe('track_lookup', time.perf_counter() - track_start)
+        checkpoint.record_lookup(idx, filtered_plex_tracks, idx in direct_matches)
+        if checkpoint.due():
+            save_checkpoint()
+
+    with metrics.phase('scoring'):
+        scored_matches = iter(score_pending_tracks(
+            [(info, tracks) for idx, info, tracks in pending if idx not in direct_matches], options))
+        best_matches = [direct_matches[idx] if idx in direct_matches else next(scored_matches)
+                        for idx, _, _ in pending]
+
+    for (idx, spotify_track_info, filtered_plex_tracks), matched_track in zip(pending, best_matches):
+        if aborted():
+            return
+        asked = False
+        if not matched_track and filtered_plex_tracks and options.interactive:
+            with metrics.phase('dialog'):
+                matched_track = select_track_manually(spotify_track_info, filtered_plex_tracks)
+            asked = True
+        if keys_only and matched_track:
+            matched_track = as_candidate(matched_track)
+        elif isinstance(matched_track, PlexCandidate):
+            # Index candidates are plain records; the playlist write needs the Plex object
+            with metrics.phase('fetch_matched'):
+                try:
+                    matched_track = plex.fetchItem(matched_track.rating_key)
+                except Exception as e:
+                    logging.error(f"Error fetching matched track with key {matched_track.rating_key}: {e}")
+                    matched_track = None
         if matched_track:
-            plex_track_info = {
-                'title': matched_track.title,
-                'artist': matched_track.artist().title,
-                'album': matched_track.album().title,
-                'duration': format_duration(matched_track.duration if hasattr(matched_track, 'duration') else 0),
-                'audio_channels': matched_track.media[0].audioChannels if hasattr(matched_track, 'media') and matched_track.media else None,
-                'location': matched_track.media[0].parts[0].file if matched_track.media and matched_track.media[0].parts else None,
-                'disc_number': getattr(matched_track.media[0].parts[0], 'disc', None) if matched_track.media and matched_track.media[0].parts else None,
-                'track_number': matched_track.index if hasattr(matched_track, 'index') else None
-            }
+            with metrics.phase('report'):
+                plex_track_info = plex_track_report(matched_track)
+                if keys_only and options.report_details:
+                    # Media details of candidates are only fetched when the report asks for them
+                    try:
+                        plex_track_info = plex_track_report(plex.fetchItem(matched_track.rating_key))
+                    except Exception as e:
+                        logging.error(f"Error fetching report details of track with key {matched_track.rating_key}: {e}")
+            matched_key = rating_key_of(matched_track)
             matched_tracks.append({
                 'spotify_track': spotify_track_info,
                 'plex_track': plex_track_info
             })
-            matched_plex_tracks.append(matched_track)
-            matched_track_ids[spotify_track_info['id']] = matched_track.ratingKey
-            logging.info(f"Matched '{spotify_track_info['name']}' by {' & '.join(spotify_track_info['artists'])}.")
+            resolved_plex_tracks[idx] = matched_track
+            matched_track_ids[spotify_track_info.id] = matched_key
+            match_store.remember(spotify_track_info.id, plex_track_info['location'], getattr(matched_track, 'guid', None),
+                                 spotify_track_info.isrc)
+            checkpoint.record_outcome(idx, matched_key)
+            metrics.count('matched')
+            logging.info(f"Matched '{spotify_track_info.name}' by {' & '.join(spotify_track_info.artists)}.",
+                         extra=track_log_fields(spotify_track_info, 'matched', matched_key, len(filtered_plex_tracks)))
         else:
             unmatched_tracks.append({
                 'spotify_track': spotify_track_info,
                 'plex_track': None
             })
-            logging.info(f"Could not match '{spotify_track_info['name']}' by {' & '.join(spotify_track_info['artists'])}.")
+            metrics.count('unmatched')
+            logging.info(f"Could not match '{spotify_track_info.name}' by {' & '.join(spotify_track_info.artists)}.",
+                         extra=track_log_fields(spotify_track_info, 'unmatched', None, len(filtered_plex_tracks)))
+            checkpoint.record_outcome(idx, None)
+        # An answered dialog is never worth asking again
+        if asked or checkpoint.due():
+            save_checkpoint()
 
-    save_matched_tracks(MATCH_STORAGE_FILE, matched_track_ids)
+    matched_plex_tracks = [track for track in resolved_plex_tracks if track is not None]
+
+    match_store.save()
+    if aborted():
+        return
 
     combined_tracks_json = {
         'Match': matched_tracks,
         'Unmatched': unmatched_tracks
     }
     with open(playlist_output_dir / f'{playlist.name}_combined.json', 'w') as f:
-        json.dump(combined_tracks_json, f, indent=4)
-    logging.info(f"Creating or updating Plex playlist: {playlist.name}")
-    try:
-        existing_playlist = plex.playlist(playlist.name)
-        logging.info(f"Found existing playlist: {playlist.name}")
-    except Exception as e:
-        existing_playlist = None
-        logging.info(f"No existing playlist found, creating a new one: {playlist.name}. Exception: {e}")
-    if existing_playlist:
-        existing_playlist.removeItems(existing_playlist.items())
-        existing_playlist.addItems(matched_plex_tracks)
-        logging.info(f"Updated existing playlist: {playlist.name}")
-    else:
-        existing_playlist = plex.createPlaylist(playlist.name, items=matched_plex_tracks)
-        logging.info(f"Created new playlist: {playlist.name}")
-
-    logging.info(f"Updating playlist description and poster for: {playlist.name}")
-    if playlist.description:
-        existing_playlist.editSummary(summary=playlist.description)
-    if playlist.poster:
-        existing_playlist.uploadPoster(url=playlist.poster)
+        json.dump(combined_tracks_json, f, indent=4, default=Track.to_dict)
+
+    rating_keys = [rating_key_of(track) for track in matched_plex_tracks]
+    entries = [{'id': track_info.id, 'added_at': track_info.added_at,
+                'rating_key': rating_key_of(resolved) if resolved is not None else None}
+               for track_info, resolved in zip(processed_track_infos, resolved_plex_tracks)]
+    rewrite = False
+    if synced is not None:
+        entries = merge_synced_entries(kept_entries, refs, new_positions, entries)
+        merged_keys = playlist_keys(entries)
+        removals = len(playlist_keys(removed_entries))
+        if merged_keys != playlist_keys(kept_entries) + rating_keys:
+            # Appending would leave new items at the end, or Spotify's order changed; write the playlist in its order
+            logging.info(f"Items of '{playlist.name}' were added before its end or moved, rewriting the Plex playlist.")
+            rewrite = True
+        elif removals > 1 + len(chunked(merged_keys, options.playlist_chunk_size)):
+            # Every removal is a request of its own; clearing and writing the playlist again takes fewer
+            rewrite = True
+        if rewrite:
+            rating_keys = merged_keys
+
+    summary_hash = content_hash(playlist.description)
+    with metrics.phase('playlist_write'), concurrent.futures.ThreadPoolExecutor(max(1, options.write_threads)) as executor:
+        created = existing_playlist is None
+        write_mode = options.playlist_write
+        m3u_entries = None
+        if write_mode == 'm3u' and synced is None:
+            m3u_entries = [(candidate.file, candidate.duration, candidate.artist, candidate.title)
+                           for candidate in map(as_candidate, matched_plex_tracks)]
+            if not m3u_entries or not all(file for file, _, _, _ in m3u_entries):
+                logging.info(f"Not every track of '{playlist.name}' has a file path, writing it by rating key.")
+                m3u_entries = None
+        imported_playlist = None
+        if m3u_entries is not None:
+            m3u_name = f"{spotify_playlist_id}_{hashlib.sha256(target.encode('utf-8')).hexdigest()[:12]}.m3u8"
+            m3u_path = (Path(options.m3u_dir) / m3u_name).resolve()
+            server_path = Path(options.m3u_server_dir) / m3u_name if options.m3u_server_dir else None
+            try:
+                write_m3u(m3u_path, m3u_entries)
+                imported_playlist = import_m3u_playlist(plex, playlist.name, find_music_section(plex, options.music_section),
+                                                        m3u_path, server_path)
+            except Exception as e:
+                logging.error(f"Error importing '{playlist.name}' from {server_path or m3u_path}, writing it by rating key: {e}")
+        if imported_playlist is not None:
+            if not created:
+                # An import always makes a new playlist; the old one goes once the new one is in place
+                try:
+                    existing_playlist.delete()
+                except Exception as e:
+                    logging.error(f"Error deleting the playlist '{playlist.name}' the import replaces: {e}")
+            existing_playlist = imported_playlist
+            created = True
+        elif created:
+            if write_mode == 'items':
+                existing_playlist = create_playlist_chunked(plex, playlist.name, matched_plex_tracks, options.playlist_chunk_size)
+            else:
+                existing_playlist = create_playlist_from_keys(plex, playlist.name, rating_keys, options.playlist_chunk_size)
+            logging.info(f"Created new playlist: {playlist.name}")
+
+        # Summary and poster go out alongside the item writes, and only when they changed since the last sync
+        metadata_writes = {}
+        if playlist.description and (created or last_sync.get('summary_hash') != summary_hash):
+            metadata_writes['summary'] = executor.submit(existing_playlist.editSummary, summary=playlist.description)
+        if playlist.poster:
+            metadata_writes['poster'] = executor.submit(upload_poster_if_changed, existing_playlist, playlist.poster,
+                                                        last_sync.get('poster'), DEFAULT_POSTER_CACHE, created)
+        logging.info(f"Updating playlist description and poster for: {playlist.name}")
+
+        if not created:
+            if synced is not None and not rewrite:
+                removed_keys = Counter(entry['rating_key'] for entry in removed_entries if entry['rating_key'] is not None)
+                removed_items = []
+                if removed_keys:
+                    for item in existing_playlist.items():
+                        if removed_keys[item.ratingKey] > 0:
+                            removed_keys[item.ratingKey] -= 1
+                            removed_items.append(item)
+                for future in remove_items_concurrently(existing_playlist, removed_items, executor, options.playlist_chunk_size):
+                    future.result()
+            else:
+                # The whole playlist is written again; one request empties it
+                clear_playlist(plex, existing_playlist)
+            if write_mode == 'items' and not rewrite:
+                add_items_chunked(existing_playlist, matched_plex_tracks, options.playlist_chunk_size)
+            else:
+                add_keys_chunked(plex, existing_playlist, rating_keys, options.playlist_chunk_size)
+            if synced is not None and not rewrite:
+                logging.info(f"Applied {len(removed_items)} removals and {len(matched_plex_tracks)} additions to playlist: {playlist.name}")
+            else:
+                logging.info(f"Updated existing playlist: {playlist.name}")
+
+        # On failure keep the old records so the next sync tries again
+        written = {'summary_hash': summary_hash, 'poster': last_sync.get('poster')}
+        if 'summary' in metadata_writes and not wait_for_writes([metadata_writes['summary']], "playlist summary update"):
+            written['summary_hash'] = last_sync.get('summary_hash')
+        if 'poster' in metadata_writes and wait_for_writes([metadata_writes['poster']], "playlist poster upload"):
+            written['poster'] = metadata_writes['poster'].result()
     logging.info(f"Finished syncing Spotify playlist '{playlist.name}' with Plex.")
-    
+
+    sync_state.set(target, spotify_playlist_id, {'items': entries, 'synced_at': datetime.now().isoformat(timespec='seconds'),
+                                                 **written})
+    sync_state.save()
+    checkpoint.discard()
+
+    metrics.log_summary()
+    metrics.write_summary(playlist_output_dir / f'{playlist.name}_metrics.json')
+    if options.metrics_textfile_dir:
+        metrics.write_prometheus_textfile(options.metrics_textfile_dir)
+
     if app:
         app.quit()
 
@@ -0,0 +1,45 @@
+import atexit
+import json
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+
+# Attributes every LogRecord has; anything else on a record came in through `extra=`
+_STANDARD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+class JsonFormatter(logging.Formatter):
+    """Format records as single-line JSON objects, including fields passed with `extra=`."""
+
+    def format(self, record):
+        entry = {
+            'ts': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+def create_formatter(structured):
+    return JsonFormatter() if structured else logging.Formatter(TEXT_FORMAT)
+
+def queue_handler(handlers):
+    """
+    Return a QueueHandler feeding the given handlers from a background QueueListener,
+    so formatting and writing happen off the calling thread. The listener is stopped,
+    flushing what is queued, when the interpreter exits.
+    """
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    handler = QueueHandler(log_queue)
+    # The queued record carries the bare message; the listener's handlers add their own format
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    return handler
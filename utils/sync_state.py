@@ -0,0 +1,107 @@
+import hashlib
+import json
+import os
+from collections import Counter, defaultdict, deque
+from pathlib import Path
+from .file_lock import file_lock
+
+class SyncState:
+    """
+    What was last written to each Plex playlist, kept in a JSON file: per Plex target
+    (server and account) and Spotify playlist, the synced playlist items in order as
+    {'id', 'added_at', 'rating_key'} entries, the hash of the description last written
+    and the URL and content hash of the poster last uploaded.
+
+    Processes sharing the file only write back the playlists they set().
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.data = self._read()
+        self._changed = set()
+
+    def _read(self):
+        if self.path.exists():
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        return {}
+
+    @staticmethod
+    def target_id(plex):
+        """Identify the Plex server and account without storing the account's token."""
+        token_hash = hashlib.sha256((plex._token or '').encode('utf-8')).hexdigest()[:12]
+        return f"{plex.machineIdentifier}/{token_hash}"
+
+    def get(self, target, playlist_id):
+        return self.data.get(target, {}).get(playlist_id)
+
+    def set(self, target, playlist_id, entry):
+        self.data.setdefault(target, {})[playlist_id] = entry
+        self._changed.add((target, playlist_id))
+
+    def save(self):
+        """
+        Merge the playlists set since loading into the file under a lock, and write it next
+        to its final name and rename it, so a crash never leaves a partial file.
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with file_lock(self.path):
+            data = self._read()
+            for target, playlist_id in self._changed:
+                data.setdefault(target, {})[playlist_id] = self.data[target][playlist_id]
+            temp_path = self.path.with_name(self.path.name + '.tmp')
+            with open(temp_path, 'w') as f:
+                json.dump(data, f)
+            os.replace(temp_path, self.path)
+        self.data = data
+        self._changed.clear()
+
+def diff_playlist_items(synced_entries, refs, matched_track_ids=None):
+    """
+    Compare the entries of the last sync with the playlist's current (track id, added_at) pairs.
+    Returns the positions in refs that are new, the synced entries that are kept and those that
+    are gone; a track added twice counts as two items.
+
+    Entries the last sync left unmatched, or whose track is matched to another rating key in
+    matched_track_ids by now, count as gone too, so their positions are matched again. Local
+    files have no track id to fetch them by and are only matched again by a full sync.
+    """
+    matched_track_ids = matched_track_ids or {}
+    current = []
+    removed = []
+    for entry in synced_entries:
+        rating_key = entry['rating_key']
+        if entry['id'] is not None and (rating_key is None or matched_track_ids.get(entry['id'], rating_key) != rating_key):
+            removed.append(entry)
+        else:
+            current.append(entry)
+
+    remaining = Counter((entry['id'], entry['added_at']) for entry in current)
+    new_positions = []
+    for position, ref in enumerate(refs):
+        if remaining[ref] > 0:
+            remaining[ref] -= 1
+        else:
+            new_positions.append(position)
+    kept = []
+    for entry in current:
+        ref = (entry['id'], entry['added_at'])
+        if remaining[ref] > 0:
+            remaining[ref] -= 1
+            removed.append(entry)
+        else:
+            kept.append(entry)
+    return new_positions, kept, removed
+
+def merge_synced_entries(kept_entries, refs, new_positions, new_entries):
+    """Synced entries for the current playlist: the kept ones from the last sync plus the new ones, in playlist order."""
+    kept = defaultdict(deque)
+    for entry in kept_entries:
+        kept[(entry['id'], entry['added_at'])].append(entry)
+    new_by_position = dict(zip(new_positions, new_entries))
+    return [new_by_position[position] if position in new_by_position else kept[ref].popleft()
+            for position, ref in enumerate(refs)]
+
+def playlist_keys(entries):
+    """Rating keys the Plex playlist holds for synced entries; unmatched tracks have none."""
+    return [entry['rating_key'] for entry in entries if entry['rating_key'] is not None]
@@ -0,0 +1,129 @@
+import concurrent.futures
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from helper_classes.candidate import PlexCandidate
+from .library_index import LibraryIndex
+
+try:
+    import mutagen
+except ImportError:
+    mutagen = None
+
+AUDIO_EXTENSIONS = {'.flac', '.mp3', '.m4a', '.mp4', '.aac', '.alac', '.ogg', '.oga', '.opus', '.wav', '.aif', '.aiff',
+                    '.wma', '.ape', '.wv'}
+
+DEFAULT_SCAN_THREADS = 8
+
+def _first(tags, key):
+    values = tags.get(key) if tags else None
+    if isinstance(values, list):
+        return str(values[0]) if values else None
+    return str(values) if values is not None else None
+
+def read_tags(path):
+    """Read title, artist, album, ISRC and duration (ms) from an audio file's tags."""
+    audio = mutagen.File(path, easy=True)
+    if audio is None:
+        return None
+    tags = audio.tags
+    length = getattr(audio.info, 'length', None)
+    return {
+        'title': _first(tags, 'title'),
+        'artist': _first(tags, 'artist'),
+        'album': _first(tags, 'album'),
+        'isrc': (_first(tags, 'isrc') or '').upper() or None,
+        'duration': int(length * 1000) if length else None,
+    }
+
+class TagIndex:
+    """
+    Tags of every audio file under a music directory, read with a pool of threads and
+    cached in a JSON file by path with the file's mtime and size, so rescans only read
+    new and changed files. Joined with the library index by file path, it supplies the
+    names and ISRCs matching uses for each Plex rating key.
+    """
+
+    def __init__(self, cache_file=None):
+        self.cache_file = Path(cache_file) if cache_file else None
+        self.entries = {}
+        if self.cache_file and self.cache_file.exists():
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+
+    def scan(self, music_dir, threads=DEFAULT_SCAN_THREADS):
+        """Bring the index up to date with the files under music_dir; return the number of files read."""
+        if mutagen is None:
+            raise RuntimeError("Scanning music tags needs the mutagen package (pip install mutagen).")
+        start = time.perf_counter()
+        seen = {}
+        for directory, _, filenames in os.walk(music_dir):
+            for filename in filenames:
+                if os.path.splitext(filename)[1].lower() in AUDIO_EXTENSIONS:
+                    path = os.path.join(directory, filename)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    seen[path] = (stat.st_mtime, stat.st_size)
+
+        changed = [path for path, (mtime, size) in seen.items()
+                   if path not in self.entries
+                   or (self.entries[path]['mtime'], self.entries[path]['size']) != (mtime, size)]
+        for path in set(self.entries) - set(seen):
+            del self.entries[path]
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, threads)) as executor:
+            futures = {executor.submit(read_tags, path): path for path in changed}
+            for future in concurrent.futures.as_completed(futures):
+                path = futures[future]
+                try:
+                    tags = future.result()
+                except Exception as e:
+                    logging.warning(f"Could not read tags of {path}: {e}")
+                    tags = None
+                mtime, size = seen[path]
+                self.entries[path] = {'mtime': mtime, 'size': size, **(tags or {})}
+
+        logging.info(f"Scanned {len(seen)} music files in {time.perf_counter() - start:.1f}s, "
+                     f"read tags of {len(changed)} new or changed files.")
+        return len(changed)
+
+    def save(self):
+        if not self.cache_file:
+            return
+        self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.cache_file.with_name(self.cache_file.name + '.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f)
+        os.replace(temp_path, self.cache_file)
+
+    def join(self, library_index, plex_music_dir=None, music_dir=None):
+        """
+        Return a LibraryIndex of the library's tracks with names and durations taken from
+        the file tags where the file was scanned, and ISRC lookups. Plex paths starting
+        with plex_music_dir are looked up under music_dir.
+        """
+        plex_prefix = os.path.normpath(plex_music_dir) if plex_music_dir else None
+        local_prefix = os.path.normpath(music_dir) if music_dir else None
+        candidates = []
+        isrc_keys = {}
+        joined = 0
+        for row in library_index:
+            path = row.file
+            if path and plex_prefix and local_prefix and os.path.normpath(path).startswith(plex_prefix):
+                path = local_prefix + os.path.normpath(path)[len(plex_prefix):]
+            entry = self.entries.get(path) if path else None
+            if entry is None:
+                candidates.append(row)
+                continue
+            joined += 1
+            candidates.append(PlexCandidate.create(row.rating_key, entry.get('title') or row.title,
+                                                   entry.get('artist') or row.artist, entry.get('album') or row.album,
+                                                   entry.get('duration') or row.duration, row.file, row.guid))
+            if entry.get('isrc'):
+                isrc_keys.setdefault(entry['isrc'], row.rating_key)
+        logging.info(f"Joined tags of {joined} of {len(candidates)} Plex tracks, {len(isrc_keys)} with an ISRC.")
+        return LibraryIndex(candidates, isrc_keys)
@@ -0,0 +1,94 @@
+import logging
+import threading
+import time
+from datetime import datetime
+from helper_classes.playlist import Playlist
+from utils.daemon import SyncService
+from utils.job_queue import default_worker_id
+from utils.spotify_functions import read_playlist_info
+
+DEFAULT_IDLE_WAIT = 10
+
+class SyncWorker(SyncService):
+    """
+    Sync worker pulling playlist x user jobs from a JobQueue shared by workers on one or
+    more hosts. While a job runs its lease is renewed in the background; a job that
+    raises is handed back to the queue for a retry. When the lease is lost anyway, e.g.
+    after the worker stalled past its expiry, the sync is aborted before it writes the
+    playlist another worker now owns. Matches and sync state go to the shared files,
+    which merge concurrent saves.
+    """
+
+    def __init__(self, config, options, output_root, job_queue, worker_id=None, idle_wait=DEFAULT_IDLE_WAIT,
+                 library_index=None):
+        super().__init__(config, options, output_root, library_index)
+        self.job_queue = job_queue
+        self.worker_id = worker_id or default_worker_id()
+        self.idle_wait = idle_wait
+
+    def _keep_leased(self, job, done, lease_lost):
+        while not done.wait(self.job_queue.lease_seconds / 3):
+            if not self.job_queue.renew(job, self.worker_id):
+                logging.warning(f"Worker {self.worker_id} lost the lease of job {job.id}, aborting its sync.")
+                lease_lost.set()
+                return
+
+    def run_job(self, job, abort=None):
+        if job.user not in self.user_tokens:
+            raise ValueError(f"No Plex token configured for user {job.user}.")
+        playlist_info = read_playlist_info(self.sp, job.playlist_id)
+        playlist = Playlist(name=playlist_info['name'], description=playlist_info['description'],
+                            poster=playlist_info['poster'])
+        output_dir = self.output_root / datetime.now().strftime('%Y%m%d_%H%M%S') / job.user
+        output_dir.mkdir(parents=True, exist_ok=True)
+        logging.info(f"Worker {self.worker_id} syncing '{playlist.name}' for {job.user} (job {job.id}, attempt {job.attempts}).")
+        self.sync_playlist(job.playlist_id, job.user, playlist, output_dir, abort)
+
+    def work_once(self):
+        """Lease and run one job; return whether there was one."""
+        self.refresh_library_index()
+        for playlist_id in self.apply_library_events():
+            for user in self.user_tokens:
+                self.job_queue.enqueue(playlist_id, user)
+
+        job = self.job_queue.lease(self.worker_id)
+        if job is None:
+            return False
+        done = threading.Event()
+        lease_lost = threading.Event()
+        heartbeat = threading.Thread(target=self._keep_leased, args=(job, done, lease_lost), daemon=True)
+        heartbeat.start()
+        start = time.perf_counter()
+        try:
+            self.run_job(job, lease_lost)
+        except Exception as e:
+            logging.error(f"Job {job.id} (playlist {job.playlist_id} for {job.user}) failed: {e}")
+            if not lease_lost.is_set():
+                self.job_queue.fail(job, self.worker_id, e)
+        else:
+            if lease_lost.is_set():
+                # The job belongs to the worker that leased it since
+                logging.warning(f"Job {job.id} was aborted after {time.perf_counter() - start:.2f}s.")
+            else:
+                self.job_queue.complete(job, self.worker_id)
+                logging.info(f"Job {job.id} finished in {time.perf_counter() - start:.2f}s.")
+        finally:
+            done.set()
+            heartbeat.join()
+        return True
+
+    def run(self, exit_when_idle=False):
+        """Work on jobs until stop() is called, the process is interrupted or, with exit_when_idle, the queue is empty."""
+        logging.info(f"Worker {self.worker_id} pulling sync jobs from {self.job_queue.path}.")
+        self.start_event_listener()
+        try:
+            while not self.stopped.is_set():
+                if not self.work_once():
+                    if exit_when_idle:
+                        break
+                    self.stopped.wait(self.idle_wait)
+        except KeyboardInterrupt:
+            logging.info("Interrupted, stopping.")
+        finally:
+            self.stop_event_listener()
+        logging.info(f"Worker {self.worker_id} stopped; jobs by status: {self.job_queue.counts()}")